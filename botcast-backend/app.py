@@ -1,46 +1,224 @@
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterable, Iterator, AsyncIterator, Mapping
+import queue
 from queue import Queue
-from flask import jsonify, request
+from flask import Response, jsonify, request
 from utils import (
     Character,
     get_character_names,
     check_latest_reply,
-    load_characters,
+    estimate_mp3_duration,
+    split_sentences,
+    ReplyStream,
+    DEFAULT_CHARACTER_PAIR,
 )
-import traceback
 from flask import Flask
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
-from openai import OpenAI
-import time
+from llm_providers import ProviderRegistry, history_token_budget
+from llm_hedging import HedgedRouter
+from circuit_breaker import BreakerRegistry, CircuitOpenError
+from rate_limit import LIVE, BACKGROUND, RateLimits, retry_after
+from lip_sync import lip_sync_frames, lip_sync_from_samples
+import audio_processing
+from audio_processing import AudioProcessor
+from episode_archive import EpisodeArchive, hls_playlist, parse_range, read_range
+import os
 import base64
-import json
-import requests
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import (
+    retry, retry_if_exception_type, retry_if_not_exception_type, stop_after_attempt,
+    wait_exponential,
+)
 import logging
 from utils import post_to_terminal
 import threading
+from functools import partial
 from character_pairs.prompts import get_topic_flow
+from pipeline import TurnPipeline, Turn
+from async_pipeline import AsyncTurnPipeline, AsyncTurn
+from session import (
+    Session,
+    SessionManager,
+    ConversationMessage,
+    DEFAULT_ROOM,
+    RESPONSE_QUEUE_CLOSED,
+    history_lines,
+)
+from speaker_selection import SpeakerSelector, LocalTurnPolicy, parse_speaker_reply
+from speculation import SpeculativeTurns
+from topic_prefetch import TopicPrefetcher
+from tts_cache import TTSCache, tts_cache_key
+from conversation_log import ConversationLog, tail_log
+from context_window import ContextWindow
+from character_registry import CharacterPair, PairRegistry
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import atexit
 import threading
 import random
-from elevenlabs import VoiceSettings
-from elevenlabs.client import ElevenLabs
+import re
+from async_runtime import EventLoopThread
+from urllib.parse import parse_qsl
 
 # TODO: Move environment variables to .env file˚
 ELEVENLABS_API_KEY=""
 
-elevenlabs_client = ElevenLabs(
-    api_key=ELEVENLABS_API_KEY,
+# Every LLM and TTS request runs as a coroutine on this one loop, so a slow
+# upstream costs a task rather than a blocked thread
+upstream_loop = EventLoopThread()
+
+# "threading" serves Socket.IO through Flask-SocketIO and runs each show's
+# pipeline stages on their own threads. "asgi" serves it from a
+# python-socketio AsyncServer under uvicorn on upstream_loop, where each
+# show's stages are tasks (needs uvicorn and a2wsgi; show_profile.py
+# compares the two).
+SERVER_MODE = "threading"
+# Threads serving the Flask routes in ASGI mode
+ASGI_HTTP_WORKERS = 8
+# Socket.IO server of ASGI mode, set by create_asgi_app
+async_sio = None
+
+# TTS clients by provider. Each provider's SDK is imported and its client
+# built the first time one of its voices is needed, not at start-up.
+tts_clients: Dict[str, object] = {}
+tts_clients_lock = threading.Lock()
+
+# Synthesized clips are cached on disk so repeated lines skip the provider.
+# Set TTS_CACHE_DIR to None to disable the cache.
+TTS_CACHE_DIR = "tts_cache"
+TTS_CACHE_MAX_BYTES = 512 * 1024 * 1024
+tts_cache = TTSCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES) if TTS_CACHE_DIR else None
+
+# Number of turns generated and voiced ahead of the one currently playing
+PIPELINE_LOOKAHEAD = 2
+# Pause after each turn's playback before the next speaker starts
+TURN_GAP_SECONDS = 1.0
+# Synthesize and emit replies one sentence at a time
+TTS_STREAMING = True
+# Sentences shorter than this are merged with the next one before synthesis
+STREAM_MIN_SENTENCE_CHARS = 40
+# Stream replies from the LLM and start voicing the first sentence while the
+# rest is generated (needs TTS_STREAMING). Replies end with the sentence
+# that reaches REPLY_MAX_WORDS or after REPLY_MAX_SENTENCES sentences.
+LLM_STREAMING = True
+REPLY_MAX_WORDS = 70
+REPLY_MAX_SENTENCES = 5
+# Send a per-frame mouth position envelope with each audio clip
+LIP_SYNC_ENABLED = True
+# Trim silence, normalize loudness and re-encode every clip to one format
+# (needs numpy, miniaudio and lameenc). Processed clips are crossfaded
+# instead of being separated by TURN_GAP_SECONDS.
+AUDIO_PROCESSING_ENABLED = True
+AUDIO_TARGET_LUFS = -16.0
+AUDIO_SAMPLE_RATE = 24000
+AUDIO_BITRATE = 64
+AUDIO_FADE_SECONDS = 0.02
+# Clients start each processed clip this long before the previous one ends,
+# fading one out as the next fades in. 0 plays clips back to back.
+AUDIO_CROSSFADE_SECONDS = 0.1
+# Pause after each turn on top of the crossfade
+PROCESSED_TURN_GAP_SECONDS = 0.0
+audio_processor = (
+    AudioProcessor(
+        target_lufs=AUDIO_TARGET_LUFS,
+        sample_rate=AUDIO_SAMPLE_RATE,
+        bitrate=AUDIO_BITRATE,
+        # The fades are what the crossfade blends
+        fade_seconds=max(AUDIO_FADE_SECONDS, AUDIO_CROSSFADE_SECONDS),
+    )
+    if AUDIO_PROCESSING_ENABLED and audio_processing.available()
+    else None
 )
-
-# Modify global variables at the top
-
-topic_turn_counter: int = 0
-TOPIC_TURNS = 5  # Changed from TOPIC_MAX_TURNS to match new requirement
-topic_flow = get_topic_flow()
-topic_flow_index = 0  # Add this to track position in topic flow
-
-current_topic: Optional[str] = topic_flow[0]
+# Conversation turns are appended to a JSONL log by a background writer
+CONVERSATION_LOG_PATH = "conversation.jsonl"
+CONVERSATION_LOG_FSYNC = "interval"  # "always", "interval" or "never"
+CONVERSATION_LOG_MAX_BYTES = 50 * 1024 * 1024
+CONVERSATION_LOG_MAX_AGE = 24 * 60 * 60
+conversation_log = ConversationLog(
+    CONVERSATION_LOG_PATH,
+    fsync=CONVERSATION_LOG_FSYNC,
+    max_bytes=CONVERSATION_LOG_MAX_BYTES,
+    max_age=CONVERSATION_LOG_MAX_AGE,
+)
+atexit.register(conversation_log.close)
+# Every emitted clip is also appended to an on-disk episode archive served
+# over HTTP (set to None to disable)
+EPISODE_ARCHIVE_DIR = "episodes"
+episode_archive = EpisodeArchive(EPISODE_ARCHIVE_DIR) if EPISODE_ARCHIVE_DIR else None
+
+# "local" picks speakers with the LocalTurnPolicy, "director" asks the LLM
+# director and falls back to the local policy when its answer is unusable,
+# "combined" gets the speaker and their reply from a single completion
+SPEAKER_SELECTION_MODE = "local"
+
+# Start a reply for every plausible next speaker as soon as a turn is
+# committed and keep the one that gets picked. Pays off with the director or
+# with PIPELINE_LOOKAHEAD = 0; not used in combined mode. Discarded
+# candidates are capped per show, after which the show writes one reply per turn.
+SPECULATIVE_TURNS = False
+SPECULATION_MAX_CANDIDATES = 3
+SPECULATION_MAX_WASTED_TOKENS = 50000
+
+# Keep this many topics generated ahead of the current one while a show runs
+TOPIC_PREFETCH_ENABLED = True
+TOPIC_PREFETCH_BUFFER = 5
+TOPIC_PREFETCH_BATCH = 5
+# Estimated similarity at or above which a generated topic is a duplicate
+TOPIC_SIMILARITY_THRESHOLD = 0.5
+
+# Model that folds older turns into the running context summary, and the
+# summary's size in tokens
+SUMMARY_MODEL = "llama3.2"
+SUMMARY_TOKENS = 300
+# Turns always sent verbatim, however long they are
+CONTEXT_MIN_RECENT = 4
+
+# Live turn completions are raced against an alternate backend once the
+# primary is slower than its p95 latency. Alternates are always used as
+# failover; LLM_HEDGING only controls racing.
+LLM_HEDGING = True
+LLM_ROUTES = {"llama": ["llama_deepinfra"], "llama3.1": ["llama_deepinfra"]}
+LLM_HEDGE_QUANTILE = 0.95
+
+# Each upstream (LLM API base, Neets, ElevenLabs) gets a circuit breaker that
+# opens after this many consecutive failures and probes again after the timeout
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
+# Client-side limits per upstream, shared by every show. Live turns are served
+# before background work (topic prefetch, summaries) when calls have to wait.
+UPSTREAM_LIMITS = {
+    "https://api.together.xyz": {"requests_per_second": 10, "max_concurrent": 16},
+    "https://api.deepinfra.com/v1/openai": {"requests_per_second": 10, "max_concurrent": 32},
+    "https://openrouter.ai/api/v1": {"requests_per_second": 5, "max_concurrent": 8},
+    "neets": {"requests_per_second": 5, "max_concurrent": 4},
+    "elevenlabs": {"requests_per_second": 5, "max_concurrent": 5, "chars_per_minute": 20000},
+}
+# Voices used, in order, when a voice's provider is failing
+TTS_FALLBACK_VOICES = {
+    "joe-rogan": ["pNInz6obpgDQGcFmaJgB"],  # ElevenLabs "Adam"
+}
+
+# Also send every clip as a legacy "new_response" event (text plus base64
+# audio) through a bounded queue drained by process_queue
+RESPONSE_QUEUE_ENABLED = False
+RESPONSE_QUEUE_SIZE = 8
+# Longest a queue get/put blocks before rechecking whether the show stopped
+RESPONSE_QUEUE_TIMEOUT = 1.0
+
+# Seconds a show keeps running after its last listener disconnects
+DISCONNECT_GRACE_SECONDS = 10
+
+# Maximum number of shows (rooms) generating at the same time
+MAX_SESSIONS = 50
+# Character pairs are validated and compiled once. Edited pair files are
+# picked up every PAIR_RELOAD_INTERVAL seconds and swapped into live shows
+# (None to reload only through /admin/pairs/reload).
+PAIR_RELOAD_INTERVAL = 2.0
+# When set, /admin routes require it in the X-Admin-Token header
+ADMIN_TOKEN = None
+pair_registry = PairRegistry(on_change=lambda pair: apply_pair_update(pair))
+if PAIR_RELOAD_INTERVAL:
+    pair_registry.watch(PAIR_RELOAD_INTERVAL)
+sessions = SessionManager(max_sessions=MAX_SESSIONS, pairs=pair_registry)
 app = Flask(__name__)
 CORS(app)
 socketio = SocketIO(
@@ -48,7 +226,7 @@ socketio = SocketIO(
     cors_allowed_origins="*",
     ping_timeout=120,  # Increase timeout
     ping_interval=15,  # More frequent pings
-    max_http_buffer_size=1e8,  # Larger buffer for audio
+    max_http_buffer_size=1e6,  # Clients only send small control events
     async_mode="threading",  # Use threading mode
     reconnection=True,
     reconnection_attempts=10,
@@ -59,331 +237,908 @@ socketio = SocketIO(
 # Track active clients
 active_clients = set()
 
-# Initialize OpenAI client
-# client = OpenAI()
+# Audio is sent as a binary Socket.IO attachment ("audio_frame" event with a
+# small metadata header) by default. Legacy clients can connect with
+# ?audio_transport=base64 to keep receiving base64 JSON "audio_segment" events.
+AUDIO_TRANSPORTS = ("binary", "base64")
+DEFAULT_AUDIO_TRANSPORT = "binary"
+client_transports: Dict[str, str] = {}
+# Show (room) each client is listening to
+client_rooms: Dict[str, str] = {}
+
+# Pooled LLM clients, one per API base, shared by every show
+providers = ProviderRegistry()
+# Off-turn LLM work such as context summaries
+background_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="background")
+breakers = BreakerRegistry(
+    failure_threshold=BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=BREAKER_RESET_TIMEOUT,
+)
+rate_limits = RateLimits(UPSTREAM_LIMITS)
+# Hedged requests for the live turn path
+llm_router = HedgedRouter(
+    providers,
+    upstream_loop,
+    routes=LLM_ROUTES,
+    hedge_quantile=LLM_HEDGE_QUANTILE,
+    hedging=LLM_HEDGING,
+    breakers=breakers,
+    limits=rate_limits,
+)
+
+
+async def close_upstream_clients() -> None:
+    await providers.aclose()
+    if "neets" in tts_clients:
+        await tts_clients["neets"].aclose()
 
-characters = load_characters()
+
+atexit.register(lambda: upstream_loop.run(close_upstream_clients(), timeout=5))
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class ConversationMessage:
-    def __init__(self, character_name: str, content: str, timestamp: float = None):
-        self.character_name = character_name
-        self.content = content
-        self.timestamp = timestamp or time.time()
-
-
 @socketio.on("connect")
 def handle_connect():
-    client_id = request.sid
+    connect_client(request.sid, request.args)
+
+
+@socketio.on("set_audio_transport")
+def handle_set_audio_transport(data):
+    transport = set_client_transport(request.sid, (data or {}).get("transport"))
+    emit("audio_transport", {"transport": transport})
+
+
+@socketio.on("join_show")
+def handle_join_show(data):
+    room = join_show(request.sid, (data or {}).get("room", DEFAULT_ROOM))
+    emit("joined_show", {"room": room})
+
+
+def connect_client(client_id: str, args: Mapping[str, str]) -> None:
+    """Register a new client and add it to the show named in its query string"""
     active_clients.add(client_id)
+    client_transports[client_id] = args.get("audio_transport", DEFAULT_AUDIO_TRANSPORT)
+    join_show(client_id, args.get("room", DEFAULT_ROOM))
     logger.info(
         f"Client connected. ID: {client_id}. Active clients: {len(active_clients)}"
     )
 
 
+def audio_room(room: str, transport: str) -> str:
+    return f"{room}:audio:{transport}"
+
+
+def enter_room(client_id: str, room: str) -> None:
+    """Add a client to a Socket.IO room of whichever server is running"""
+    if async_sio:
+        # The async server's room bookkeeping is synchronous underneath
+        async_sio.manager.basic_enter_room(client_id, "/", room)
+    else:
+        socketio.server.enter_room(client_id, room)
+
+
+def exit_room(client_id: str, room: str) -> None:
+    if async_sio:
+        async_sio.manager.basic_leave_room(client_id, "/", room)
+    else:
+        socketio.server.leave_room(client_id, room)
+
+
+def emit_event(event: str, data, room: str) -> None:
+    """Emit to a room from any thread, on whichever server is running"""
+    if async_sio:
+        upstream_loop.submit(async_sio.emit(event, data, to=room))
+    else:
+        socketio.emit(event, data, to=room)
+
+
+def join_show(client_id: str, room: str) -> str:
+    """Make a client listen to the show in `room`"""
+    room = room or DEFAULT_ROOM
+    leave_show(client_id)
+    client_rooms[client_id] = room
+    enter_room(client_id, room)
+    set_client_transport(client_id, client_transports.get(client_id))
+    session = sessions.get(room)
+    if session:
+        session.add_listener(client_id)
+    return room
+
+
+def leave_show(client_id: str) -> Optional[Session]:
+    """Stop a client listening to its current show, returns that show's session"""
+    room = client_rooms.pop(client_id, None)
+    if room is None:
+        return None
+    exit_room(client_id, room)
+    transport = client_transports.get(client_id)
+    if transport:
+        exit_room(client_id, audio_room(room, transport))
+    session = sessions.get(room)
+    if session:
+        session.remove_listener(client_id)
+    return session
+
+
+def set_client_transport(client_id: str, transport: Optional[str]) -> str:
+    """Move a client into the audio room of its show for its transport"""
+    if transport not in AUDIO_TRANSPORTS:
+        transport = DEFAULT_AUDIO_TRANSPORT
+    room = client_rooms.get(client_id, DEFAULT_ROOM)
+    previous = client_transports.get(client_id)
+    if previous and previous != transport:
+        exit_room(client_id, audio_room(room, previous))
+    enter_room(client_id, audio_room(room, transport))
+    client_transports[client_id] = transport
+    return transport
+
+
+def audio_events(session: Session, payload: dict) -> List[tuple]:
+    """(event, data, room) for each audio transport the show's listeners use"""
+    header = {key: value for key, value in payload.items() if key != "audio"}
+    transports = {
+        client_transports.get(client_id) for client_id in list(session.listeners)
+    }
+    events = []
+    if "binary" in transports:
+        events.append(
+            ("audio_frame", (header, payload["audio"]), audio_room(session.room, "binary"))
+        )
+    if "base64" in transports:
+        events.append((
+            "audio_segment",
+            {**header, "audio": base64.b64encode(payload["audio"]).decode("utf-8")},
+            audio_room(session.room, "base64"),
+        ))
+    return events
+
+
+def archive_audio(session: Session, payload: dict) -> None:
+    if not session.episode:
+        return
+    header = {key: value for key, value in payload.items() if key != "audio"}
+    try:
+        session.episode.append(
+            payload["audio"],
+            header,
+            header["metadata"]["duration"] or estimate_mp3_duration(payload["audio"]) or 0.0,
+        )
+    except (OSError, ValueError) as e:
+        logger.error(f"[{session.room}] Failed to archive audio: {e}")
+
+
+def emit_audio(session: Session, payload: dict) -> None:
+    """Send an audio payload to the show's listeners in their preferred transport"""
+    for event, data, room in audio_events(session, payload):
+        socketio.emit(event, data, to=room)
+    archive_audio(session, payload)
+    if session.response_queue:
+        enqueue_response(session, payload)
+
+
+async def emit_audio_async(session: Session, payload: dict) -> None:
+    """`emit_audio` on the ASGI server, where "new_response" events need no queue"""
+    for event, data, room in audio_events(session, payload):
+        await async_sio.emit(event, data, to=room)
+    # Turns are emitted one at a time, so appends stay in order
+    await asyncio.to_thread(archive_audio, session, payload)
+    if RESPONSE_QUEUE_ENABLED:
+        await async_sio.emit("new_response", new_response_event(payload), to=session.room)
+
+
 @socketio.on("disconnect")
 def handle_disconnect():
-    client_id = request.sid
+    disconnect_client(request.sid)
+
+
+def disconnect_client(client_id: str) -> None:
     if client_id in active_clients:
         active_clients.remove(client_id)
+    session = leave_show(client_id)
+    client_transports.pop(client_id, None)
     logger.info(
         f"Client disconnected. ID: {client_id}. Active clients: {len(active_clients)}"
     )
 
-    # Don't stop conversation immediately
-    if not active_clients:
-        logger.info("No active clients, waiting for reconnection...")
-        time.sleep(10)  # Wait longer for potential reconnect
-        if not active_clients:
-            global conversation_active
-            conversation_active = False
-            logger.info("No reconnection, stopping conversation")
+    # Don't stop conversation immediately, a reconnect cancels the timer
+    if session and session.conversation_active and not session.listeners:
+        logger.info(f"[{session.room}] No active clients, waiting for reconnection...")
+        session.stop_when_abandoned(DISCONNECT_GRACE_SECONDS)
 
 
 @socketio.on("start_conversation")
-def handle_start():
-    global conversation_history, conversation_active, generator_thread
-    conversation_history = []
-    conversation_active = True
-    print("START CONVERSATION")
+def handle_start(data=None):
+    """
+    Start the show in the client's room.
+
+    Optional data: {"room": "...", "pair": "jre_elon.json"} to start (and
+    join) another room or switch the room to another character pair.
+    """
+    error = start_show(request.sid, data or {})
+    if error:
+        emit("error", {"message": error})
+
+
+def start_show(client_id: str, data: dict) -> Optional[str]:
+    """Start or restart the show for a client, returns an error message if it can't"""
+    room = data.get("room") or client_rooms.get(client_id, DEFAULT_ROOM)
+    pair = data.get("pair")
+    if pair is not None and pair_registry.get(pair) is None:
+        message = f"Unknown character pair: {pair}"
+        error = pair_registry.errors.get(pair)
+        return f"{message} ({error})" if error else message
+
+    if client_rooms.get(client_id) != room:
+        join_show(client_id, room)
+
+    current = sessions.get(room)
+    if current:
+        # Restart cleanly if a conversation is already running, keeping the
+        # room's pair unless another one was asked for
+        current.stop()
+        pair = pair or current.pair
+    try:
+        session = sessions.get_or_create(room, pair)
+    except (RuntimeError, ValueError) as e:
+        return str(e)
+
+    for sid, client_room in list(client_rooms.items()):
+        if client_room == room:
+            session.add_listener(sid)
+    session.reset()
+    session.conversation_active = True
+    # Attached before the show starts so a stop that comes first still reaches it
+    session.pipeline = build_pipeline(session)
+    logger.info(f"[{room}] Starting conversation ({session.pair})")
+
+    if async_sio:
+        upstream_loop.submit(run_show(session))
+        return None
 
     # Start the queue processing thread
-    # generator_thread = threading.Thread(target=process_queue)
-    # generator_thread.daemon = (
-    #     True  # Make thread daemon so it exits when main program exits
-    # )
-    # generator_thread.start()
+    if RESPONSE_QUEUE_ENABLED:
+        session.response_queue = Queue(maxsize=RESPONSE_QUEUE_SIZE)
+        socketio.start_background_task(process_queue, session, session.response_queue)
 
-    generate_responses()
+    socketio.start_background_task(generate_responses, session)
+    return None
 
 
-def set_openai_credentials(model_name):
-    """
-    Set OpenAI API key and base URL based on the model name.
-    """
-    global name, temp, client
-
-    model_params = {
-        "airoboros": {
-            "name": "deepinfra/airoboros-70b",
-            "temperature": 0.5,
-            "api_key": "",
-            "api_base": "https://api.deepinfra.com/v1/openai",
-        },
-        "mixtral": {
-            "name": "nousresearch/nous-hermes-2-mixtral-8x7b-dpo",
-            "temperature": 0.8,
-            "api_key": "",
-            "api_base": "https://openrouter.ai/api/v1",
-        },
-        "noromaid": {
-            "name": "neversleep/noromaid-mixtral-8x7b-instruct",
-            "temperature": 0.8,
-            "api_key": "",
-            "api_base": "https://openrouter.ai/api/v1",
-        },
-        "mythomax": {
-            "name": "TheBloke/MythoMax-L2-13B-AWQ",
-            "temperature": 0.8,
-            "api_key": "EMPTY",
-            "api_base": "http://194.68.245.11:22169/v1",
-        },
-        "llama": {
-            "name": "meta-llama/Llama-3-70b-chat-hf",
-            "temperature": 0.0,
-            "api_key": "",
-            "api_base": "https://api.together.xyz",
-        },
-        "llamalite": {
-            "name": "meta-llama/Meta-Llama-3-70B-Instruct-Lite",
-            "temperature": 0.0,
-            "api_key": "",
-            "api_base": "https://api.together.xyz",
-        },
-        "llama3.1": {
-            "name": "meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo",
-            "temperature": 0.5,
-            "api_key": "",
-            "api_base": "https://api.together.xyz",
-        },
-        "llama3.2": {
-            "name": "meta-llama/Llama-3.2-3B-Instruct-Turbo",
-            "temperature": 0.2,
-            "api_key": "",
-            "api_base": "https://api.together.xyz",
-        },
-        "nemo": {
-            "name": "mistralai/Mistral-Nemo-Instruct-2407",
-            "temperature": 0.9,
-            "api_key": "",
-            "api_base": "https://api.deepinfra.com/v1/openai",
-        },
-        "3.1_405": {
-            "name": "meta-llama/Meta-Llama-3.1-405B-Instruct-Turbo",
-            "temperature": 0.2,
-            "api_key": "",
-            "api_base": "https://api.together.xyz",
-        },
-    }
+def generate_chat_response(messages, model_key: str = "llama"):
+    response = llm_router.create(model_key, messages, hedge=False, priority=BACKGROUND)
+    return response.choices[0].message.content.strip()
 
-    client = OpenAI(
-        api_key=model_params[model_name]["api_key"],
-        base_url=model_params[model_name]["api_base"],
+
+def topic_batch_messages(session: Session, count: int) -> List[Dict[str, str]]:
+    """Prompt asking the LLM for `count` new topics for the show"""
+    with session.lock:
+        topic_flow = list(session.topic_flow)
+        topic_flow_index = session.topic_flow_index
+    recent_topics = topic_flow[max(0, topic_flow_index - 4):topic_flow_index + 1]
+    sample_topics = random.sample(topic_flow, min(5, len(topic_flow)))
+
+    new_topic_prompt = f"""Given the following topics for the podcast between {",".join(session.characters.keys())}. Generate {count} new topics. The topics should be interesting and should drive engaging conversation.  
+    Topics should be unique and concise. Do not generate topics that are too similar to the existing topics or to each other. 
+    Do not generate topics that are similar to the last topics: {recent_topics}
+    You should only return the new topics, one per line, and nothing else.
+    Do not number the topics or include quotes preceding or following them.
+    
+    topics: {sample_topics}
+    
+    Here are the next topics for the podcast:"""
+    return [{"role": "system", "content": new_topic_prompt}]
+
+
+def parse_topics(content: str, count: int) -> List[str]:
+    topics = []
+    for line in content.splitlines():
+        # Strip list markers and starting and ending quotes
+        topic = re.sub(r"^\s*(?:[-*\u2022]|\d+[.)])\s*", "", line).strip().strip('"')
+        if topic:
+            topics.append(topic)
+    logger.info(f"New topics generated: {topics}")
+    return topics[:count]
+
+
+def generate_topic_batch(session: Session, count: int) -> List[str]:
+    """Ask the LLM for `count` new topics for the show"""
+    response = llm_router.create(
+        "llama", topic_batch_messages(session, count), hedge=False, priority=BACKGROUND
     )
-    name = model_params[model_name]["name"]
-    temp = model_params[model_name]["temperature"]
+    return parse_topics(response.choices[0].message.content, count)
 
 
-def generate_chat_response(messages):
-    response = client.chat.completions.create(
-        model=name,
-        messages=messages,
+async def generate_topic_batch_async(session: Session, count: int) -> List[str]:
+    response = await llm_router.acreate(
+        "llama", topic_batch_messages(session, count), hedge=False, priority=BACKGROUND
+    )
+    return parse_topics(response.choices[0].message.content, count)
+
+
+def select_turn_speaker(session: Session, turn: Turn) -> Optional[str]:
+    """Pipeline stage: pick the character who speaks in this turn"""
+    # Pause until someone is listening
+    if not session.listeners:
+        logger.info(f"[{session.room}] No active clients, waiting...")
+        if not session.wait_for_listeners():
+            return None
+
+    character_list = get_character_names(session.characters)
+    character_name, reply = session.speaker_selector.select_with_reply(
+        session.history_snapshot(), character_list, session.last_speaker
+    )
+    return accept_speaker(session, turn, character_name, reply)
+
+
+async def select_turn_speaker_async(session: Session, turn: AsyncTurn) -> Optional[str]:
+    """`select_turn_speaker` for the async pipeline"""
+    if not session.listeners:
+        logger.info(f"[{session.room}] No active clients, waiting...")
+        if not await session.wait_for_listeners_async():
+            return None
+
+    character_list = get_character_names(session.characters)
+    character_name, reply = await session.speaker_selector.aselect_with_reply(
+        session.history_snapshot(), character_list, session.last_speaker
+    )
+    return accept_speaker(session, turn, character_name, reply)
+
+
+def accept_speaker(session: Session, turn: Turn, character_name: Optional[str],
+                   reply: Optional[str]) -> Optional[str]:
+    if not character_name or character_name not in session.characters:
+        return None
+    if reply:
+        # Combined mode: the write stage will use this reply as is
+        turn.text = reply
+    return character_name
+
+
+def build_speaker_selector(session: Session) -> SpeakerSelector:
+    policy = LocalTurnPolicy(
+        aliases={name: c.aliases for name, c in session.characters.items()}
+    )
+    # The async pipeline awaits the director from the loop itself
+    if async_sio:
+        director = determine_appropriate_character_async
+        combined = generate_speaker_and_reply_async
+    else:
+        director, combined = determine_appropriate_character, generate_speaker_and_reply
+    return SpeakerSelector(
+        mode=SPEAKER_SELECTION_MODE,
+        policy=policy,
+        director=lambda history, character_list: director(
+            context_lines(session, history), character_list
+        ),
+        combined=lambda history, character_list: combined(
+            session, context_lines(session, history), character_list
+        ),
     )
-    return response.choices[0].message.content.strip()
 
 
-def add_new_topic(messages):
-    global topic_flow
+def write_turn(session: Session, turn: Turn) -> str:
+    """Pipeline stage: generate the text reply for the selected character"""
+    return upstream_loop.run(write_turn_async(session, turn))
+
+
+async def write_turn_async(session: Session, turn: Turn) -> str:
+    character = session.characters[turn.character]
+    history = session.history_snapshot()
+    text_response = await take_speculative_reply(session, turn, history)
+    if text_response:
+        return text_response
+    summary, recent = session.context.build(history)
+    chat_messages = format_chat_messages(session, character, recent, summary)
+    text_response = await generate_llm_response_async(character, chat_messages)
+    logger.info(f"[{session.room}] Generated text response: {text_response[:50]}...")
+    return text_response
+
+
+def stream_turn(session: Session, turn: Turn) -> Iterator[str]:
+    """Pipeline stage: stream the reply for the selected character sentence by sentence"""
+    return upstream_loop.iterate(stream_turn_async(session, turn))
+
+
+async def stream_turn_async(session: Session, turn: Turn) -> AsyncIterator[str]:
+    character = session.characters[turn.character]
+    history = session.history_snapshot()
+    text_response = await take_speculative_reply(session, turn, history)
+    if text_response:
+        for sentence in split_sentences(text_response, min_chars=STREAM_MIN_SENTENCE_CHARS):
+            yield sentence
+        return
+
+    summary, recent = session.context.build(history)
+    chat_messages = format_chat_messages(session, character, recent, summary)
+    await asyncio.to_thread(log_llm_prompt, chat_messages)
+    reply = ReplyStream(
+        character.name,
+        min_chars=STREAM_MIN_SENTENCE_CHARS,
+        max_words=REPLY_MAX_WORDS,
+        max_sentences=REPLY_MAX_SENTENCES,
+    )
+    deltas = llm_router.astream("llama", chat_messages, max_tokens=1000)
     try:
-        set_openai_credentials("llama")
-        response = client.chat.completions.create(
-            model=name,
-            messages=messages,
-        )
-        # replace starting and ending quotes
-        topic = response.choices[0].message.content.strip()
-        print("New topic generated: ", topic)
-        if topic not in topic_flow:
-            topic_flow.append(topic)
-    except Exception as e:
-        logger.error(f"Error adding new topic: {e}")
-        pass
+        async for delta in deltas:
+            for sentence in reply.feed(delta):
+                yield sentence
+            if reply.done:
+                logger.info(f"[{session.room}] Reply capped at {reply.words} words")
+                break
+        else:
+            for sentence in reply.finish():
+                yield sentence
+    finally:
+        # Stops the completion if the reply was capped or the turn dropped
+        await deltas.aclose()
+
+
+async def take_speculative_reply(session: Session, turn: Turn,
+                                 history: List[ConversationMessage]) -> Optional[str]:
+    if not session.speculator:
+        return None
+    text_response = await session.speculator.atake(
+        history[-1] if history else None, turn.character
+    )
+    if text_response:
+        logger.info(f"[{session.room}] Using speculative reply: {text_response[:50]}...")
+    return text_response
+
+
+def commit_turn(session: Session, turn: Turn) -> None:
+    """Pipeline stage: record the reply so the next turn builds on it"""
+    turn.message = session.record(turn.character, turn.text)
+    if session.speculator:
+        speculate_next_turn(session)
+
+
+def speculate_next_turn(session: Session) -> None:
+    """Start candidate replies for the likely next speakers"""
+    if session.speculator.exhausted:
+        return
+    history = session.history_snapshot()
+    speakers = session.speaker_selector.policy.rank(
+        history, get_character_names(session.characters), session.last_speaker
+    )
+    summary, recent = session.context.build(history)
+    prompts = {
+        name: format_chat_messages(session, session.characters[name], recent, summary)
+        for name in speakers
+        if name in session.characters
+    }
+    session.speculator.speculate(history[-1] if history else None, prompts)
+
+
+async def write_candidate(character_name: str, messages: List[Dict[str, str]]) -> tuple:
+    """Speculative reply for `character_name`, with the tokens it used"""
+    # No hedging and background priority: a candidate that's likely to be
+    # thrown away shouldn't cost double or hold up live turns
+    response = await llm_router.acreate(
+        "llama", messages, hedge=False, priority=BACKGROUND, max_tokens=1000
+    )
+    text_response = clean_reply(response.choices[0].message.content, character_name)
+    if len(text_response.strip()) < 2:
+        raise ValueError("Empty speculative reply")
+    usage = getattr(response, "usage", None)
+    return text_response, getattr(usage, "total_tokens", None)
+
+
+def voice_turn(session: Session, turn: Turn):
+    """Pipeline stage: synthesize the reply's audio"""
+    character = session.characters[turn.character]
+    if turn.sentences is not None:
+        return stream_sentences_audio(turn.streamed_sentences(), character, turn.seq)
+    if TTS_STREAMING:
+        return stream_audio_with_retry(turn.text, character, turn.seq)
+
+    audio_data = generate_audio_with_retry(turn.text, character)
+    logger.info("Generated audio successfully")
+    return audio_data
+
+
+async def voice_turn_async(session: Session, turn: AsyncTurn):
+    """`voice_turn` for the async pipeline"""
+    character = session.characters[turn.character]
+    if turn.sentences is not None:
+        return stream_sentences_audio_async(turn.streamed_sentences(), character, turn.seq)
+    if TTS_STREAMING:
+        return stream_audio_async(turn.text, character, turn.seq)
+
+    audio_data = await generate_audio_async(turn.text, character)
+    logger.info("Generated audio successfully")
+    return audio_data
+
+
+def emit_turn(session: Session, turn: Turn) -> None:
+    """Pipeline stage: send the voiced turn to listeners"""
+    emit_audio(session, turn.audio)
+    logger.info(f"[{session.room}] Emitted audio segment successfully")
+    # Post message to Play AI terminal
+    # post_to_terminal(
+    #     {"message": turn.text, "character": turn.character},
+    #     guest=", ".join(pair_registry.get(session.pair).guests),
+    # )
+    log_conversation(turn.message, session.room)
+
+
+async def emit_turn_async(session: Session, turn: AsyncTurn) -> None:
+    await emit_audio_async(session, turn.audio)
+    logger.info(f"[{session.room}] Emitted audio segment successfully")
+    log_conversation(turn.message, session.room)
+
+
+def emit_turn_chunk(session: Session, turn: Turn, chunk: Optional[dict]) -> None:
+    """Pipeline stage: send one sentence of a streamed turn to listeners"""
+    if chunk is None:
+        # Synthesis failed part way through, close the turn for clients
+        socketio.emit("turn_aborted", {"turn": turn.seq}, to=session.room)
+        return
+
+    emit_audio(session, chunk)
+    if chunk["end_of_turn"]:
+        logger.info(f"[{session.room}] Emitted streamed turn successfully")
+        log_conversation(turn.message, session.room)
 
 
-def check_and_add_new_topic():
-    global topic_flow, topic_flow_index
+async def emit_turn_chunk_async(session: Session, turn: AsyncTurn,
+                                chunk: Optional[dict]) -> None:
+    if chunk is None:
+        await async_sio.emit("turn_aborted", {"turn": turn.seq}, to=session.room)
+        return
 
-    new_topic_prompt = f"""Given the following topics for the podcast between {",".join(characters.keys())}. Generate a new topic. The topic should be interesting and should drive engaging conversation.  
-    Topic should be unique and concise. Do not generate topics that are too similar to the existing topics. 
-    Do not generate topics that are similar to last 5 topics.
-    You should only return the new topic and nothing else.
-    Do not include quotes in preceding or following the topic.
+    await emit_audio_async(session, chunk)
+    if chunk["end_of_turn"]:
+        logger.info(f"[{session.room}] Emitted streamed turn successfully")
+        log_conversation(turn.message, session.room)
+
+
+def drop_turn(session: Session, turn: Turn) -> None:
+    """Roll back a committed turn that will never be emitted"""
+    if turn.committed:
+        session.forget(turn.message)
+
+
+def audio_playback_seconds(audio: dict) -> Optional[float]:
+    metadata = audio["metadata"]
+    if metadata.get("duration") is None:
+        return None
+    # Overlapping the next clip shortens what this one adds to playback
+    return max(metadata["duration"] - metadata.get("crossfade", 0.0), 0.0)
+
+
+def context_lines(session: Session, history: List[ConversationMessage]) -> List[str]:
+    """Summary plus recent history as `name: message` lines for director prompts"""
+    summary, recent = session.context.build(history)
+    lines = history_lines(recent)
+    if summary:
+        lines.insert(0, f"Earlier in this conversation: {summary}")
+    return lines
+
+
+def summarize_history(previous_summary: str, messages: List[ConversationMessage]) -> str:
+    """Fold `messages` into the running summary of the conversation"""
+    transcript = "\n".join(history_lines(messages))
+    summary_prompt = f"""Summarize this podcast conversation in at most {SUMMARY_TOKENS // 2} words.
+    Keep who said what, the jokes and running bits, and any open questions. Return only the summary.
     
-    topics: {random.sample(topic_flow, 5)}
+    Summary so far: {previous_summary or "(none)"}
     
-    Here is the next topic for the podcast:"""
+    New messages:
+    {transcript}"""
+
+    response = llm_router.create(
+        SUMMARY_MODEL,
+        [{"role": "system", "content": summary_prompt}],
+        hedge=False,
+        priority=BACKGROUND,
+        max_tokens=SUMMARY_TOKENS * 2,
+    )
+    return response.choices[0].message.content.strip()
 
-    if len(topic_flow) - topic_flow_index < 5:
-        print("Adding new topic")
-        add_new_topic([{"role": "system", "content": new_topic_prompt}])
-    threading.Timer(5.0, check_and_add_new_topic).start()
 
+def build_pipeline(session: Session):
+    """Turn pipeline for a show: stage tasks in ASGI mode, stage threads otherwise"""
+    stream_text = LLM_STREAMING and TTS_STREAMING
+    if async_sio:
+        return AsyncTurnPipeline(
+            select_speaker=partial(select_turn_speaker_async, session),
+            generate_text=partial(write_turn_async, session),
+            commit=partial(commit_turn, session),
+            synthesize=partial(voice_turn_async, session),
+            emit=partial(emit_turn_async, session),
+            emit_chunk=partial(emit_turn_chunk_async, session),
+            on_drop=partial(drop_turn, session),
+            stream_text=partial(stream_turn_async, session) if stream_text else None,
+            lookahead=PIPELINE_LOOKAHEAD,
+            playback_seconds=audio_playback_seconds,
+            turn_gap=PROCESSED_TURN_GAP_SECONDS if audio_processor else TURN_GAP_SECONDS,
+        )
+    return TurnPipeline(
+        select_speaker=partial(select_turn_speaker, session),
+        generate_text=partial(write_turn, session),
+        commit=partial(commit_turn, session),
+        synthesize=partial(voice_turn, session),
+        emit=partial(emit_turn, session),
+        emit_chunk=partial(emit_turn_chunk, session),
+        on_drop=partial(drop_turn, session),
+        stream_text=partial(stream_turn, session) if stream_text else None,
+        lookahead=PIPELINE_LOOKAHEAD,
+        playback_seconds=audio_playback_seconds,
+        turn_gap=PROCESSED_TURN_GAP_SECONDS if audio_processor else TURN_GAP_SECONDS,
+    )
 
-# check_and_add_new_topic()
 
+def generate_responses(session: Session):
+    """Generate responses and stream audio until the show is stopped"""
+    if not prepare_show(session):
+        return
+    if session.topic_prefetcher:
+        session.topic_prefetcher.start()
+    session.pipeline.run()
 
-def generate_responses():
-    """Generate responses and stream audio with error handling"""
-    global conversation_active, topic_turn_counter, current_topic, topic_flow_index, conversation_history, TOPIC_TURNS
-    retry_count = 0
-    max_retries = 3
 
-    while conversation_active:
-        try:
-            # Check connection status
-            if not active_clients:
-                logger.info("No active clients, waiting...")
-                time.sleep(3)
-                continue
-
-            context = [
-                f"{msg.character_name}: {msg.content}" for msg in conversation_history
-            ]
-            if not context:
-                context = [
-                    "Welcome to the Joe Rogan Experience, good to have you here."
-                ]
-
-            character_list = get_character_names(characters)
-            character_name = determine_appropriate_character(context, character_list)
-
-            if not character_name or character_name not in characters:
-                time.sleep(0.5)
-                continue
-
-            character = characters[character_name]
-            logger.info(f"Selected character: {character_name}")
-
-            # Generate text response
-            try:
-                chat_messages = format_chat_messages(character, context)
-                text_response = generate_llm_response_with_retry(
-                    character, chat_messages
-                )
-                logger.info(f"Generated text response: {text_response[:50]}...")
-            except Exception as e:
-                logger.error(f"Text generation failed: {e}")
-                continue
-            # Post message to Play AI terminal
-            # post_to_terminal({"message": text_response, "character": character_name})
-            # Generate audio and emit directly
-            try:
-                audio_data = generate_audio_with_retry(text_response, character)
-                logger.info("Generated audio successfully")
+async def run_show(session: Session) -> None:
+    """`generate_responses` in ASGI mode: the show's stages run as tasks on this loop"""
+    if not prepare_show(session):
+        return
+    stages = [session.pipeline.run()]
+    if session.topic_prefetcher:
+        stages.append(session.topic_prefetcher.run())
+    await asyncio.gather(*stages)
 
-                # Emit audio segment directly
-                socketio.emit(
-                    "audio_segment",
-                    audio_data,
-                )
-                logger.info("Emitted audio segment successfully")
 
-                # Add to conversation history
-                new_message = ConversationMessage(
-                    character_name=character.name,
-                    content=text_response,
-                    timestamp=time.time(),
-                )
-                conversation_history.append(new_message)
-                log_conversation(new_message)
-
-            except Exception as e:
-                logger.error(f"Audio generation or emission failed: {e}")
-                traceback.print_exc()
-                continue
-
-            # Replace the current topic logic with topic flow logic
-            topic_turn_counter += 1
-            print("Topic turn counter: ", topic_turn_counter)
-
-            if topic_turn_counter >= TOPIC_TURNS:
-                topic_turn_counter = 0
-                TOPIC_TURNS = random.randint(5, 10)
-                topic_flow_index = (topic_flow_index + 1) % len(topic_flow)
-                current_topic = topic_flow[topic_flow_index]
-                logger.info(f"Switching to new topic: {current_topic}")
-                # Cull conversation history when switching topics
-                conversation_history = []
-
-            # Add delay between responses
-            time.sleep(1)
+def prepare_show(session: Session) -> bool:
+    """
+    Set up what a starting show needs besides its pipeline.
 
-        except Exception as e:
-            logger.error(f"Error in main generation loop: {e}")
-            traceback.print_exc()
-            time.sleep(min(2 ** retry_count, 30))
-            retry_count += 1
-            if retry_count > max_retries:
-                retry_count = 0
-                continue
+    Returns False if the show was stopped before or while it was set up.
+    """
+    if not session.conversation_active:
+        return False
+    if episode_archive:
+        session.episode = episode_archive.start(session.room, session.pair)
+    session.context = ContextWindow(
+        summarize_history,
+        budget_tokens=history_token_budget("llama"),
+        summary_tokens=SUMMARY_TOKENS,
+        min_recent=CONTEXT_MIN_RECENT,
+        executor=background_executor,
+        on_folded=session.forget_folded,
+    )
+    session.speaker_selector = build_speaker_selector(session)
+    background_executor.submit(warm_upstreams, session)
+    if SPECULATIVE_TURNS and SPEAKER_SELECTION_MODE != "combined":
+        session.speculator = SpeculativeTurns(
+            upstream_loop,
+            write_candidate,
+            max_candidates=SPECULATION_MAX_CANDIDATES,
+            max_wasted_tokens=SPECULATION_MAX_WASTED_TOKENS,
+        )
+    if TOPIC_PREFETCH_ENABLED:
+        session.topic_prefetcher = TopicPrefetcher(
+            session,
+            generate_topic_batch_async if async_sio else generate_topic_batch,
+            buffer_size=TOPIC_PREFETCH_BUFFER,
+            batch_size=TOPIC_PREFETCH_BATCH,
+            threshold=TOPIC_SIMILARITY_THRESHOLD,
+        )
+    if not session.conversation_active:
+        # The stop came in while the above was being attached: stop it too
+        session.stop()
+        return False
+    return True
+
+
+def warm_upstreams(session: Session) -> None:
+    """
+    Import the provider SDKs and build the clients a starting show will
+    need, off the turn path, so its first turn doesn't pay for them.
+    """
+    try:
+        for key in {"llama", SUMMARY_MODEL, *LLM_ROUTES.get("llama", [])}:
+            providers.async_client(key)
+        for character in session.characters.values():
+            for voice_id in [character.voice_id, *TTS_FALLBACK_VOICES.get(character.voice_id, [])]:
+                tts_client(voice_params(voice_id)["provider"])
+    except Exception as e:
+        logger.warning(f"[{session.room}] Couldn't prepare upstream clients: {e}")
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 def generate_llm_response_with_retry(
         character: Character, messages: List[Dict[str, str]]
 ) -> str:
     """Generate response using OpenAI with retry logic"""
+    return upstream_loop.run(generate_llm_response_async(character, messages))
+
+
+class EmptyReplyError(Exception):
+    """The LLM answered, but with nothing usable"""
+
+
+# Backend failures are retried by the router; this only retries unusable replies
+@retry(stop=stop_after_attempt(2), retry=retry_if_exception_type(EmptyReplyError), reraise=True)
+async def generate_llm_response_async(
+        character: Character, messages: List[Dict[str, str]]
+) -> str:
     try:
-        set_openai_credentials("llama")
-        log_llm_prompt(messages)
-        response = client.chat.completions.create(
-            model=name,
-            temperature=temp,
-            messages=messages,
-            max_tokens=1000,
-        )
-        text_response = (
-            response.choices[0]
-            .message.content.strip()
-            .replace(f"{character.name}: ", "")
-            .replace('"', "")
-        )
+        await asyncio.to_thread(log_llm_prompt, messages)
+        response = await llm_router.acreate("llama", messages, max_tokens=1000)
+        text_response = clean_reply(response.choices[0].message.content, character.name)
 
         # Validate response
         if not text_response or len(text_response.strip()) < 2:
-            print("Messages", messages)
-            print("Empty or invalid response received from LLM")
-            raise Exception("Empty response from LLM")
+            logger.warning(f"Empty or invalid response received from LLM for {messages}")
+            raise EmptyReplyError("Empty response from LLM")
 
         return text_response
     except Exception as e:
-        print(f"LLM response generation failed: {e}")
+        logger.warning(f"LLM response generation failed: {e}")
         raise  # Let retry decorator handle it
 
 
-# Retry audio generation
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-def generate_audio_with_retry(text: str, character: Character) -> dict:
-    """Generate audio and return data instead of emitting directly"""
+def clean_reply(text: str, character_name: str) -> str:
+    """Strip the speaker's name prefix and quotes from a generated reply"""
+    return text.strip().replace(f"{character_name}: ", "").replace('"', "")
+
+
+def generate_speaker_and_reply(
+        session: Session, context: List[str], character_list: List[str]
+) -> Optional[tuple]:
+    """
+    Ask one completion for both the next speaker and their reply.
+
+    Returns (speaker, reply), or None if the call fails or its output can't
+    be validated against the show's characters.
+    """
+    return upstream_loop.run(generate_speaker_and_reply_async(session, context, character_list))
+
+
+async def generate_speaker_and_reply_async(
+        session: Session, context: List[str], character_list: List[str]
+) -> Optional[tuple]:
+    messages = format_combined_messages(session, context)
     try:
+        await asyncio.to_thread(log_llm_prompt, messages)
+        response = await llm_router.acreate("llama", messages, max_tokens=1000)
+        result = parse_speaker_reply(response.choices[0].message.content, character_list)
+    except Exception as e:
+        logger.warning(f"[{session.room}] Combined speaker and reply generation failed: {e}")
+        return None
 
-        data = b""
+    if not result:
+        logger.warning(f"[{session.room}] Combined speaker and reply output could not be parsed")
+        return None
+    speaker, reply = result
+    return speaker, clean_reply(reply, speaker)
 
-        if character.voice_id == "joe-rogan":
+
+def voice_params(voice_id: str) -> dict:
+    """Provider, model and voice settings used to synthesize a voice"""
+    if voice_id == "joe-rogan":
+        return {
+            "provider": "neets",
+            "voice_id": voice_id,
+            "model": "ar-diff-50k",
+            "output_format": "mp3",
+            "voice_settings": None,
+        }
+
+    # ElevenLabs API
+    voice_settings = {
+        "stability": 0.5,
+        "similarity_boost": 0.8,
+        "style": 0.0,
+        "use_speaker_boost": True,
+    }
+
+    if voice_id == "x86uQqNKUBgPBwbii6G0":
+        voice_settings = {
+            "stability": 0.8,
+            "similarity_boost": 0.7,
+            "style": 0.3,
+            "use_speaker_boost": True,
+        }
+
+    return {
+        "provider": "elevenlabs",
+        "voice_id": voice_id,  # Adam pre-made voice
+        "model": "eleven_multilingual_v2",  # use the turbo model for low latency
+        "output_format": "mp3_22050_32",
+        "voice_settings": voice_settings,
+    }
+
+
+def synthesize_speech(text: str, character: Character) -> bytes:
+    """
+    Synthesize `text` in the character's voice, serving repeats from the TTS
+    cache. Falls back to the voices in TTS_FALLBACK_VOICES when the voice's
+    provider has an open circuit or fails.
+    """
+    return upstream_loop.run(synthesize_speech_async(text, character))
+
+
+async def synthesize_speech_async(text: str, character: Character) -> bytes:
+    voice_ids = [character.voice_id, *TTS_FALLBACK_VOICES.get(character.voice_id, [])]
+    last_error = None
+    for voice_id in voice_ids:
+        params = voice_params(voice_id)
+        key = tts_cache_key(
+            text,
+            params["voice_id"],
+            params["model"],
+            params["output_format"],
+            params["voice_settings"],
+        )
+
+        data = await asyncio.to_thread(tts_cache.get, key) if tts_cache else None
+        if data is not None:
+            logger.info(f"TTS cache hit for: {text[:30]}...")
+            return data
+
+        if not breakers.get(params["provider"]).available():
+            logger.warning(f"Skipping {params['provider']} voice {voice_id}: circuit open")
+            continue
+        try:
+            if params["provider"] not in tts_clients:
+                # Built in a worker thread: the SDK import would stall the loop
+                await asyncio.to_thread(tts_client, params["provider"])
+            data = await request_speech_async(text, params)
+        except Exception as e:
+            last_error = e
+            continue
+
+        if tts_cache:
+            try:
+                await asyncio.to_thread(tts_cache.put, key, data)
+            except OSError as e:
+                logger.error(f"Failed to write TTS cache entry: {e}")
+        return data
+
+    raise last_error or CircuitOpenError(f"No TTS provider available for {character.name}")
+
+
+def tts_client(provider: str):
+    """Neets HTTP client or ElevenLabs SDK client, created on first use"""
+    with tts_clients_lock:
+        client = tts_clients.get(provider)
+        if client is None:
+            if provider == "neets":
+                import httpx
+
+                client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+                    timeout=httpx.Timeout(30.0, connect=5.0),
+                )
+            else:
+                from elevenlabs.client import AsyncElevenLabs
+
+                client = AsyncElevenLabs(api_key=ELEVENLABS_API_KEY)
+            logger.info(f"Created {provider} TTS client")
+            tts_clients[provider] = client
+        return client
+
+
+# Retry audio generation. Short waits: a provider that keeps failing trips its
+# circuit breaker and the caller moves on to a fallback voice.
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=0.5, min=0.5, max=2),
+    retry=retry_if_not_exception_type(CircuitOpenError),
+)
+async def request_speech_async(text: str, params: dict) -> bytes:
+    limiter = rate_limits.get(params["provider"])
+    async with limiter.acquire_async(LIVE, chars=len(text)):
+        return await send_speech_request(text, params, limiter)
+
+
+async def send_speech_request(text: str, params: dict, limiter) -> bytes:
+    breaker = breakers.get(params["provider"])
+    breaker.check()
+    try:
+        if params["provider"] == "neets":
             # Neets API
             neets_url = "https://api.neets.ai/v1/tts"
             headers = {
@@ -393,75 +1148,202 @@ def generate_audio_with_retry(text: str, character: Character) -> dict:
 
             payload = {
                 "text": text,
-                "voice_id": character.voice_id,
+                "voice_id": params["voice_id"],
                 "params": {
-                    "model": "ar-diff-50k",
+                    "model": params["model"],
                 },
             }
 
             logger.info(f"Generating audio for: {text[:30]}...")
-            audio_response = requests.post(neets_url, json=payload, headers=headers)
-            data = audio_response.content
-
-            if audio_response.status_code != 200:
-                logger.error(f"Audio generation failed: {audio_response.text}")
-                raise Exception(f"Failed to generate audio: {audio_response.text}")
+            async with tts_client("neets").stream(
+                    "POST", neets_url, json=payload, headers=headers
+            ) as audio_response:
+                if audio_response.status_code != 200:
+                    body = (await audio_response.aread()).decode("utf-8", "replace")
+                    logger.error(f"Audio generation failed: {body}")
+                    import httpx
+
+                    raise httpx.HTTPStatusError(
+                        f"Failed to generate audio: {body}",
+                        request=audio_response.request,
+                        response=audio_response,
+                    )
+                data = b"".join([chunk async for chunk in audio_response.aiter_bytes(8192)])
         else:
-            # ElevenLabs API
-            voice_settings = VoiceSettings(
-                stability=0.5,
-                similarity_boost=0.8,
-                style=0.0,
-                use_speaker_boost=True,
-            )
-
-            if character.voice_id == "x86uQqNKUBgPBwbii6G0":
-                voice_settings = VoiceSettings(
-                    stability=0.8,
-                    similarity_boost=0.7,
-                    style=0.3,
-                    use_speaker_boost=True,
-                )
+            from elevenlabs import VoiceSettings
 
-
-            audio_response = elevenlabs_client.text_to_speech.convert(
-                voice_id=character.voice_id, # Adam pre-made voice
-                output_format="mp3_22050_32",
+            audio_response = tts_client("elevenlabs").text_to_speech.convert(
+                voice_id=params["voice_id"],
+                output_format=params["output_format"],
                 text=text,
-                model_id="eleven_multilingual_v2", # use the turbo model for low latency
-                voice_settings=voice_settings,
+                model_id=params["model"],
+                voice_settings=VoiceSettings(**params["voice_settings"]),
             )
 
-            data = b""
-            for chunk in audio_response:
-                if chunk:
-                    data += chunk
-
-        return {
-            "audio": base64.b64encode(data).decode("utf-8"),
-            "metadata": {
-                "text": text,
-                "character": {
-                    "name": character.name,
-                    "avatar_url": character.avatar_url,
-                },
-            },
-        }
+            data = b"".join([chunk async for chunk in audio_response if chunk])
 
+    except asyncio.CancelledError:
+        breaker.record_cancelled()
+        raise
     except Exception as e:
+        backoff = retry_after(e)
+        if backoff is None:
+            breaker.record_failure()
+        else:
+            # Rate limited: the provider is up, just busy
+            breaker.record_success()
+            limiter.throttle(backoff)
         logger.error(f"Audio generation failed for text: {text}")
         logger.error(f"Error: {e}")
         raise
 
+    breaker.record_success()
+    return data
+
+
+def process_audio(data: bytes, character: Character) -> tuple:
+    """Post-process a clip, returning (audio, duration, lip sync envelope, crossfade)"""
+    if audio_processor:
+        try:
+            clip = audio_processor.process(data)
+            lip_sync = (
+                lip_sync_from_samples(clip.samples, clip.sample_rate, character.mouth_positions)
+                if LIP_SYNC_ENABLED else None
+            )
+            # Never longer than the clip's fades, or half the clip
+            crossfade = min(AUDIO_CROSSFADE_SECONDS, audio_processor.fade_seconds,
+                            clip.duration / 2)
+            return clip.data, clip.duration, lip_sync, crossfade
+        except Exception as e:
+            logger.warning(f"Audio post-processing failed, sending clip as is: {e}")
+
+    lip_sync = lip_sync_frames(data, character.mouth_positions) if LIP_SYNC_ENABLED else None
+    # Unprocessed clips have no fades to blend
+    return data, estimate_mp3_duration(data), lip_sync, 0.0
+
+
+def build_audio_payload(data: bytes, text: str, character: Character) -> dict:
+    """Wrap synthesized audio and its metadata for `emit_audio`"""
+    data, duration, lip_sync, crossfade = process_audio(data, character)
+    return {
+        "audio": data,
+        "metadata": {
+            "text": text,
+            "character": {
+                "name": character.name,
+                "avatar_url": character.avatar_url,
+            },
+            "duration": duration,
+            # Seconds this clip overlaps the next one when played
+            "crossfade": crossfade,
+            # Mouth position per video frame, None without numpy/miniaudio
+            "lip_sync": lip_sync,
+        },
+    }
+
+
+async def build_audio_payload_async(data: bytes, text: str, character: Character) -> dict:
+    # Decoding, loudness and lip sync are CPU work, kept off the loop
+    return await asyncio.to_thread(build_audio_payload, data, text, character)
+
+
+def generate_audio_with_retry(text: str, character: Character) -> dict:
+    """Generate audio and return data instead of emitting directly"""
+    return build_audio_payload(synthesize_speech(text, character), text, character)
+
+
+async def generate_audio_async(text: str, character: Character) -> dict:
+    data = await synthesize_speech_async(text, character)
+    return await build_audio_payload_async(data, text, character)
+
+
+def stream_audio_with_retry(text: str, character: Character, turn_id: int):
+    """
+    Synthesize a reply sentence by sentence.
+
+    Yields one audio payload per sentence as soon as it is
+    synthesized, tagged with the turn id, its sequence number within the
+    turn and whether it is the last chunk of the turn.
+    """
+    sentences = split_sentences(text, min_chars=STREAM_MIN_SENTENCE_CHARS)
+    for sequence, sentence in enumerate(sentences):
+        payload = build_audio_payload(
+            synthesize_speech(sentence, character), sentence, character
+        )
+        payload["turn"] = turn_id
+        payload["sequence"] = sequence
+        payload["end_of_turn"] = sequence == len(sentences) - 1
+        yield payload
+
+
+def stream_sentences_audio(sentences: Iterable[str], character: Character, turn_id: int):
+    """
+    Same as `stream_audio_with_retry` for sentences still arriving from the
+    LLM. The number of sentences isn't known up front, so each payload is
+    held, already synthesized, until the next sentence or the end of the
+    reply shows whether it's the last one.
+    """
+    previous = None
+    sequence = 0
+    for sentence in sentences:
+        payload = build_audio_payload(
+            synthesize_speech(sentence, character), sentence, character
+        )
+        if previous:
+            yield previous
+        payload["turn"] = turn_id
+        payload["sequence"] = sequence
+        payload["end_of_turn"] = False
+        previous = payload
+        sequence += 1
+    if previous:
+        previous["end_of_turn"] = True
+        yield previous
+
+
+async def stream_audio_async(text: str, character: Character,
+                             turn_id: int) -> AsyncIterator[dict]:
+    """`stream_audio_with_retry` for the async pipeline"""
+    sentences = split_sentences(text, min_chars=STREAM_MIN_SENTENCE_CHARS)
+    for sequence, sentence in enumerate(sentences):
+        payload = await generate_audio_async(sentence, character)
+        payload["turn"] = turn_id
+        payload["sequence"] = sequence
+        payload["end_of_turn"] = sequence == len(sentences) - 1
+        yield payload
+
+
+async def stream_sentences_audio_async(sentences: AsyncIterator[str], character: Character,
+                                       turn_id: int) -> AsyncIterator[dict]:
+    """`stream_sentences_audio` for the async pipeline"""
+    previous = None
+    sequence = 0
+    async for sentence in sentences:
+        payload = await generate_audio_async(sentence, character)
+        if previous:
+            yield previous
+        payload["turn"] = turn_id
+        payload["sequence"] = sequence
+        payload["end_of_turn"] = False
+        previous = payload
+        sequence += 1
+    if previous:
+        previous["end_of_turn"] = True
+        yield previous
+
 
 @socketio.on("stop_conversation")
-def handle_stop():
-    global conversation_active, conversation_history, topic_turn_counter
-    conversation_active = False
-    conversation_history = []  # Clear history if desired
-    current_topic = topic_flow[0]
-    topic_turn_counter = 0  # Reset counter but keep current topic
-    emit("conversation_stopped")
+def handle_stop(data=None):
+    room = stop_show(request.sid, data or {})
+    emit("conversation_stopped", {"room": room}, to=room)
+
+
+def stop_show(client_id: str, data: dict) -> str:
+    """Stop the show in the client's (or the given) room, returns the room"""
+    room = data.get("room") or client_rooms.get(client_id, DEFAULT_ROOM)
+    # Stopping the show frees its session; the next start begins afresh
+    sessions.remove(room)
+    return room
 
 
 def determine_appropriate_character(
@@ -470,13 +1352,17 @@ def determine_appropriate_character(
     """
     Determines the most appropriate character to respond based on conversation context.
     """
+    return upstream_loop.run(determine_appropriate_character_async(context, character_list))
+
+
+async def determine_appropriate_character_async(
+        context: List[str], character_list: List[str]
+) -> Optional[str]:
     # Check if last message is from System
     # if context and "System:" in context[-1]:
     #     print("System message detected, returning Agent Rogue")
     #     return "Agent Rogue"
 
-    set_openai_credentials("llama3.1")
-
     # Check if replying to specific character
     replying_character = check_latest_reply(context, character_list)
     if replying_character:
@@ -503,14 +1389,9 @@ def determine_appropriate_character(
             },
         ]
 
-        log_llm_prompt(chat_messages)
+        await asyncio.to_thread(log_llm_prompt, chat_messages)
 
-        response = client.chat.completions.create(
-            model=name,
-            messages=chat_messages,
-            temperature=temp,
-            max_tokens=50,
-        )
+        response = await llm_router.acreate("llama3.1", chat_messages, max_tokens=50)
 
         character_name = response.choices[0].message.content.strip()
         print("Character name determined: ", character_name)
@@ -529,96 +1410,333 @@ def determine_appropriate_character(
 
 @app.route("/characters", methods=["GET"])
 def get_characters():
-    """Get the list of characters"""
+    """Get the list of characters of a room's show"""
+    session = get_request_session()
+    if session:
+        pair, characters, prompts = session.pair, session.characters, session.prompts
+    else:
+        default_pair = pair_registry.get(DEFAULT_CHARACTER_PAIR)
+        if default_pair is None:
+            # Nothing to show until the default pair's file is fixed
+            message = f"Default character pair {DEFAULT_CHARACTER_PAIR} is unavailable"
+            error = pair_registry.errors.get(DEFAULT_CHARACTER_PAIR)
+            return jsonify(
+                {"status": "error", "message": f"{message} ({error})" if error else message}
+            ), 503
+        pair, characters, prompts = (
+            default_pair.name, default_pair.characters, default_pair.prompts
+        )
     return jsonify(
         {
+            "pair": pair,
             "characters": [
                 {
                     "name": character.name,
                     "avatar_url": character.avatar_url,
                     "description": character.description,
                     "mouth_positions": character.mouth_positions,
+                    "prompt_tokens": prompts.reply[character.name].prefix_tokens,
                 }
                 for character in characters.values()
-            ]
+            ],
+            "combined_prompt_tokens": prompts.combined.prefix_tokens,
         }
     )
 
 
+@app.route("/pairs/<pair>/manifest", methods=["GET"])
+def get_pair_manifest(pair):
+    """Get the images a character pair needs, for clients to preload"""
+    character_pair = pair_registry.get(pair)
+    if character_pair is None:
+        return jsonify({"status": "error", "message": f"Unknown character pair: {pair}"}), 404
+    if request.if_none_match.contains(character_pair.etag):
+        return Response(status=304)
+    response = Response(character_pair.manifest_json, mimetype="application/json")
+    response.set_etag(character_pair.etag)
+    return response
+
+
+def admin_authorized() -> bool:
+    return ADMIN_TOKEN is None or request.headers.get("X-Admin-Token") == ADMIN_TOKEN
+
+
+@app.route("/admin/pairs", methods=["GET"])
+def get_admin_pairs():
+    """Get every loaded character pair and the files that failed validation"""
+    if not admin_authorized():
+        return jsonify({"status": "error", "message": "Unauthorized"}), 401
+    return jsonify(pair_registry.snapshot())
+
+
+@app.route("/admin/pairs/reload", methods=["POST"])
+def reload_pairs():
+    """Rescan character_pairs/ and swap changed pairs into live shows"""
+    if not admin_authorized():
+        return jsonify({"status": "error", "message": "Unauthorized"}), 401
+    return jsonify({"status": "success", **pair_registry.refresh()})
+
+
+@app.route("/admin/shows/<room>/pair", methods=["POST"])
+def set_show_pair(room):
+    """Switch a room's show to another character pair without stopping it"""
+    if not admin_authorized():
+        return jsonify({"status": "error", "message": "Unauthorized"}), 401
+    pair = (request.json or {}).get("pair")
+    character_pair = pair_registry.get(pair)
+    if character_pair is None:
+        return jsonify({"status": "error", "message": f"Unknown character pair: {pair}"}), 400
+    session = sessions.get(room)
+    if session is None:
+        return jsonify({"status": "error", "message": f"No show in room {room}"}), 404
+    switch_show_pair(session, character_pair)
+    return jsonify({"status": "success", "room": room, "pair": session.pair})
+
+
+def apply_pair_update(pair: CharacterPair) -> None:
+    """Swap a reloaded pair into every show that uses it"""
+    for session in sessions.all():
+        if session.pair == pair.name:
+            switch_show_pair(session, pair)
+
+
+def switch_show_pair(session: Session, pair: CharacterPair) -> None:
+    cast_changed = session.use_pair(pair)
+    if session.speaker_selector:
+        session.speaker_selector = build_speaker_selector(session)
+    if cast_changed:
+        # Prepared turns and candidates may be for characters who have left
+        if session.speculator:
+            session.speculator.cancel()
+        if session.pipeline:
+            session.pipeline.flush()
+    emit_event("characters_updated", pair.manifest, session.room)
+
+
 @app.route("/set_topic", methods=["POST"])
 def set_topic():
-    """Set the current conversation topic"""
-    global topic_flow
-    data = request.json
+    """Set the current conversation topic of a room's show"""
+    data = request.get_json(silent=True) or {}
     new_topic = data.get("topic")
+    if not isinstance(new_topic, str) or not new_topic.strip():
+        return jsonify({"status": "error", "message": "topic must be a non-empty string"}), 400
+    new_topic = new_topic.strip()
+    room = data.get("room") or DEFAULT_ROOM
+    # Only start_conversation creates shows
+    session = sessions.get(room)
+    if session is None:
+        return jsonify({"status": "error", "message": f"No show in room {room}"}), 404
 
-    # Add new topic to the flow if it's not already there
-    if new_topic not in topic_flow:
-        topic_flow.insert(topic_flow_index + 1, new_topic)
+    session.set_topic(new_topic)
 
-    topic_turn_counter = 0  # Reset counter when new topic is set
+    # Drop turns prepared for the previous topic
+    if session.pipeline:
+        session.pipeline.flush()
 
     return jsonify(
         {
             "status": "success",
-            "topic": current_topic,
-            "topic_flow": topic_flow,
-            "topic_turn_counter": topic_turn_counter,
-            "topic_flow_index": topic_flow_index,
+            "room": room,
+            "topic": session.current_topic,
+            "topic_flow": session.topic_flow,
+            "topic_turn_counter": session.topic_turn_counter,
+            "topic_flow_index": session.topic_flow_index,
             # Optionally return the updated flow
         }
     )
 
 
+@app.route("/upstreams", methods=["GET"])
+def get_upstreams():
+    """Get the circuit breaker and rate limiter state of every LLM and TTS upstream"""
+    return jsonify({
+        "breakers": breakers.snapshot(),
+        "rate_limits": rate_limits.snapshot(),
+        "server_mode": SERVER_MODE,
+        # In-flight upstream requests are loop tasks, not threads (in ASGI
+        # mode the shows' pipeline stages are too)
+        "upstream_tasks": upstream_loop.tasks(),
+        "threads": threading.active_count(),
+    })
+
+
+@app.route("/llm_latency", methods=["GET"])
+def get_llm_latency():
+    """Get per-backend latency histograms and hedging counters"""
+    return jsonify(llm_router.stats())
+
+
+@app.route("/tts_cache", methods=["GET"])
+def get_tts_cache_stats():
+    """Get TTS cache hit/miss counters"""
+    if not tts_cache:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **tts_cache.stats()})
+
+
 @app.route("/get_topics", methods=["GET"])
 def get_topics():
-    """Get the list of topics"""
-    return jsonify({"topics": topic_flow, "current_topic": current_topic})
+    """Get the list of topics of a room's show"""
+    session = get_request_session()
+    if not session:
+        topic_flow = get_topic_flow()
+        return jsonify({"topics": topic_flow, "current_topic": topic_flow[0]})
+    return jsonify(
+        {"topics": session.topic_flow, "current_topic": session.current_topic}
+    )
+
+
+@app.route("/shows", methods=["GET"])
+def get_shows():
+    """List the shows hosted by this process"""
+    return jsonify(
+        {
+            "shows": [
+                {
+                    "room": session.room,
+                    "pair": session.pair,
+                    "active": session.conversation_active,
+                    "listeners": len(session.listeners),
+                    "current_topic": session.current_topic,
+                    "episode": session.episode.episode_id if session.episode else None,
+                    "speculation": (
+                        session.speculator.snapshot() if session.speculator else None
+                    ),
+                }
+                for session in sessions.all()
+            ],
+            "pairs": pair_registry.names(),
+        }
+    )
+
+
+@app.route("/conversation_log", methods=["GET"])
+def get_conversation_log():
+    """Get the most recent logged turns, optionally for one room"""
+    count = min(request.args.get("tail", 50, type=int), 1000)
+    room = request.args.get("room")
+    # Read extra entries when filtering so other rooms don't crowd this one out
+    entries = tail_log(CONVERSATION_LOG_PATH, count * 4 if room else count)
+    if room:
+        entries = [entry for entry in entries if entry.get("room") == room]
+    return jsonify({"entries": entries[-count:]})
+
+
+@app.route("/episodes", methods=["GET"])
+def get_episodes():
+    """List archived episodes, optionally for one room"""
+    if not episode_archive:
+        return jsonify({"episodes": []})
+    return jsonify({"episodes": episode_archive.episodes(request.args.get("room"))})
+
+
+@app.route("/episodes/<room>/<episode_id>/segments", methods=["GET"])
+def get_episode_segments(room, episode_id):
+    """Get the clips of an episode with their byte ranges and metadata"""
+    info = episode_archive.info(room, episode_id) if episode_archive else None
+    if not info:
+        return jsonify({"error": "Unknown episode"}), 404
+    return jsonify({**info, "segments": episode_archive.segments(room, episode_id)})
+
+
+@app.route("/episodes/<room>/<episode_id>/playlist.m3u8", methods=["GET"])
+def get_episode_playlist(room, episode_id):
+    """HLS playlist of an episode, live until the show stops"""
+    info = episode_archive.info(room, episode_id) if episode_archive else None
+    if not info:
+        return jsonify({"error": "Unknown episode"}), 404
+    playlist = hls_playlist(
+        episode_archive.segments(room, episode_id),
+        "audio.mp3",
+        ended=info["ended_at"] is not None,
+    )
+    return Response(
+        playlist,
+        mimetype="application/vnd.apple.mpegurl",
+        # Live playlists change with every turn
+        headers={"Cache-Control": "max-age=60" if info["ended_at"] else "no-cache"},
+    )
+
+
+@app.route("/episodes/<room>/<episode_id>/audio.mp3", methods=["GET"])
+def get_episode_audio(room, episode_id):
+    """Serve an episode's audio with byte-range support"""
+    if not episode_archive or not episode_archive.info(room, episode_id):
+        return jsonify({"error": "Unknown episode"}), 404
+    path = episode_archive.audio_path(room, episode_id)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return jsonify({"error": "Unknown episode"}), 404
+
+    headers = {"Accept-Ranges": "bytes"}
+    try:
+        byte_range = parse_range(request.headers.get("Range"), size)
+    except ValueError:
+        return Response(status=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        if size == 0:
+            # Ranges against an empty file were already answered with 416
+            return Response(b"", mimetype="audio/mpeg", headers=headers)
+        start, end, status = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return Response(
+        read_range(path, start, end),
+        status=status,
+        mimetype="audio/mpeg",
+        headers=headers,
+        direct_passthrough=True,
+    )
+
+
+def get_request_session() -> Optional[Session]:
+    """Session of the room named in the `room` query parameter"""
+    return sessions.get(request.args.get("room", DEFAULT_ROOM))
 
 
 def format_chat_messages(
-        character: Character, context: List[str]
+        session: Session,
+        character: Character,
+        messages: List[ConversationMessage],
+        summary: str = "",
 ) -> List[Dict[str, str]]:
     """Format messages for OpenAI chat completion"""
 
     chat_messages = []
-    for msg in context:
-        parts = msg.split(": ", 1)
-        if len(parts) == 2:
-            speaker_name, content = parts
-            if speaker_name == "System":
-                chat_messages.append({"role": "system", "content": content})
-            elif speaker_name == character.name:
-                chat_messages.append({"role": "assistant", "content": content})
-            else:
-                chat_messages.append({"role": "user", "content": content})
-
-    topic_prompt = (
-        f"\nThe current topic of discussion is: {current_topic}."
-        if current_topic
-        else ""
-    )
+    if summary:
+        chat_messages.append(
+            {"role": "system", "content": f"Earlier in this conversation: {summary}"}
+        )
+    for msg in messages:
+        if msg.character_name == character.name:
+            chat_messages.append({"role": "assistant", "content": msg.content})
+        else:
+            chat_messages.append({"role": "user", "content": msg.content})
 
-    system_prompt = f"""
-    You are {character.name}. {character.name}'s description: {character.description}
-    
-    You are in a podcast with the following other guests: {', '.join([name for name in get_character_names(characters) if name != character.name])}. 
-    Your message should tie in with the most recent messages sent, but can also contain hilarious unpredictability.{topic_prompt}
-    
-    Rules:
-    1) Only respond as {character.name}.
-    2) Frame your phrasing and messages as close to a podcast as possible. You've been a guest on the Joe Rogan Experience and other world famous podcasts.
-    3) If the last message is from you, ensure your next response moves the conversation forward in an engaging manner.
-    4) Do NOT add non conversational messages like *laughs* or *claps* or *nods*, (laughs nervously), (chuckles) etc. DO NOT INCLUDE THEM AT ALL PLEASE
-    7) Make SURE to talk about the current topic and naturally incorporate it into your response.
-    8) Keep your responses FUNNY and EDGY. Do not make it too serious and do NOT be woke!
-    9) Your response should be concise and limited to 50 words.
-    10) Do NOT always mention the other guests name in your response especially in further turns
-    """
+    system_prompt = session.prompts.reply[character.name].render(session.current_topic)
 
     return [{"role": "system", "content": system_prompt}, *chat_messages]
 
 
+def format_combined_messages(session: Session, context: List[str]) -> List[Dict[str, str]]:
+    """Format a single prompt that picks the next speaker and writes their reply"""
+    system_prompt = session.prompts.combined.render(session.current_topic)
+    context_string = "\n".join(context)
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": f"Conversation so far:\n{context_string}\n\nWho speaks next and what do they say?",
+        },
+    ]
+
+
 def generate_audio(character: Character, text: str) -> str:
     """Generate audio using Neets TTS"""
     try:
@@ -635,6 +1753,8 @@ def generate_audio(character: Character, text: str) -> str:
         }
 
         print("Requesting audio generation from Neets...")
+        import requests
+
         audio_response = requests.post(neets_url, json=payload, headers=headers)
         print("Audio response status:", audio_response.status_code)
 
@@ -649,95 +1769,142 @@ def generate_audio(character: Character, text: str) -> str:
         raise e
 
 
-def process_queue():
-    """Process and emit responses from the queue"""
-    global conversation_active, response_queue, conversation_history
-    print("PROCESSING QUEUE")
-    while conversation_active:
+def enqueue_response(session: Session, payload: dict) -> bool:
+    """
+    Hand an emitted clip to `process_queue`, waiting while the queue is full.
+
+    Returns False if the show stopped before there was room.
+    """
+    responses = session.response_queue
+    while session.conversation_active:
         try:
-            if not response_queue.empty():
-                response_data = response_queue.get()
-
-                # Create conversation message and log it without culling
-                new_message = ConversationMessage(
-                    character_name=response_data["character"]["name"],
-                    content=response_data["message"],
-                    timestamp=time.time(),
-                )
-                conversation_history.append(new_message)
-                log_conversation(new_message)
-
-                # Emit to client with audio data
-                socketio.emit(
-                    "new_response",
-                    {
-                        "character": response_data["character"],
-                        "message": response_data["message"],
-                        "audio": response_data[
-                            "audio"
-                        ],  # This is the base64 audio data
-                    },
-                )
-                print("SENDING AUDIO DATA TO BACKEND")
-                # Add delay between responses
-                time.sleep(0.5)
-            else:
-                print("RESPONSE QUEUE EMPTY")
-                time.sleep(0.1)
+            responses.put(payload, timeout=RESPONSE_QUEUE_TIMEOUT)
+            return True
+        except queue.Full:
+            logger.info(f"[{session.room}] Response queue full, waiting...")
+    return False
+
 
+def process_queue(session: Session, responses: Queue):
+    """Emit queued responses as legacy "new_response" events until the show stops"""
+    logger.info(f"[{session.room}] Processing response queue")
+    while True:
+        try:
+            response_data = responses.get(timeout=RESPONSE_QUEUE_TIMEOUT)
+        except queue.Empty:
+            if not session.conversation_active:
+                break
+            continue
+        if response_data is RESPONSE_QUEUE_CLOSED:
+            break
+
+        try:
+            socketio.emit("new_response", new_response_event(response_data), to=session.room)
         except Exception as e:
-            print(f"Error processing queue: {e}")
-            socketio.emit("error", {"message": str(e)})
-            time.sleep(0.5)
+            logger.error(f"[{session.room}] Error processing queue: {e}")
+            socketio.emit("error", {"message": str(e)}, to=session.room)
+    logger.info(f"[{session.room}] Response queue closed")
+
+
+def new_response_event(payload: dict) -> dict:
+    """Legacy "new_response" event for an audio payload"""
+    metadata = payload["metadata"]
+    return {
+        "character": metadata["character"],
+        "message": metadata["text"],
+        "audio": base64.b64encode(payload["audio"]).decode("utf-8"),
+    }
+
+
+llm_prompt_log_lock = threading.Lock()
 
 
 def log_llm_prompt(messages: List[Dict[str, str]]) -> None:
     """Log the prompt being sent to the LLM"""
-    with open("llm_prompt.log", "w") as f:
+    # Called from worker threads, which would otherwise interleave their writes
+    with llm_prompt_log_lock, open("llm_prompt.log", "w") as f:
         f.write(str(messages))
 
 
-def log_conversation(message: ConversationMessage) -> None:
-    """Log conversation messages to JSON file"""
-    log_entry = {
-        "character_name": message.character_name,
-        "message": message.content,
-        "timestamp": message.timestamp,
-    }
+def log_conversation(message: ConversationMessage, room: str = DEFAULT_ROOM) -> None:
+    """Append a conversation message to the JSONL log"""
+    conversation_log.append(
+        {
+            "room": room,
+            "character_name": message.character_name,
+            "message": message.content,
+            "timestamp": message.timestamp,
+        }
+    )
 
-    try:
-        # Read existing logs
-        try:
-            with open("conversation.json", "r") as f:
-                logs = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            logs = []
 
-        # Append new entry
-        logs.append(log_entry)
+def create_asgi_app():
+    """
+    ASGI application for SERVER_MODE = "asgi": Socket.IO on a python-socketio
+    AsyncServer, every other path served by the Flask app.
+    """
+    global async_sio
+    import socketio as python_socketio
+    from a2wsgi import WSGIMiddleware
+
+    async_sio = python_socketio.AsyncServer(
+        async_mode="asgi",
+        cors_allowed_origins="*",
+        ping_timeout=120,
+        ping_interval=15,
+        max_http_buffer_size=1e6,
+    )
+
+    @async_sio.event
+    async def connect(sid, environ, auth=None):
+        connect_client(sid, dict(parse_qsl(environ.get("QUERY_STRING", ""))))
+
+    @async_sio.event
+    async def disconnect(sid, reason=None):
+        disconnect_client(sid)
+
+    @async_sio.on("set_audio_transport")
+    async def on_set_audio_transport(sid, data=None):
+        transport = set_client_transport(sid, (data or {}).get("transport"))
+        await async_sio.emit("audio_transport", {"transport": transport}, to=sid)
+
+    @async_sio.on("join_show")
+    async def on_join_show(sid, data=None):
+        room = join_show(sid, (data or {}).get("room", DEFAULT_ROOM))
+        await async_sio.emit("joined_show", {"room": room}, to=sid)
+
+    @async_sio.on("start_conversation")
+    async def on_start(sid, data=None):
+        error = start_show(sid, data or {})
+        if error:
+            await async_sio.emit("error", {"message": error}, to=sid)
+
+    @async_sio.on("stop_conversation")
+    async def on_stop(sid, data=None):
+        room = stop_show(sid, data or {})
+        await async_sio.emit("conversation_stopped", {"room": room}, to=room)
+
+    # Flask routes run on a small thread pool of their own
+    return python_socketio.ASGIApp(
+        async_sio, other_asgi_app=WSGIMiddleware(app, workers=ASGI_HTTP_WORKERS)
+    )
 
-        # Write updated logs
-        with open("conversation.json", "w") as f:
-            json.dump(logs, f, indent=2)
-    except Exception as e:
-        print(f"Error logging conversation: {e}")
 
+def serve_asgi(host: str = "127.0.0.1", port: int = 5000) -> None:
+    """Serve the ASGI app with uvicorn on upstream_loop, alongside the shows"""
+    import uvicorn
 
-def emit_with_retry(event, data, max_retries=3):
-    """Emit with retry logic and connection check"""
-    for attempt in range(max_retries):
-        try:
-            if active_clients:
-                socketio.emit(event, data)
-                return True
-            else:
-                logger.warning("No active clients for emit")
-                time.sleep(2)
-        except Exception as e:
-            logger.error(f"Emit failed (attempt {attempt + 1}/{max_retries}): {e}")
-            time.sleep(1)
-    return False
+    server = uvicorn.Server(uvicorn.Config(create_asgi_app(), host=host, port=port))
+    finished = upstream_loop.submit(server.serve())
+    try:
+        finished.result()
+    except KeyboardInterrupt:
+        server.should_exit = True
+        finished.result(timeout=10)
 
 
 if __name__ == "__main__":
-    socketio.run(app, debug=True)
+    if SERVER_MODE == "asgi":
+        serve_asgi()
+    else:
+        socketio.run(app, debug=True)
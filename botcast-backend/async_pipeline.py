@@ -0,0 +1,381 @@
+"""
+Turn pipeline running as asyncio tasks.
+
+The same select -> write -> voice -> emit stages as ``pipeline.TurnPipeline``,
+but every stage is a task on one event loop and the stage callbacks are
+coroutines. A show then costs four tasks instead of four threads, and
+stopping it cancels whatever upstream request its stages are waiting on.
+Used when the server runs in ASGI mode, where Socket.IO, the pipelines and
+the LLM and TTS requests share the upstream loop.
+"""
+import asyncio
+import logging
+import time
+import traceback
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Union
+
+from pipeline import Turn, _ABORTED, _END_OF_TURN
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTurn(Turn):
+    """A turn whose `sentences` and `chunks` are asyncio queues"""
+
+    async def streamed_sentences(self) -> AsyncIterator[str]:
+        """Sentences of a reply that may still be being written, as they arrive"""
+        while True:
+            sentence = await self.sentences.get()
+            if sentence is _END_OF_TURN:
+                return
+            yield sentence
+
+
+async def _close(iterator) -> None:
+    aclose = getattr(iterator, "aclose", None)
+    if aclose:
+        await aclose()
+
+
+class AsyncTurnPipeline:
+    """
+    Runs the select -> write -> voice -> emit stages as tasks.
+
+    Takes the same arguments as ``TurnPipeline``, except that
+    ``select_speaker``, ``generate_text``, ``emit`` and ``emit_chunk`` are
+    coroutine functions, ``stream_text`` returns an async iterator and
+    ``synthesize`` is a coroutine returning a payload dict or an async
+    iterator of payloads. ``commit``, ``on_drop`` and ``playback_seconds``
+    stay plain functions and must not block.
+
+    ``start`` and ``run`` must be called on the loop; ``stop`` and ``flush``
+    may be called from any thread.
+    """
+
+    def __init__(
+            self,
+            select_speaker: Callable[[AsyncTurn], Awaitable[Optional[str]]],
+            generate_text: Callable[[AsyncTurn], Awaitable[str]],
+            commit: Callable[[AsyncTurn], None],
+            synthesize: Callable[[AsyncTurn], Awaitable[Union[dict, AsyncIterator[dict]]]],
+            emit: Callable[[AsyncTurn], Awaitable[None]],
+            emit_chunk: Optional[Callable[[AsyncTurn, Optional[dict]], Awaitable[None]]] = None,
+            on_drop: Optional[Callable[[AsyncTurn], None]] = None,
+            stream_text: Optional[Callable[[AsyncTurn], AsyncIterator[str]]] = None,
+            lookahead: int = 2,
+            playback_seconds: Optional[Callable[[dict], Optional[float]]] = None,
+            turn_gap: float = 1.0,
+    ):
+        self.select_speaker = select_speaker
+        self.generate_text = generate_text
+        self.commit = commit
+        self.synthesize = synthesize
+        self.emit = emit
+        self.emit_chunk = emit_chunk
+        self.on_drop = on_drop
+        self.stream_text = stream_text
+        self.lookahead = max(0, int(lookahead))
+        self.playback_seconds = playback_seconds
+        self.turn_gap = turn_gap
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped = False
+        self._epoch = 0
+        self._seq = 0
+        self._tasks: List[asyncio.Task] = []
+        # Streamed turn the emit stage is currently sending
+        self._emitting: Optional[AsyncTurn] = None
+        # Estimated time at which listeners finish playing what was emitted
+        self._playback_end = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks) and not self._stopped
+
+    def start(self) -> None:
+        """Start the stage tasks on the running loop"""
+        self._loop = asyncio.get_running_loop()
+        # Created here so they belong to the running loop
+        self._slots = asyncio.Semaphore(self.lookahead + 1)
+        self._commit_gate = asyncio.Semaphore(1)
+        self._selected: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._written: asyncio.Queue = asyncio.Queue(maxsize=max(1, self.lookahead))
+        self._voiced: asyncio.Queue = asyncio.Queue(maxsize=max(1, self.lookahead))
+        stages = [
+            ("select", self._select_stage),
+            ("write", self._write_stage),
+            ("voice", self._voice_stage),
+            ("emit", self._emit_stage),
+        ]
+        for stage_name, stage in stages:
+            self._tasks.append(
+                asyncio.ensure_future(self._run_stage(stage_name, stage()))
+            )
+        logger.info(f"Async turn pipeline started with lookahead {self.lookahead}")
+        if self._stopped:
+            self._shutdown()
+
+    async def run(self) -> None:
+        """Start the pipeline and wait until it is stopped"""
+        self.start()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stop(self) -> None:
+        """Cancel all stages and discard every turn that has not been emitted"""
+        self._stopped = True
+        self._call_on_loop(self._shutdown)
+        logger.info("Turn pipeline stopped")
+
+    def flush(self) -> None:
+        """
+        Discard every prepared turn that has not been emitted yet.
+
+        Turns currently inside a stage callback are discarded as soon as the
+        callback returns. Used on topic switches so listeners move on at once.
+        """
+        self._call_on_loop(self._flush)
+
+    # Stage plumbing
+
+    def _call_on_loop(self, callback: Callable[[], None]) -> None:
+        if self._loop is None:
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            callback()
+        else:
+            self._loop.call_soon_threadsafe(callback)
+
+    def _shutdown(self) -> None:
+        self._flush()
+        for task in self._tasks:
+            task.cancel()
+
+    def _flush(self) -> None:
+        self._epoch += 1
+        for q in (self._selected, self._written, self._voiced):
+            while not q.empty():
+                self._discard(q.get_nowait())
+        if self._emitting is not None:
+            # Wake the emitter so it drops the rest of the turn
+            self._emitting.chunks.put_nowait(_END_OF_TURN)
+
+    async def _run_stage(self, stage_name: str, stage: Awaitable) -> None:
+        try:
+            await stage
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Pipeline stage {stage_name} crashed: {e}")
+            traceback.print_exc()
+            self.stop()
+
+    def _stale(self, turn: AsyncTurn) -> bool:
+        return self._stopped or turn.epoch != self._epoch
+
+    async def _get(self, q: asyncio.Queue) -> Optional[AsyncTurn]:
+        turn = await q.get()
+        if self._stale(turn):
+            self._discard(turn)
+            return None
+        return turn
+
+    def _release_commit(self, turn: AsyncTurn) -> None:
+        if turn._holds_commit:
+            turn._holds_commit = False
+            self._commit_gate.release()
+
+    def _release_slot(self, turn: AsyncTurn) -> None:
+        if turn._holds_slot:
+            turn._holds_slot = False
+            self._slots.release()
+
+    def _discard(self, turn: AsyncTurn) -> None:
+        self._release_commit(turn)
+        self._release_slot(turn)
+        if self.on_drop and turn.character:
+            try:
+                self.on_drop(turn)
+            except Exception as e:
+                logger.error(f"Error dropping turn {turn.seq}: {e}")
+
+    def _commit(self, turn: AsyncTurn) -> bool:
+        if self._stale(turn):
+            self._discard(turn)
+            return False
+        self.commit(turn)
+        turn.committed = True
+        self._release_commit(turn)
+        return True
+
+    # Stages
+
+    async def _select_stage(self) -> None:
+        while True:
+            await self._slots.acquire()
+            await self._commit_gate.acquire()
+            self._seq += 1
+            turn = AsyncTurn(self._seq, self._epoch)
+            turn._holds_slot = True
+            turn._holds_commit = True
+
+            try:
+                turn.character = await self.select_speaker(turn)
+            except Exception as e:
+                logger.error(f"Speaker selection failed: {e}")
+                turn.character = None
+
+            if not turn.character or self._stale(turn):
+                self._discard(turn)
+                await asyncio.sleep(0.5)
+                continue
+
+            logger.info(f"Turn {turn.seq}: selected {turn.character}")
+            await self._selected.put(turn)
+
+    async def _write_stage(self) -> None:
+        while True:
+            turn = await self._get(self._selected)
+            if turn is None:
+                continue
+            if turn.text is None and self.stream_text:
+                await self._write_streamed(turn)
+                continue
+
+            try:
+                if turn.text is None:
+                    turn.text = await self.generate_text(turn)
+            except Exception as e:
+                logger.error(f"Text generation failed: {e}")
+                self._discard(turn)
+                continue
+
+            if self._commit(turn):
+                await self._written.put(turn)
+
+    async def _write_streamed(self, turn: AsyncTurn) -> None:
+        turn.sentences = asyncio.Queue()
+        parts = []
+        handed_off = False
+        sentences = self.stream_text(turn)
+        try:
+            try:
+                async for sentence in sentences:
+                    if self._stale(turn):
+                        break
+                    parts.append(sentence)
+                    turn.sentences.put_nowait(sentence)
+                    if not handed_off:
+                        # Voicing starts while the rest is still being written
+                        handed_off = True
+                        await self._written.put(turn)
+            except Exception as e:
+                logger.error(f"Text generation failed: {e}")
+            finally:
+                await _close(sentences)
+
+            if not parts:
+                self._discard(turn)
+                return
+            # A reply cut short by an error is committed as far as it was voiced
+            turn.text = " ".join(parts)
+            self._commit(turn)
+        finally:
+            # Only after the commit, so the emitter sees the recorded message
+            turn.sentences.put_nowait(_END_OF_TURN)
+
+    async def _voice_stage(self) -> None:
+        while True:
+            turn = await self._get(self._written)
+            if turn is None:
+                continue
+
+            try:
+                result = await self.synthesize(turn)
+            except Exception as e:
+                logger.error(f"Audio generation failed: {e}")
+                traceback.print_exc()
+                self._discard(turn)
+                continue
+
+            if isinstance(result, dict):
+                turn.audio = result
+                await self._voiced.put(turn)
+            else:
+                # Stream the turn: hand it to the emitter straight away and
+                # feed it chunks as they are synthesized.
+                turn.chunks = asyncio.Queue()
+                await self._voiced.put(turn)
+                await self._stream_chunks(turn, result)
+
+    async def _stream_chunks(self, turn: AsyncTurn, chunks: AsyncIterator[dict]) -> None:
+        try:
+            async for chunk in chunks:
+                if self._stale(turn):
+                    break
+                turn.chunks.put_nowait(chunk)
+            turn.chunks.put_nowait(_END_OF_TURN)
+        except Exception as e:
+            logger.error(f"Streaming audio generation failed: {e}")
+            traceback.print_exc()
+            turn.chunks.put_nowait(_ABORTED)
+        finally:
+            await _close(chunks)
+
+    async def _emit_stage(self) -> None:
+        while True:
+            turn = await self._get(self._voiced)
+            if turn is None:
+                continue
+
+            try:
+                if turn.chunks is not None:
+                    emitted = await self._emit_stream(turn)
+                else:
+                    await self.emit(turn)
+                    self._advance_playback(turn.audio)
+                    emitted = True
+            except Exception as e:
+                logger.error(f"Audio emission failed: {e}")
+                traceback.print_exc()
+                emitted = False
+
+            if not emitted:
+                self._discard(turn)
+                continue
+
+            # Hold this turn's slot while it plays so the producers stay at
+            # most `lookahead` turns ahead of what listeners are hearing.
+            self._playback_end += self.turn_gap
+            await asyncio.sleep(max(0.0, self._playback_end - time.time()))
+            self._release_slot(turn)
+
+    async def _emit_stream(self, turn: AsyncTurn) -> bool:
+        """Emit a streamed turn's chunks as they arrive, returns False if none were sent"""
+        emitted = 0
+        self._emitting = turn
+        try:
+            while True:
+                chunk = await turn.chunks.get()
+                if chunk is _END_OF_TURN:
+                    return emitted > 0
+                if chunk is _ABORTED or self._stale(turn):
+                    # Close the turn for clients that already got part of it
+                    if emitted:
+                        await self.emit_chunk(turn, None)
+                    return emitted > 0
+
+                await self.emit_chunk(turn, chunk)
+                self._advance_playback(chunk)
+                emitted += 1
+        finally:
+            self._emitting = None
+
+    def _advance_playback(self, payload: Optional[dict]) -> None:
+        duration = None
+        if self.playback_seconds and payload:
+            duration = self.playback_seconds(payload)
+        self._playback_end = max(self._playback_end, time.time()) + (duration or 0)
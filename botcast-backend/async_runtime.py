@@ -0,0 +1,88 @@
+"""
+Shared asyncio event loop for upstream I/O.
+
+Every request to an LLM or TTS provider runs as a coroutine on one event loop
+in a background thread. An in-flight request then costs a task instead of a
+thread, hedged requests can actually be cancelled, and retry backoff doesn't
+hold a thread while it sleeps. In the app's threading server mode the web
+server and turn pipelines stay threaded; in ASGI mode they run on this loop
+as well.
+"""
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import AsyncIterator, Awaitable, Iterator, Optional
+
+# Marks the end of an iterated async stream
+_DONE = object()
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopThread:
+    """An asyncio loop running forever in a daemon thread"""
+
+    def __init__(self, name: str = "upstream-io"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Awaitable) -> Future:
+        """Schedule a coroutine on the loop from any other thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None):
+        """Run a coroutine on the loop and block the calling thread for its result"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("EventLoopThread.run called from the loop's own thread")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # Don't leave the coroutine running if the caller gave up
+            future.cancel()
+            raise
+
+    def iterate(self, stream: AsyncIterator) -> Iterator:
+        """
+        Consume an async iterator on the loop from another thread.
+
+        Items are handed over as they arrive. Closing the returned generator
+        before the end cancels the async one.
+        """
+        items = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in stream:
+                    items.put(item)
+                items.put(_DONE)
+            except BaseException as e:
+                items.put(e)
+                raise
+
+        future = self.submit(pump())
+        try:
+            while True:
+                item = items.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def tasks(self) -> int:
+        """Number of coroutines currently scheduled on the loop"""
+        return len(asyncio.all_tasks(self.loop))
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
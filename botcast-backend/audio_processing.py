@@ -0,0 +1,226 @@
+"""
+Post-processing for synthesized speech.
+
+Neets and ElevenLabs return clips with different loudness, sample rates and
+amounts of leading/trailing silence. Each clip is decoded once, trimmed,
+normalized to a target integrated loudness (ITU-R BS.1770 K-weighted LUFS),
+faded at the edges and re-encoded to one output format, so consecutive
+clips can be crossfaded without volume jumps.
+
+Clients overlap consecutive clips by the fade length. Both clips are
+peak-limited and their linear fades sum to one, so the overlap never gets
+louder than the louder clip and can't clip.
+
+Needs NumPy and miniaudio to decode and lameenc to encode; `available()`
+reports whether the stage can run. They are imported when the first clip is
+processed.
+"""
+import logging
+import math
+from typing import NamedTuple, Optional
+
+from lazy_import import LazyModule, modules_available
+
+lameenc = LazyModule("lameenc")
+miniaudio = LazyModule("miniaudio")
+np = LazyModule("numpy")
+
+logger = logging.getLogger(__name__)
+
+# Gating from BS.1770: 400 ms blocks with 75% overlap, absolute gate at
+# -70 LUFS and a relative gate 10 LU below the ungated loudness
+_BLOCK_SECONDS = 0.4
+_BLOCK_OVERLAP = 0.75
+_ABSOLUTE_GATE = -70.0
+_RELATIVE_GATE = -10.0
+
+
+class ProcessedClip(NamedTuple):
+    """Re-encoded audio plus the samples it was encoded from"""
+
+    data: bytes
+    samples: object
+    sample_rate: int
+    duration: float
+    loudness: Optional[float]
+
+
+def available() -> bool:
+    return modules_available("lameenc", "miniaudio", "numpy")
+
+
+def _biquad_response(b, a, freqs, sample_rate):
+    """Magnitude response of a biquad at `freqs` Hz"""
+    z = np.exp(-1j * 2 * np.pi * freqs / sample_rate)
+    numerator = b[0] + b[1] * z + b[2] * z ** 2
+    denominator = a[0] + a[1] * z + a[2] * z ** 2
+    return np.abs(numerator / denominator)
+
+
+def _k_weighting(freqs, sample_rate: int):
+    """BS.1770 K-weighting (high shelf + high pass) magnitude at `freqs` Hz"""
+    # High shelf: +4 dB above ~1.7 kHz, models the head's acoustic effect
+    gain, q, fc = 3.99984385397, 0.7071752369554193, 1681.9744509555319
+    k = math.tan(math.pi * fc / sample_rate)
+    vh = 10 ** (gain / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf_b = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0]
+    shelf_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    # High pass at ~38 Hz (RLB weighting)
+    q, fc = 0.5003270373253953, 38.13547087613982
+    k = math.tan(math.pi * fc / sample_rate)
+    a0 = 1 + k / q + k * k
+    pass_b = [1.0, -2.0, 1.0]
+    pass_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    return (
+        _biquad_response(shelf_b, shelf_a, freqs, sample_rate)
+        * _biquad_response(pass_b, pass_a, freqs, sample_rate)
+    )
+
+
+def integrated_loudness(samples, sample_rate: int) -> Optional[float]:
+    """
+    Gated integrated loudness of mono samples in LUFS, None if it's silent
+    or shorter than one block.
+
+    The K-weighting is applied in the frequency domain, which gives the same
+    block energies as the time-domain filters up to phase.
+    """
+    block = int(_BLOCK_SECONDS * sample_rate)
+    if len(samples) < block:
+        return None
+    spectrum = np.fft.rfft(samples)
+    freqs = np.fft.rfftfreq(len(samples), 1.0 / sample_rate)
+    weighted = np.fft.irfft(spectrum * _k_weighting(freqs, sample_rate), n=len(samples))
+
+    step = int(block * (1 - _BLOCK_OVERLAP))
+    starts = np.arange(0, len(weighted) - block + 1, step)
+    squares = np.concatenate(([0.0], np.cumsum(weighted.astype(np.float64) ** 2)))
+    power = (squares[starts + block] - squares[starts]) / block
+    with np.errstate(divide="ignore"):
+        loudness = -0.691 + 10 * np.log10(power)
+
+    gated = power[loudness > _ABSOLUTE_GATE]
+    if not len(gated):
+        return None
+    relative_gate = -0.691 + 10 * math.log10(gated.mean()) + _RELATIVE_GATE
+    gated = power[(loudness > _ABSOLUTE_GATE) & (loudness > relative_gate)]
+    return -0.691 + 10 * math.log10(gated.mean())
+
+
+def trim_silence(samples, sample_rate: int, threshold_db: float = -45.0,
+                 keep_seconds: float = 0.05):
+    """Cut leading and trailing audio quieter than `threshold_db` below the peak"""
+    peak = np.max(np.abs(samples)) if len(samples) else 0
+    if peak <= 0:
+        return samples[:0]
+    frame = max(int(0.01 * sample_rate), 1)
+    frames = len(samples) // frame
+    if not frames:
+        return samples
+    rms = np.sqrt(np.mean(samples[:frames * frame].reshape(frames, frame) ** 2, axis=1))
+    loud = np.nonzero(rms > peak * 10 ** (threshold_db / 20))[0]
+    if not len(loud):
+        return samples[:0]
+    keep = int(keep_seconds * sample_rate)
+    start = max(loud[0] * frame - keep, 0)
+    end = min((loud[-1] + 1) * frame + keep, len(samples))
+    return samples[start:end]
+
+
+def fade_edges(samples, sample_rate: int, fade_seconds: float):
+    """Apply a short linear fade in and out so joins between clips don't click"""
+    fade = min(int(fade_seconds * sample_rate), len(samples) // 2)
+    if fade <= 0:
+        return samples
+    samples = samples.copy()
+    ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+    samples[:fade] *= ramp
+    samples[-fade:] *= ramp[::-1]
+    return samples
+
+
+class AudioProcessor:
+    """
+    Decode, trim, loudness-normalize and re-encode speech clips.
+
+    Args:
+        target_lufs: Integrated loudness every clip is normalized to.
+        peak_dbfs: Sample peak the gain is capped at to avoid clipping.
+        sample_rate: Output sample rate; clips are resampled while decoding.
+        bitrate: Output MP3 bitrate in kbps.
+        trim_db: Silence threshold below the clip's peak.
+        keep_silence: Seconds of silence kept at each trimmed edge.
+        fade_seconds: Fade in/out at the clip edges, which is also the
+            longest crossfade clients can use between clips.
+    """
+
+    def __init__(
+            self,
+            target_lufs: float = -16.0,
+            peak_dbfs: float = -1.0,
+            sample_rate: int = 24000,
+            bitrate: int = 64,
+            trim_db: float = -45.0,
+            keep_silence: float = 0.05,
+            fade_seconds: float = 0.02,
+    ):
+        self.target_lufs = target_lufs
+        self.peak_dbfs = peak_dbfs
+        self.sample_rate = sample_rate
+        self.bitrate = bitrate
+        self.trim_db = trim_db
+        self.keep_silence = keep_silence
+        self.fade_seconds = fade_seconds
+
+    def decode(self, data: bytes):
+        decoded = miniaudio.decode(
+            data,
+            output_format=miniaudio.SampleFormat.SIGNED16,
+            nchannels=1,
+            sample_rate=self.sample_rate,
+        )
+        return np.frombuffer(decoded.samples, dtype=np.int16).astype(np.float32) / 32768.0
+
+    def encode(self, samples) -> bytes:
+        pcm = np.clip(np.round(samples * 32767.0), -32768, 32767).astype(np.int16)
+        encoder = lameenc.Encoder()
+        encoder.set_bit_rate(self.bitrate)
+        encoder.set_in_sample_rate(self.sample_rate)
+        encoder.set_channels(1)
+        encoder.set_quality(2)
+        return bytes(encoder.encode(pcm.tobytes()) + encoder.flush())
+
+    def process(self, data: bytes) -> ProcessedClip:
+        samples = self.decode(data)
+        if not len(samples):
+            raise ValueError("Clip has no audio")
+        samples, loudness = self.normalize(samples)
+        return ProcessedClip(
+            data=self.encode(samples),
+            samples=samples,
+            sample_rate=self.sample_rate,
+            duration=len(samples) / self.sample_rate,
+            loudness=loudness,
+        )
+
+    def normalize(self, samples) -> tuple:
+        """Trim, normalize and fade decoded samples, returns (samples, input loudness)"""
+        trimmed = trim_silence(samples, self.sample_rate, self.trim_db, self.keep_silence)
+        # An all-silent clip would trim down to nothing, which clients can't
+        # decode; keep it whole instead
+        if len(trimmed):
+            samples = trimmed
+
+        loudness = integrated_loudness(samples, self.sample_rate)
+        if loudness is not None:
+            gain = 10 ** ((self.target_lufs - loudness) / 20)
+            peak = np.max(np.abs(samples))
+            if peak > 0:
+                gain = min(gain, 10 ** (self.peak_dbfs / 20) / peak)
+            samples = samples * np.float32(gain)
+
+        return fade_edges(samples, self.sample_rate, self.fade_seconds), loudness
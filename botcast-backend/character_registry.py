@@ -0,0 +1,272 @@
+"""
+Registry of the character pair files in `character_pairs/`.
+
+Every pair file is parsed and validated once, and its compiled prompts and
+asset manifest are built with it, so starting a show is a dictionary lookup.
+The registry notices edited, added and removed files, either polled by a
+watcher thread or on demand, and swaps in the new version. An invalid edit is
+reported and the last good version of the pair stays in use.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from character_pairs.prompts import char_map
+from lip_sync import position_keys
+from prompt_templates import CompiledPrompts, compile_prompts
+from utils import CHARACTER_PAIRS_DIR, Character
+
+logger = logging.getLogger(__name__)
+
+
+class PairValidationError(ValueError):
+    """Raised for a pair file that can't be used"""
+
+
+class CharacterPair(NamedTuple):
+    """A validated pair file with everything derived from it"""
+
+    name: str
+    characters: Dict[str, Character]
+    prompts: CompiledPrompts
+    manifest: dict
+    # Manifest serialized once, served as is
+    manifest_json: bytes
+    etag: str
+    mtime: float
+
+    @property
+    def host(self) -> str:
+        return next(iter(self.characters))
+
+    @property
+    def guests(self) -> List[str]:
+        return list(self.characters)[1:]
+
+
+def _require_text(problems: List[str], char_name: str, info: dict, field: str) -> str:
+    value = info.get(field)
+    if not isinstance(value, str) or not value.strip():
+        problems.append(f"{char_name}: '{field}' must be a non-empty string")
+        return ""
+    return value
+
+
+def parse_pair(data) -> Dict[str, Character]:
+    """
+    Characters of a decoded pair file, keyed by name.
+
+    Raises PairValidationError listing every problem found.
+    """
+    if not isinstance(data, dict):
+        raise PairValidationError("Pair file must be an object keyed by character name")
+    if len(data) < 2:
+        raise PairValidationError("A pair needs at least two characters")
+
+    problems = []
+    characters = {}
+    for char_name, info in data.items():
+        if not isinstance(info, dict):
+            problems.append(f"{char_name}: entry must be an object")
+            continue
+        if info.get("name") != char_name:
+            problems.append(f"{char_name}: 'name' must match its key")
+        avatar_url = _require_text(problems, char_name, info, "avatar_url")
+        voice_id = _require_text(problems, char_name, info, "voice_id")
+
+        mouth_positions = info.get("mouth_positions", {})
+        if not isinstance(mouth_positions, dict) or not all(
+                isinstance(key, str) and key.isdigit() and isinstance(url, str)
+                for key, url in mouth_positions.items()
+        ):
+            problems.append(f"{char_name}: 'mouth_positions' must map numbers to image URLs")
+            mouth_positions = {}
+
+        aliases = info.get("aliases", [])
+        if not isinstance(aliases, list) or not all(isinstance(a, str) for a in aliases):
+            problems.append(f"{char_name}: 'aliases' must be a list of names")
+            aliases = []
+
+        # Prompts from prompts.py win over the description in the file
+        description = char_map.get(char_name) or info.get("description")
+        if not isinstance(description, str) or not description.strip():
+            problems.append(f"{char_name}: no prompt in prompts.py and no 'description'")
+
+        characters[char_name] = Character(
+            name=char_name,
+            avatar_url=avatar_url,
+            description=description,
+            voice_id=voice_id,
+            mouth_positions=mouth_positions,
+            aliases=aliases,
+        )
+
+    if problems:
+        raise PairValidationError("; ".join(problems))
+    return characters
+
+
+def build_manifest(name: str, characters: Dict[str, Character]) -> dict:
+    """Images each client needs for a pair, with mouth positions in lip sync order"""
+    manifest_characters = []
+    assets = set()
+    for character in characters.values():
+        positions = [
+            {"key": key, "url": character.mouth_positions[key]}
+            for key in position_keys(character.mouth_positions)
+        ]
+        manifest_characters.append({
+            "name": character.name,
+            "avatar_url": character.avatar_url,
+            "mouth_positions": positions,
+        })
+        assets.add(character.avatar_url)
+        assets.update(position["url"] for position in positions)
+    return {"pair": name, "characters": manifest_characters, "assets": sorted(assets)}
+
+
+def load_pair(directory: str, name: str) -> CharacterPair:
+    """Read, validate and compile one pair file"""
+    path = os.path.join(directory, name)
+    mtime = os.path.getmtime(path)
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise PairValidationError(f"Invalid JSON: {e}")
+    characters = parse_pair(data)
+    manifest = build_manifest(name, characters)
+    return CharacterPair(
+        name=name,
+        characters=characters,
+        prompts=compile_prompts(characters),
+        manifest=manifest,
+        manifest_json=json.dumps(manifest, separators=(",", ":")).encode("utf-8"),
+        etag=hashlib.sha1(raw).hexdigest(),
+        mtime=mtime,
+    )
+
+
+class PairRegistry:
+    """
+    Loaded character pairs, kept in sync with their files.
+
+    Args:
+        directory: Folder holding the `*.json` pair files.
+        on_change: ``(pair) -> None`` called for every pair that is
+            reloaded after the initial scan, e.g. to update live shows.
+    """
+
+    def __init__(self, directory: str = CHARACTER_PAIRS_DIR,
+                 on_change: Optional[Callable[[CharacterPair], None]] = None):
+        self.directory = directory
+        self.on_change = on_change
+        self.errors: Dict[str, str] = {}
+        self._pairs: Dict[str, CharacterPair] = {}
+        # (mtime, size) of each file when it was last read, valid or not
+        self._seen: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.refresh(notify=False)
+
+    def get(self, name: str) -> Optional[CharacterPair]:
+        with self._lock:
+            return self._pairs.get(name)
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._pairs)
+
+    def refresh(self, notify: bool = True) -> dict:
+        """
+        Rescan the directory, reloading files whose mtime or size changed.
+
+        Returns the names of the reloaded and removed pairs and the errors of
+        files that failed validation.
+        """
+        with self._refresh_lock:
+            files = {}
+            for file_name in os.listdir(self.directory):
+                if not file_name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, file_name))
+                except FileNotFoundError:
+                    continue
+                files[file_name] = (stat.st_mtime, stat.st_size)
+
+            reloaded = []
+            for file_name, signature in sorted(files.items()):
+                if self._seen.get(file_name) == signature:
+                    continue
+                self._seen[file_name] = signature
+                try:
+                    pair = load_pair(self.directory, file_name)
+                except (OSError, PairValidationError) as e:
+                    logger.error(f"Character pair {file_name} is invalid: {e}")
+                    with self._lock:
+                        self.errors[file_name] = str(e)
+                    continue
+                with self._lock:
+                    self._pairs[file_name] = pair
+                    self.errors.pop(file_name, None)
+                reloaded.append(pair)
+
+            removed = [name for name in list(self._seen) if name not in files]
+            with self._lock:
+                for name in removed:
+                    self._seen.pop(name)
+                    self._pairs.pop(name, None)
+                    self.errors.pop(name, None)
+                errors = dict(self.errors)
+
+        if reloaded or removed:
+            logger.info(
+                f"Character pairs reloaded: {[p.name for p in reloaded]}, removed: {removed}"
+            )
+        if notify and self.on_change:
+            for pair in reloaded:
+                try:
+                    self.on_change(pair)
+                except Exception as e:
+                    logger.error(f"Applying character pair {pair.name} failed: {e}")
+        return {"reloaded": [p.name for p in reloaded], "removed": removed, "errors": errors}
+
+    def watch(self, interval: float = 2.0) -> None:
+        """Poll the directory for changes in a background thread"""
+        if self._watcher:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error(f"Character pair refresh failed: {e}")
+
+        self._watcher = threading.Thread(target=run, name="pair-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pairs": {
+                    name: {
+                        "characters": list(pair.characters),
+                        "etag": pair.etag,
+                        "mtime": pair.mtime,
+                        "prompt_tokens": pair.prompts.token_counts(),
+                    }
+                    for name, pair in sorted(self._pairs.items())
+                },
+                "errors": dict(self.errors),
+            }
@@ -0,0 +1,154 @@
+"""
+Circuit breakers for upstream providers.
+
+A breaker opens after a run of consecutive failures. While it's open, calls
+to that upstream fail fast so the caller can route to a fallback straight
+away. After `reset_timeout` the breaker goes half-open and lets a limited
+number of probe calls through: a successful probe closes it again, a failed
+one re-opens it for another timeout.
+"""
+import logging
+import threading
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Args:
+        name: Upstream name, used in logs and the status endpoint.
+        failure_threshold: Consecutive failures that open the circuit.
+        reset_timeout: Seconds the circuit stays open before probing.
+        half_open_probes: Calls let through at once while half-open.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0, half_open_probes: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.failures = 0
+        self.total_failures = 0
+        self.total_successes = 0
+        self.opened_at = 0.0
+        self._state = CLOSED
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def available(self) -> bool:
+        """Whether a call would be let through, without claiming a probe"""
+        with self._lock:
+            state = self._current_state()
+            return state == CLOSED or (
+                state == HALF_OPEN and self._probes < self.half_open_probes
+            )
+
+    def allow(self) -> bool:
+        """Claim permission for one call; half-open circuits hand out probes"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            return False
+
+    def check(self) -> None:
+        """`allow`, raising CircuitOpenError when the call isn't allowed"""
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit for {self.name} is open")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.total_successes += 1
+            self.failures = 0
+            if self._state != CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self._state = CLOSED
+
+    def record_cancelled(self) -> None:
+        """Give back a probe whose call was cancelled before it had an outcome"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.total_failures += 1
+            self.failures += 1
+            state = self._current_state()
+            if state == HALF_OPEN or (
+                    state == CLOSED and self.failures >= self.failure_threshold
+            ):
+                self._state = OPEN
+                self.opened_at = time.monotonic()
+                logger.warning(
+                    f"Circuit for {self.name} opened after {self.failures} failures"
+                )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            state = self._current_state()
+            retry_in = (
+                max(self.reset_timeout - (time.monotonic() - self.opened_at), 0)
+                if state == OPEN else 0
+            )
+            return {
+                "state": state,
+                "consecutive_failures": self.failures,
+                "failures": self.total_failures,
+                "successes": self.total_successes,
+                "retry_in": retry_in,
+            }
+
+
+class BreakerRegistry:
+    """One CircuitBreaker per upstream, created on first use"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 half_open_probes: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(
+                    name,
+                    failure_threshold=self.failure_threshold,
+                    reset_timeout=self.reset_timeout,
+                    half_open_probes=self.half_open_probes,
+                )
+            return breaker
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.snapshot() for breaker in breakers}
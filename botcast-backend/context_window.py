@@ -0,0 +1,140 @@
+"""
+Token-budgeted rolling context for reply generation.
+
+Only the most recent messages that fit a per-model token budget are sent
+verbatim. Older messages are folded into a running summary by a background
+job, so prompt size stays roughly constant however long a show runs.
+"""
+import logging
+import math
+import threading
+from concurrent.futures import Executor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)"""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+class ContextWindow:
+    """
+    Splits a history into a summary plus the recent messages that fit the budget.
+
+    Args:
+        summarize: ``(previous_summary, messages) -> new_summary`` LLM call.
+        budget_tokens: Tokens allowed for the summary plus recent messages.
+        summary_tokens: Tokens the summary is trimmed to.
+        min_recent: Messages always kept verbatim, even over budget.
+        executor: Where summaries are computed; runs inline if None.
+        on_folded: ``(messages) -> None`` called once messages are part of
+            the summary, so the owner can drop them from its history.
+        count_tokens: Token counter, defaults to `estimate_tokens`.
+    """
+
+    def __init__(
+            self,
+            summarize: Callable[[str, List], str],
+            budget_tokens: int = 1500,
+            summary_tokens: int = 300,
+            min_recent: int = 4,
+            executor: Optional[Executor] = None,
+            on_folded: Optional[Callable[[List], None]] = None,
+            count_tokens: Callable[[str], int] = estimate_tokens,
+    ):
+        self.summarize = summarize
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.min_recent = min_recent
+        self.executor = executor
+        self.on_folded = on_folded
+        self.count_tokens = count_tokens
+        self.summary = ""
+        self._lock = threading.Lock()
+        self._folding = False
+        self._generation = 0
+        # Newest message already part of the summary
+        self._last_folded = None
+
+    def reset(self) -> None:
+        """Forget the summary, e.g. when the show moves to a new topic"""
+        with self._lock:
+            self.summary = ""
+            self._last_folded = None
+            self._generation += 1
+            self._folding = False
+
+    def _message_tokens(self, message) -> int:
+        return self.count_tokens(message.content) + 4
+
+    def build(self, messages: Sequence) -> Tuple[str, List]:
+        """
+        Return (summary, recent messages) for a prompt.
+
+        Messages that no longer fit and aren't summarized yet are handed to
+        the summarizer in the background; until it finishes they are simply
+        left out of the prompt.
+        """
+        with self._lock:
+            summary = self.summary
+            last_folded = self._last_folded
+        messages = list(messages)
+        for index, message in enumerate(messages):
+            if message is last_folded:
+                messages = messages[index + 1:]
+                break
+
+        budget = self.budget_tokens - self.count_tokens(summary)
+        recent = []
+        used = 0
+        for message in reversed(messages):
+            tokens = self._message_tokens(message)
+            if len(recent) >= self.min_recent and used + tokens > budget:
+                break
+            recent.append(message)
+            used += tokens
+        recent.reverse()
+
+        overflow = messages[: len(messages) - len(recent)]
+        if overflow:
+            self._schedule_fold(overflow)
+        return summary, recent
+
+    def _schedule_fold(self, overflow: List) -> None:
+        with self._lock:
+            if self._folding:
+                return
+            self._folding = True
+            generation = self._generation
+            previous = self.summary
+
+        if self.executor:
+            self.executor.submit(self._fold, generation, previous, overflow)
+        else:
+            self._fold(generation, previous, overflow)
+
+    def _fold(self, generation: int, previous: str, overflow: List) -> None:
+        try:
+            summary = self.summarize(previous, overflow).strip()
+            # Keep the summary within its budget
+            max_chars = self.summary_tokens * 4
+            if self.count_tokens(summary) > self.summary_tokens:
+                summary = summary[:max_chars].rsplit(" ", 1)[0]
+        except Exception as e:
+            logger.error(f"Context summarization failed: {e}")
+            with self._lock:
+                if generation == self._generation:
+                    self._folding = False
+            return
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            self.summary = summary
+            self._last_folded = overflow[-1]
+            self._folding = False
+
+        if self.on_folded:
+            self.on_folded(overflow)
@@ -0,0 +1,281 @@
+"""
+Append-only JSONL conversation log.
+
+Entries are handed to a background writer thread that batches them, appends
+one JSON object per line and fsyncs according to the configured policy, so
+logging a turn never blocks generation. Log files are rotated by size and/or
+age, and the reader helpers stream or tail a log without loading it whole.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+_CLOSE = object()
+
+
+class ConversationLog:
+    """
+    Background, batched JSONL writer.
+
+    Args:
+        path: Log file to append to.
+        fsync: "always" fsyncs after every batch, "interval" at most every
+            `fsync_interval` seconds, "never" leaves it to the OS.
+        fsync_interval: Seconds between fsyncs with the "interval" policy.
+        batch_size: Maximum entries written per batch.
+        flush_interval: Longest an entry waits in memory before being written.
+        max_bytes: Rotate once the file grows past this size (0 disables).
+        max_age: Rotate once the file has been written to for this many
+            seconds since it was opened (0 disables).
+        backups: Number of rotated files to keep (`path.1` is the newest).
+    """
+
+    def __init__(
+            self,
+            path: str,
+            fsync: str = "interval",
+            fsync_interval: float = 1.0,
+            batch_size: int = 64,
+            flush_interval: float = 0.5,
+            max_bytes: int = 50 * 1024 * 1024,
+            max_age: float = 0,
+            backups: int = 5,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backups = backups
+
+        self._queue: queue.Queue = queue.Queue()
+        self._file = None
+        self._opened_at = 0.0
+        self._last_fsync = 0.0
+        self._thread = threading.Thread(
+            target=self._run, name="conversation-log", daemon=True
+        )
+        self._thread.start()
+
+    def append(self, entry: dict) -> None:
+        """Queue an entry for writing, returns immediately"""
+        self._queue.put(entry)
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Write everything queued so far and stop the writer"""
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join(timeout)
+
+    # Writer thread
+
+    def _open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._opened_at = time.time()
+
+    def _run(self) -> None:
+        self._open()
+        closing = False
+        while not closing:
+            try:
+                entry = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._maybe_fsync(force=False)
+                continue
+
+            batch = []
+            while True:
+                if entry is _CLOSE:
+                    closing = True
+                    break
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    logger.error(f"Error logging conversation: {e}")
+
+        self._maybe_fsync(force=True)
+        self._file.close()
+
+    def _write(self, batch: List[dict]) -> None:
+        self._file.write(
+            "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in batch)
+        )
+        self._file.flush()
+        self._maybe_fsync(force=self.fsync == "always")
+        if self._should_rotate():
+            self._rotate()
+
+    def _maybe_fsync(self, force: bool) -> None:
+        if self.fsync == "never" or self._file is None:
+            return
+        now = time.time()
+        if force or now - self._last_fsync >= self.fsync_interval:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+    def _should_rotate(self) -> bool:
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        if self.max_age and time.time() - self._opened_at >= self.max_age:
+            return True
+        return False
+
+    def _rotate(self) -> None:
+        self._maybe_fsync(force=True)
+        self._file.close()
+        if self.backups > 0:
+            for index in range(self.backups - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        logger.info(f"Rotated conversation log {self.path}")
+        self._open()
+
+
+def read_log(path: str, include_rotated: bool = False) -> Iterator[dict]:
+    """
+    Stream the entries of a log file, oldest first, one line at a time.
+
+    With `include_rotated`, rotated files (`path.N` ... `path.1`) are read
+    before the live file.
+    """
+    paths = []
+    if include_rotated:
+        index = 1
+        while os.path.exists(f"{path}.{index}"):
+            paths.insert(0, f"{path}.{index}")
+            index += 1
+    paths.append(path)
+
+    for log_path in paths:
+        try:
+            with open(log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    entry = _parse_line(line)
+                    if entry is not None:
+                        yield entry
+        except FileNotFoundError:
+            continue
+
+
+def tail_log(path: str, count: int, block_size: int = 8192) -> List[dict]:
+    """
+    Return the last `count` entries by reading the file backwards.
+
+    When the live file holds fewer entries, e.g. just after a rotation, the
+    rest come from the newest rotated file (`path.1`).
+    """
+    entries = _tail_file(path, count, block_size)
+    if len(entries) < count:
+        entries = _tail_file(f"{path}.1", count - len(entries), block_size) + entries
+    return entries
+
+
+def _tail_file(path: str, count: int, block_size: int) -> List[dict]:
+    if count <= 0:
+        return []
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return []
+
+    with f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        # One extra line since the first one read may be partial
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+
+    lines = data.splitlines()
+    if position > 0:
+        lines = lines[1:]
+    entries = [_parse_line(line.decode("utf-8", "replace")) for line in lines]
+    return [entry for entry in entries if entry is not None][-count:]
+
+
+def follow_log(path: str, stop_event: threading.Event,
+               poll_interval: float = 0.5) -> Iterator[dict]:
+    """Yield entries as they are appended, like `tail -f`, until `stop_event` is set"""
+    f = None
+    inode = None
+    pending = ""
+    from_start = False
+    while not stop_event.is_set():
+        if f is None:
+            try:
+                f = open(path, "r", encoding="utf-8")
+                inode = os.fstat(f.fileno()).st_ino
+                if not from_start:
+                    f.seek(0, os.SEEK_END)
+            except FileNotFoundError:
+                from_start = True
+                stop_event.wait(poll_interval)
+                continue
+
+        chunk = f.read()
+        if chunk:
+            pending += chunk
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                entry = _parse_line(line)
+                if entry is not None:
+                    yield entry
+            continue
+
+        # Reopen after rotation
+        try:
+            if os.stat(path).st_ino != inode:
+                f.close()
+                f = None
+                pending = ""
+                from_start = True
+                continue
+        except FileNotFoundError:
+            pass
+        stop_event.wait(poll_interval)
+
+    if f:
+        f.close()
+
+
+def _parse_line(line: str) -> Optional[dict]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        # Torn final line from a crash mid-write
+        return None
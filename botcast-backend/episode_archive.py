@@ -0,0 +1,238 @@
+"""
+On-disk archive of every episode's audio.
+
+Each run of a show is an episode stored under
+``<archive>/<room>/<episode id>/``:
+
+- ``audio.mp3``: every emitted clip appended back to back
+- ``segments.jsonl``: one line per clip with its byte offset, length,
+  duration and metadata
+- ``episode.json``: room, character pair, start and end times
+
+Because clips are appended to a single file, a byte range of ``audio.mp3``
+is a complete clip. The HLS playlist is a list of those ranges
+(EXT-X-BYTERANGE), so ordinary players and CDNs can serve an episode, live or
+finished, from plain range requests.
+"""
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import threading
+import time
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AUDIO_FILE = "audio.mp3"
+SEGMENTS_FILE = "segments.jsonl"
+EPISODE_FILE = "episode.json"
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_-]")
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def safe_name(name: str) -> str:
+    """Directory name for a room or episode id"""
+    return _UNSAFE.sub("_", name)[:64] or "_"
+
+
+def _write_json(path: str, data: dict) -> None:
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+class Episode:
+    """Append-only writer for one episode"""
+
+    def __init__(self, directory: str, room: str, pair: str, episode_id: str):
+        self.directory = directory
+        self.room = room
+        self.pair = pair
+        self.episode_id = episode_id
+        self.info = {
+            "room": room,
+            "pair": pair,
+            "episode": episode_id,
+            "started_at": time.time(),
+            "ended_at": None,
+        }
+        os.makedirs(directory, exist_ok=True)
+        _write_json(os.path.join(directory, EPISODE_FILE), self.info)
+        self._audio = open(os.path.join(directory, AUDIO_FILE), "ab")
+        self._segments = open(os.path.join(directory, SEGMENTS_FILE), "a", encoding="utf-8")
+        self._offset = self._audio.tell()
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def append(self, audio: bytes, metadata: dict, duration: float) -> dict:
+        """Append one clip and its metadata, returning the segment entry"""
+        with self._lock:
+            if self._audio.closed:
+                raise ValueError("Episode is closed")
+            self._audio.write(audio)
+            self._audio.flush()
+            segment = {
+                "sequence": self._sequence,
+                "offset": self._offset,
+                "length": len(audio),
+                "duration": duration,
+                "timestamp": time.time(),
+                "metadata": metadata,
+            }
+            # The index line is written after the audio it points to, so
+            # readers never see a segment whose bytes aren't there yet
+            self._segments.write(json.dumps(segment, ensure_ascii=False) + "\n")
+            self._segments.flush()
+            self._offset += len(audio)
+            self._sequence += 1
+            return segment
+
+    def close(self) -> None:
+        with self._lock:
+            if self._audio.closed:
+                return
+            self._audio.close()
+            self._segments.close()
+            self.info["ended_at"] = time.time()
+            _write_json(os.path.join(self.directory, EPISODE_FILE), self.info)
+
+
+class EpisodeArchive:
+    """Creates episodes and finds them again for the HTTP routes"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def episode_dir(self, room: str, episode_id: str) -> str:
+        return os.path.join(self.directory, safe_name(room), safe_name(episode_id))
+
+    def start(self, room: str, pair: str) -> Episode:
+        episode_id = time.strftime("%Y%m%d-%H%M%S")
+        directory = self.episode_dir(room, episode_id)
+        # Restarting a show within the same second gets a suffix
+        suffix = 1
+        while os.path.exists(directory):
+            suffix += 1
+            directory = self.episode_dir(room, f"{episode_id}-{suffix}")
+        episode = Episode(directory, room, pair, os.path.basename(directory))
+        logger.info(f"[{room}] Archiving episode {episode.episode_id}")
+        return episode
+
+    def episodes(self, room: Optional[str] = None) -> List[dict]:
+        """Info of every archived episode, newest first"""
+        rooms = [safe_name(room)] if room else sorted(os.listdir(self.directory))
+        episodes = []
+        for room_dir in rooms:
+            room_path = os.path.join(self.directory, room_dir)
+            if not os.path.isdir(room_path):
+                continue
+            for episode_id in os.listdir(room_path):
+                info = self.info(room_dir, episode_id)
+                if info:
+                    episodes.append(info)
+        return sorted(episodes, key=lambda info: info["started_at"], reverse=True)
+
+    def info(self, room: str, episode_id: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.episode_dir(room, episode_id), EPISODE_FILE),
+                      encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def segments(self, room: str, episode_id: str) -> List[dict]:
+        path = os.path.join(self.episode_dir(room, episode_id), SEGMENTS_FILE)
+        segments = []
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        segments.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # Partial line still being written
+                        break
+        except FileNotFoundError:
+            pass
+        return segments
+
+    def audio_path(self, room: str, episode_id: str) -> str:
+        return os.path.join(self.episode_dir(room, episode_id), AUDIO_FILE)
+
+
+def hls_playlist(segments: List[dict], audio_uri: str, ended: bool) -> str:
+    """
+    HLS media playlist with one byte-range segment per clip.
+
+    Without `ended` the playlist is live: players reload it and pick up new
+    segments as they are appended.
+    """
+    target = max((math.ceil(s["duration"]) for s in segments), default=1)
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:4",
+        f"#EXT-X-TARGETDURATION:{max(target, 1)}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        f"#EXT-X-PLAYLIST-TYPE:{'VOD' if ended else 'EVENT'}",
+    ]
+    for segment in segments:
+        lines.append(f"#EXTINF:{segment['duration']:.3f},")
+        lines.append(f"#EXT-X-BYTERANGE:{segment['length']}@{segment['offset']}")
+        lines.append(audio_uri)
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive for a single `bytes=` Range header.
+
+    Returns None when there is no usable header (serve the whole file) and
+    raises ValueError when the range can't be satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match:
+        # Multiple ranges or another unit: fall back to the full body
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if size == 0:
+        # No byte of an empty file can be served
+        raise ValueError("Range not satisfiable")
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        # Syntactically invalid (RFC 7233 2.1): ignored, not unsatisfiable
+        return None
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def read_range(path: str, start: int, end: int, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+    """Yield bytes start..end (inclusive) of a file through a read-only memory map"""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0 or start >= size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            position = start
+            end = min(end, size - 1)
+            while position <= end:
+                stop = min(position + chunk_size, end + 1)
+                yield mapped[position:stop]
+                position = stop
@@ -0,0 +1,43 @@
+"""
+Deferred imports for heavy optional dependencies.
+
+NumPy, miniaudio and lameenc add a noticeable share of the server's start-up
+time but are only needed once the first clip is processed. A lazy module is
+imported on first attribute access, and `modules_available` checks that a
+module is installed without importing it.
+"""
+import importlib
+import importlib.util
+import threading
+from functools import lru_cache
+
+
+class LazyModule:
+    """Stand-in for a module that imports it on first attribute access"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._module or self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+@lru_cache(maxsize=None)
+def modules_available(*names: str) -> bool:
+    """Whether every module in `names` is installed, without importing them"""
+    try:
+        return all(importlib.util.find_spec(name) is not None for name in names)
+    except (ImportError, ValueError):
+        return False
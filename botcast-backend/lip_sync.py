@@ -0,0 +1,96 @@
+"""
+Lip-sync envelopes for synthesized speech.
+
+The MP3 is decoded once on the server and reduced to one RMS amplitude per
+video frame, already quantized to the character's `mouth_positions`. Clients
+index the frame list with the playback time instead of running their own
+audio analysis.
+
+NumPy and miniaudio are optional: without them audio is sent without an
+envelope and clients fall back to analysing it themselves. Both are imported
+on first use.
+"""
+import logging
+from typing import Dict, List, Optional
+
+from lazy_import import LazyModule, modules_available
+
+miniaudio = LazyModule("miniaudio")
+np = LazyModule("numpy")
+
+logger = logging.getLogger(__name__)
+
+LIP_SYNC_FPS = 30
+# Frames quieter than this fraction of the clip's loud level keep the mouth closed
+SILENCE_LEVEL = 0.1
+# Percentile of frame loudness treated as full volume, so one peak doesn't
+# squash the rest of the clip into the lower positions
+LOUD_PERCENTILE = 95
+
+
+def lip_sync_available() -> bool:
+    return modules_available("miniaudio", "numpy")
+
+
+def decode_mp3(data: bytes):
+    """Decode MP3 bytes to (mono float32 samples in [-1, 1], sample rate)"""
+    decoded = miniaudio.decode(
+        data, output_format=miniaudio.SampleFormat.SIGNED16, nchannels=1
+    )
+    samples = np.frombuffer(decoded.samples, dtype=np.int16).astype(np.float32) / 32768.0
+    return samples, decoded.sample_rate
+
+
+def amplitude_envelope(samples, sample_rate: int, fps: int = LIP_SYNC_FPS):
+    """RMS amplitude of each 1/fps second frame"""
+    hop = max(int(round(sample_rate / fps)), 1)
+    frames = -(-len(samples) // hop)
+    padded = np.zeros(frames * hop, dtype=np.float32)
+    padded[:len(samples)] = samples
+    return np.sqrt(np.mean(padded.reshape(frames, hop) ** 2, axis=1))
+
+
+def quantize_envelope(envelope, levels: int):
+    """Map an envelope to position indexes 0..levels-1, 0 being the most closed"""
+    if not len(envelope):
+        return np.zeros(0, dtype=np.int8)
+    loud = np.percentile(envelope, LOUD_PERCENTILE)
+    if loud <= 0:
+        return np.zeros(len(envelope), dtype=np.int8)
+    normalized = np.clip(envelope / loud, 0.0, 1.0)
+    # Positions above the closed one split the range above the silence level evenly
+    edges = np.linspace(SILENCE_LEVEL, 1.0, levels)[:-1]
+    return np.digitize(normalized, edges).astype(np.int8)
+
+
+def position_keys(mouth_positions: Dict[str, str]) -> List[str]:
+    """Position keys from most closed to most open, e.g. ["10", "20", "30", "40"]"""
+    return sorted(mouth_positions, key=lambda key: int(key) if key.isdigit() else float("inf"))
+
+
+def lip_sync_frames(data: bytes, mouth_positions: Dict[str, str],
+                    fps: int = LIP_SYNC_FPS) -> Optional[dict]:
+    """
+    Envelope for an MP3 clip, or None if it can't be computed.
+
+    Returns ``{"fps": 30, "positions": ["10", ...], "frames": [0, 2, 3, ...]}``
+    where each frame is an index into `positions`.
+    """
+    if not lip_sync_available() or not mouth_positions:
+        return None
+    try:
+        samples, sample_rate = decode_mp3(data)
+    except Exception as e:
+        logger.warning(f"Couldn't decode audio for lip sync: {e}")
+        return None
+    return lip_sync_from_samples(samples, sample_rate, mouth_positions, fps)
+
+
+def lip_sync_from_samples(samples, sample_rate: int, mouth_positions: Dict[str, str],
+                          fps: int = LIP_SYNC_FPS) -> Optional[dict]:
+    """Same as `lip_sync_frames` for audio that's already decoded"""
+    if not mouth_positions:
+        return None
+    positions = position_keys(mouth_positions)
+    frames = quantize_envelope(amplitude_envelope(samples, sample_rate, fps), len(positions))
+    return {"fps": fps, "positions": positions, "frames": frames.tolist()}
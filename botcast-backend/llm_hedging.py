@@ -0,0 +1,438 @@
+"""
+Hedged LLM requests for live turns.
+
+A request goes to its primary backend first. If it hasn't answered by the
+time that backend usually has (its p95 latency, from a per-backend
+histogram), the same request is sent to the next backend on its route and
+whichever answers first wins. Failures move straight on to the next backend
+instead of sleeping, and every attempt is bounded by its backend's deadline.
+Backends whose API base has an open circuit breaker are skipped, and every
+request waits its turn in the API base's rate limiter.
+
+Requests run as coroutines with the async OpenAI clients on the shared
+upstream event loop, so a hedge that loses the race is cancelled and its
+connection released instead of running to completion in a thread.
+Streamed completions fail over the same way but are never hedged.
+"""
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from contextlib import AsyncExitStack
+from typing import Dict, List, Optional
+
+from async_runtime import EventLoopThread
+from circuit_breaker import BreakerRegistry, CircuitOpenError
+from llm_providers import ProviderRegistry, request_deadline
+from rate_limit import LIVE, RateLimits, retry_after
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram.
+
+    Bucket bounds grow by `growth` from `min_seconds` to `max_seconds`, so
+    quantiles are accurate to within one bucket (about 20% by default).
+    """
+
+    def __init__(self, min_seconds: float = 0.05, max_seconds: float = 120.0,
+                 growth: float = 1.2):
+        self.bounds = []
+        bound = min_seconds
+        while bound < max_seconds:
+            self.bounds.append(bound)
+            bound *= growth
+        self.bounds.append(max_seconds)
+        # Last bucket holds everything above max_seconds
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        index = bisect.bisect_left(self.bounds, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile, None if empty"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for index, bucket_count in enumerate(self.counts):
+                seen += bucket_count
+                if seen >= rank and bucket_count:
+                    return self.bounds[min(index, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class HedgedRouter:
+    """
+    Sends chat completions along a route of backends with hedging.
+
+    Args:
+        registry: Provider registry the model keys are looked up in.
+        loop: Event loop the requests run on.
+        routes: Alternates tried after each primary, e.g.
+            {"llama": ["llama_deepinfra"]}. Keys without a route are sent
+            to their own backend only.
+        hedge_quantile: Latency quantile of the primary after which the
+            request is hedged.
+        min_hedge_delay / max_hedge_delay: Clamp on the hedge delay.
+        default_hedge_delay: Used until a backend has `min_samples` samples.
+        max_attempts: Passes over the whole route before giving up.
+        hedging: With False, alternates are only used as failover.
+        breakers: Circuit breakers, one per API base. Optional.
+        limits: Rate limiters, one per API base. Optional.
+    """
+
+    def __init__(
+            self,
+            registry: ProviderRegistry,
+            loop: EventLoopThread,
+            routes: Optional[Dict[str, List[str]]] = None,
+            hedge_quantile: float = 0.95,
+            min_hedge_delay: float = 0.5,
+            max_hedge_delay: float = 10.0,
+            default_hedge_delay: float = 3.0,
+            min_samples: int = 20,
+            max_attempts: int = 2,
+            hedging: bool = True,
+            breakers: Optional[BreakerRegistry] = None,
+            limits: Optional[RateLimits] = None,
+    ):
+        self.registry = registry
+        self.loop = loop
+        self.routes = routes or {}
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self.max_attempts = max_attempts
+        self.hedging = hedging
+        self.breakers = breakers
+        self.limits = limits
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.counters = {
+            "requests": 0, "streams": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0,
+            "skipped": 0,
+        }
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, key: str) -> LatencyHistogram:
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            return histogram
+
+    def hedge_delay(self, key: str) -> float:
+        """Seconds to wait on `key` before hedging to the next backend"""
+        histogram = self.histogram(key)
+        if histogram.count < self.min_samples:
+            return self.default_hedge_delay
+        delay = histogram.quantile(self.hedge_quantile)
+        return min(max(delay, self.min_hedge_delay), self.max_hedge_delay)
+
+    def _client(self, key: str):
+        # Retries are handled here, so the SDK's own backoff is turned off
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self.registry.async_client(key).with_options(max_retries=0)
+                self._clients[key] = client
+            return client
+
+    async def _aclient(self, key: str):
+        client = self._clients.get(key)
+        if client is None:
+            # The first request for a backend imports its SDK; do that in a
+            # worker thread rather than stall everything else on the loop
+            client = await asyncio.to_thread(self._client, key)
+        return client
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _breaker(self, key: str):
+        if self.breakers is None:
+            return None
+        return self.breakers.get(self.registry.get(key).api_base)
+
+    async def _request(self, key: str, messages: List[dict], end: float, priority: int,
+                       params: dict):
+        handle = self.registry.get(key)
+        params = dict(params)
+        params.setdefault("temperature", handle.temperature)
+        limiter = self.limits.get(handle.api_base) if self.limits else None
+        if limiter:
+            async with limiter.acquire_async(priority, timeout=max(end - time.monotonic(), 0)):
+                return await self._send(key, handle, limiter, messages, end, params)
+        return await self._send(key, handle, limiter, messages, end, params)
+
+    async def _send(self, key, handle, limiter, messages, end, params):
+        breaker = self._breaker(key)
+        # Claimed here rather than at launch so a hedge still queued in the
+        # rate limiter doesn't use up a half-open probe
+        if breaker:
+            breaker.check()
+        timeout = max(end - time.monotonic(), 0.1)
+        start = time.monotonic()
+        try:
+            response = await (await self._aclient(key)).chat.completions.create(
+                model=handle.model,
+                messages=messages,
+                timeout=timeout,
+                **params,
+            )
+        except asyncio.CancelledError:
+            # Lost the race: says nothing about the backend's health
+            if breaker:
+                breaker.record_cancelled()
+            raise
+        except Exception as e:
+            backoff = retry_after(e)
+            if backoff is None:
+                if breaker:
+                    breaker.record_failure()
+            else:
+                # Being rate limited means the backend is up, just busy
+                if breaker:
+                    breaker.record_success()
+                if limiter:
+                    limiter.throttle(backoff)
+            # Failures count too: a backend timing out is a slow backend
+            self.histogram(key).record(time.monotonic() - start)
+            raise
+        self.histogram(key).record(time.monotonic() - start)
+        if breaker:
+            breaker.record_success()
+        return response
+
+    async def astream(self, key: str, messages: List[dict], deadline: Optional[float] = None,
+                      priority: int = LIVE, **params):
+        """
+        Stream a chat completion for model `key`, yielding content deltas.
+
+        Backends are tried in route order until one starts answering. A
+        stream that fails part way through raises, since its text can't be
+        continued on another backend.
+        """
+        self._count("streams")
+        route = [key] + [alt for alt in self.routes.get(key, []) if alt != key]
+        end = time.monotonic() + (deadline or request_deadline(key) * self.max_attempts)
+        available = self._available_route(route)
+        if not available:
+            raise CircuitOpenError(f"Every backend for {key} has an open circuit")
+        last_error = None
+        for index, backend in enumerate(available):
+            if time.monotonic() >= end:
+                break
+            if index:
+                self._count("failovers")
+            started = False
+            attempt_end = min(time.monotonic() + request_deadline(backend), end)
+            stream = self._stream(backend, messages, attempt_end, priority, params)
+            try:
+                async for delta in stream:
+                    started = True
+                    yield delta
+                return
+            except Exception as e:
+                if started:
+                    raise
+                last_error = e
+                logger.warning(f"LLM stream from {backend} failed: {e}")
+            finally:
+                # Releases the rate limiter slot as soon as the caller stops reading
+                await stream.aclose()
+        raise last_error or TimeoutError(f"LLM stream for {key} missed its deadline")
+
+    async def _stream(self, key: str, messages: List[dict], end: float, priority: int,
+                      params: dict):
+        handle = self.registry.get(key)
+        params = dict(params)
+        params.setdefault("temperature", handle.temperature)
+        limiter = self.limits.get(handle.api_base) if self.limits else None
+        breaker = self._breaker(key)
+        async with AsyncExitStack() as stack:
+            if limiter:
+                await stack.enter_async_context(
+                    limiter.acquire_async(priority, timeout=max(end - time.monotonic(), 0))
+                )
+            if breaker:
+                breaker.check()
+            received = False
+            try:
+                stream = await (await self._aclient(key)).chat.completions.create(
+                    model=handle.model,
+                    messages=messages,
+                    timeout=max(end - time.monotonic(), 0.1),
+                    stream=True,
+                    **params,
+                )
+                async with stream:
+                    async for chunk in stream:
+                        if time.monotonic() >= end:
+                            raise TimeoutError(f"LLM stream from {key} missed its deadline")
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            received = True
+                            yield delta
+            except (asyncio.CancelledError, GeneratorExit):
+                # Cut short by the caller: healthy if it was answering
+                if breaker:
+                    if received:
+                        breaker.record_success()
+                    else:
+                        breaker.record_cancelled()
+                raise
+            except Exception as e:
+                backoff = retry_after(e)
+                if backoff is None:
+                    if breaker:
+                        breaker.record_failure()
+                else:
+                    if breaker:
+                        breaker.record_success()
+                    if limiter:
+                        limiter.throttle(backoff)
+                raise
+            if breaker:
+                breaker.record_success()
+
+    def _available_route(self, route: List[str]) -> List[str]:
+        available = []
+        for key in route:
+            breaker = self._breaker(key)
+            if breaker is None or breaker.available():
+                available.append(key)
+            else:
+                self._count("skipped")
+        return available
+
+    def create(self, key: str, messages: List[dict], deadline: Optional[float] = None,
+               hedge: Optional[bool] = None, priority: int = LIVE, **params):
+        """Blocking `acreate` for threads outside the event loop"""
+        # Builds missing clients in this thread, keeping SDK imports off the loop
+        for route_key in [key, *self.routes.get(key, [])]:
+            self._client(route_key)
+        return self.loop.run(self.acreate(key, messages, deadline, hedge, priority, **params))
+
+    async def acreate(self, key: str, messages: List[dict], deadline: Optional[float] = None,
+                      hedge: Optional[bool] = None, priority: int = LIVE, **params):
+        """
+        Run a chat completion for model `key` and return the response.
+
+        `deadline` bounds the whole call, including hedges and retries; it
+        defaults to the primary backend's request deadline times
+        `max_attempts`. `hedge` overrides the router's hedging setting, e.g.
+        to use alternates only as failover for background work, and
+        `priority` orders the request in the rate limiters. Raises the
+        last backend error, CircuitOpenError if every backend's circuit is
+        open, or TimeoutError.
+        """
+        self._count("requests")
+        route = [key] + [alt for alt in self.routes.get(key, []) if alt != key]
+        end = time.monotonic() + (deadline or request_deadline(key) * self.max_attempts)
+        last_error = None
+        for attempt in range(self.max_attempts):
+            if time.monotonic() >= end:
+                break
+            available = self._available_route(route)
+            if not available:
+                raise CircuitOpenError(f"Every backend for {key} has an open circuit")
+            try:
+                return await self._race(available, messages, end, params, hedge, priority)
+            except Exception as e:
+                last_error = e
+                logger.warning(f"LLM request for {key} failed (attempt {attempt + 1}): {e}")
+        raise last_error or TimeoutError(f"LLM request for {key} missed its deadline")
+
+    async def _race(self, route: List[str], messages: List[dict], end: float, params: dict,
+                    hedge: Optional[bool], priority: int):
+        hedging = self.hedging if hedge is None else hedge
+        pending = {}
+        next_index = 0
+        next_launch = time.monotonic()
+        last_error = None
+
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= end:
+                    break
+                # Launch the next backend when the current ones are slow or all failed
+                if next_index < len(route) and (not pending or now >= next_launch):
+                    key = route[next_index]
+                    if pending:
+                        self._count("hedged")
+                        logger.info(f"Hedging LLM request to {key}")
+                    elif next_index:
+                        self._count("failovers")
+                    attempt_end = min(now + request_deadline(key), end)
+                    task = asyncio.ensure_future(
+                        self._request(key, messages, attempt_end, priority, params)
+                    )
+                    pending[task] = (key, next_index)
+                    next_index += 1
+                    if hedging:
+                        next_launch = now + self.hedge_delay(key)
+                    else:
+                        next_launch = end
+                if not pending:
+                    break
+
+                wait_until = end if next_index >= len(route) else min(next_launch, end)
+                done, _ = await asyncio.wait(
+                    list(pending), timeout=max(wait_until - time.monotonic(), 0),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    key, index = pending.pop(task)
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        last_error = e
+                        logger.warning(f"LLM backend {key} failed: {e}")
+                        continue
+                    if index and pending:
+                        self._count("hedge_wins")
+                    return response
+        finally:
+            # Losers are cancelled, which closes their connections
+            for loser in pending:
+                loser.cancel()
+
+        raise last_error or TimeoutError("LLM request missed its deadline")
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            keys = list(self.histograms)
+        return {
+            **counters,
+            "backends": {
+                key: {**self.histogram(key).snapshot(), "hedge_delay": self.hedge_delay(key)}
+                for key in keys
+            },
+        }
@@ -0,0 +1,212 @@
+"""
+Long-lived LLM clients shared by every show.
+
+The registry is built once from the ``MODEL_PARAMS`` table and hands out
+immutable handles that are safe to share between threads. It keeps one
+async OpenAI client per API base, each with its own pooled HTTP connections,
+for the router on the shared upstream loop. The OpenAI SDK is only imported,
+and a client only built, when a model on that API base is first used, so the
+server starts without paying for either.
+"""
+import logging
+import threading
+from typing import TYPE_CHECKING, Dict, NamedTuple, Tuple
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+MODEL_PARAMS = {
+    "airoboros": {
+        "name": "deepinfra/airoboros-70b",
+        "temperature": 0.5,
+        "api_key": "",
+        "api_base": "https://api.deepinfra.com/v1/openai",
+    },
+    "mixtral": {
+        "name": "nousresearch/nous-hermes-2-mixtral-8x7b-dpo",
+        "temperature": 0.8,
+        "api_key": "",
+        "api_base": "https://openrouter.ai/api/v1",
+    },
+    "noromaid": {
+        "name": "neversleep/noromaid-mixtral-8x7b-instruct",
+        "temperature": 0.8,
+        "api_key": "",
+        "api_base": "https://openrouter.ai/api/v1",
+    },
+    "mythomax": {
+        "name": "TheBloke/MythoMax-L2-13B-AWQ",
+        "temperature": 0.8,
+        "api_key": "EMPTY",
+        "api_base": "http://194.68.245.11:22169/v1",
+    },
+    "llama": {
+        "name": "meta-llama/Llama-3-70b-chat-hf",
+        "temperature": 0.0,
+        "api_key": "",
+        "api_base": "https://api.together.xyz",
+    },
+    "llama_deepinfra": {
+        "name": "meta-llama/Meta-Llama-3-70B-Instruct",
+        "temperature": 0.0,
+        "api_key": "",
+        "api_base": "https://api.deepinfra.com/v1/openai",
+    },
+    "llamalite": {
+        "name": "meta-llama/Meta-Llama-3-70B-Instruct-Lite",
+        "temperature": 0.0,
+        "api_key": "",
+        "api_base": "https://api.together.xyz",
+    },
+    "llama3.1": {
+        "name": "meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo",
+        "temperature": 0.5,
+        "api_key": "",
+        "api_base": "https://api.together.xyz",
+    },
+    "llama3.2": {
+        "name": "meta-llama/Llama-3.2-3B-Instruct-Turbo",
+        "temperature": 0.2,
+        "api_key": "",
+        "api_base": "https://api.together.xyz",
+    },
+    "nemo": {
+        "name": "mistralai/Mistral-Nemo-Instruct-2407",
+        "temperature": 0.9,
+        "api_key": "",
+        "api_base": "https://api.deepinfra.com/v1/openai",
+    },
+    "3.1_405": {
+        "name": "meta-llama/Meta-Llama-3.1-405B-Instruct-Turbo",
+        "temperature": 0.2,
+        "api_key": "",
+        "api_base": "https://api.together.xyz",
+    },
+}
+
+# Tokens of conversation history sent verbatim with each reply prompt; older
+# turns are folded into a running summary. Small models get a tighter budget.
+HISTORY_TOKEN_BUDGETS = {
+    "llama": 1500,
+    "llama_deepinfra": 1500,
+    "llamalite": 1500,
+    "llama3.1": 2500,
+    "llama3.2": 1000,
+    "3.1_405": 2500,
+}
+DEFAULT_HISTORY_TOKEN_BUDGET = 1500
+
+# Seconds a single request to a backend may take before it counts as failed
+REQUEST_DEADLINES = {
+    "llama": 20.0,
+    "llama_deepinfra": 20.0,
+    "llama3.2": 10.0,
+}
+DEFAULT_REQUEST_DEADLINE = 30.0
+
+# HTTP connection pool per API base
+LLM_MAX_CONNECTIONS = 32
+LLM_MAX_KEEPALIVE_CONNECTIONS = 16
+LLM_KEEPALIVE_EXPIRY = 120.0
+LLM_CONNECT_TIMEOUT = 5.0
+LLM_READ_TIMEOUT = 60.0
+
+
+def history_token_budget(key: str) -> int:
+    """History budget for a model key from MODEL_PARAMS"""
+    return HISTORY_TOKEN_BUDGETS.get(key, DEFAULT_HISTORY_TOKEN_BUDGET)
+
+
+def request_deadline(key: str) -> float:
+    """Per-request deadline for a model key from MODEL_PARAMS"""
+    return REQUEST_DEADLINES.get(key, DEFAULT_REQUEST_DEADLINE)
+
+
+def _pool_limits():
+    import httpx
+
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def _http_timeout():
+    import httpx
+
+    return httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+
+class ModelHandle(NamedTuple):
+    """Model, sampling temperature and API base to use for one model key"""
+
+    key: str
+    model: str
+    temperature: float
+    api_base: str
+    api_key: str
+
+
+class ProviderRegistry:
+    """One pooled client per API base, shared by every model served from it"""
+
+    def __init__(self, model_params: Dict[str, dict] = None):
+        self.model_params = model_params or MODEL_PARAMS
+        self._async_clients: Dict[Tuple[str, str], "AsyncOpenAI"] = {}
+        self._handles: Dict[str, ModelHandle] = {}
+        self._lock = threading.Lock()
+        for key in self.model_params:
+            self._handles[key] = self._build_handle(key)
+        logger.info(f"LLM provider registry ready: {len(self._handles)} models")
+
+    def async_client(self, key: str) -> "AsyncOpenAI":
+        """
+        Async client for a model key's API base.
+
+        Its connections belong to the event loop that first uses it, so it
+        must only be used from the shared upstream loop.
+        """
+        handle = self.get(key)
+        with self._lock:
+            client = self._async_clients.get((handle.api_base, handle.api_key))
+            if client is None:
+                import httpx
+                from openai import AsyncOpenAI
+
+                client = AsyncOpenAI(
+                    api_key=handle.api_key,
+                    base_url=handle.api_base,
+                    http_client=httpx.AsyncClient(
+                        limits=_pool_limits(), timeout=_http_timeout()
+                    ),
+                )
+                self._async_clients[(handle.api_base, handle.api_key)] = client
+            return client
+
+    def _build_handle(self, key: str) -> ModelHandle:
+        params = self.model_params[key]
+        return ModelHandle(
+            key=key,
+            model=params["name"],
+            temperature=params["temperature"],
+            api_base=params["api_base"],
+            api_key=params["api_key"],
+        )
+
+    def get(self, key: str) -> ModelHandle:
+        """Return the handle for a model key from MODEL_PARAMS"""
+        try:
+            return self._handles[key]
+        except KeyError:
+            raise ValueError(f"Unknown model: {key}")
+
+    async def aclose(self) -> None:
+        """Close the async clients, from the loop they were used on"""
+        with self._lock:
+            clients = list(self._async_clients.values())
+            self._async_clients.clear()
+        for client in clients:
+            await client.close()
@@ -0,0 +1,431 @@
+"""
+Staged turn pipeline for the podcast generator.
+
+Speaker selection, text generation, TTS and emission each run on their own
+thread and hand turns to the next stage through bounded queues. While one
+turn's audio is playing, the following turns are already being written and
+voiced, up to ``lookahead`` turns ahead of playback.
+"""
+import logging
+import queue
+import threading
+import time
+import traceback
+from typing import Callable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# How long blocking queue / semaphore operations wait before re-checking
+# whether the pipeline has been stopped.
+POLL_INTERVAL = 0.25
+
+# Markers closing a streamed turn's chunk queue
+_END_OF_TURN = object()
+_ABORTED = object()
+
+
+class Turn:
+    """A single podcast turn as it moves through the pipeline stages"""
+
+    def __init__(self, seq: int, epoch: int):
+        self.seq = seq
+        self.epoch = epoch
+        self.character: Optional[str] = None
+        self.text: Optional[str] = None
+        self.audio: Optional[dict] = None
+        self.chunks: Optional[queue.Queue] = None
+        self.sentences: Optional[queue.Queue] = None
+        self.committed = False
+        self.created_at = time.time()
+        self._holds_commit = False
+        self._holds_slot = False
+
+    def streamed_sentences(self):
+        """Sentences of a reply that may still be being written, as they arrive"""
+        while True:
+            sentence = self.sentences.get()
+            if sentence is _END_OF_TURN:
+                return
+            yield sentence
+
+
+class TurnPipeline:
+    """
+    Runs the select -> write -> voice -> emit stages concurrently.
+
+    Args:
+        select_speaker: ``(turn) -> name or None``. Called once the previous
+            turn's text has been committed so it sees up to date history.
+        generate_text: ``(turn) -> str`` reply for ``turn.character``. Skipped
+            when the selection stage already filled in ``turn.text``.
+        stream_text: ``(turn) -> iterator of str`` yielding the reply
+            sentence by sentence, used instead of ``generate_text`` when
+            given. The turn goes to the voice stage with its first sentence
+            (``turn.sentences``) and is committed once the reply is complete.
+        commit: ``(turn) -> None`` records the turn's text (history, topic
+            rotation) so the next selection can build on it.
+        synthesize: ``(turn) -> dict`` audio payload for ``turn.text``, or
+            an iterator of payloads to stream the turn chunk by chunk.
+        emit: ``(turn) -> None`` sends a whole turn to listeners.
+        emit_chunk: ``(turn, chunk) -> None`` sends one chunk of a streamed
+            turn. ``chunk`` is None if synthesis failed part way through.
+        on_drop: ``(turn) -> None`` called for turns that are discarded
+            after being selected, e.g. to roll back committed history.
+        lookahead: number of turns that may be prepared ahead of the one
+            currently playing. ``0`` runs turns strictly one at a time.
+        playback_seconds: ``(payload) -> float or None`` estimated playback
+            length of an audio payload, used to pace emission to the
+            listeners' playback.
+        turn_gap: pause inserted after each turn's playback.
+    """
+
+    def __init__(
+            self,
+            select_speaker: Callable[[Turn], Optional[str]],
+            generate_text: Callable[[Turn], str],
+            commit: Callable[[Turn], None],
+            synthesize: Callable[[Turn], dict],
+            emit: Callable[[Turn], None],
+            emit_chunk: Optional[Callable[[Turn, Optional[dict]], None]] = None,
+            on_drop: Optional[Callable[[Turn], None]] = None,
+            stream_text: Optional[Callable[[Turn], Iterator[str]]] = None,
+            lookahead: int = 2,
+            playback_seconds: Optional[Callable[[dict], Optional[float]]] = None,
+            turn_gap: float = 1.0,
+    ):
+        self.select_speaker = select_speaker
+        self.generate_text = generate_text
+        self.commit = commit
+        self.synthesize = synthesize
+        self.emit = emit
+        self.emit_chunk = emit_chunk
+        self.on_drop = on_drop
+        self.stream_text = stream_text
+        self.lookahead = max(0, int(lookahead))
+        self.playback_seconds = playback_seconds
+        self.turn_gap = turn_gap
+
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._seq = 0
+        # One slot per turn in flight, including the one currently playing.
+        self._slots = threading.Semaphore(self.lookahead + 1)
+        # Selection of turn N+1 waits until turn N's text is committed.
+        self._commit_gate = threading.Semaphore(1)
+        self._selected: queue.Queue = queue.Queue(maxsize=1)
+        self._written: queue.Queue = queue.Queue(maxsize=max(1, self.lookahead))
+        self._voiced: queue.Queue = queue.Queue(maxsize=max(1, self.lookahead))
+        self._threads = []
+        # Estimated time at which listeners finish playing what was emitted
+        self._playback_end = 0.0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads) and not self._stop.is_set()
+
+    def start(self) -> None:
+        """Start the stage threads"""
+        stages = [
+            ("select", self._select_stage),
+            ("write", self._write_stage),
+            ("voice", self._voice_stage),
+            ("emit", self._emit_stage),
+        ]
+        for stage_name, target in stages:
+            thread = threading.Thread(
+                target=self._run_stage,
+                args=(stage_name, target),
+                name=f"pipeline-{stage_name}",
+                daemon=True,
+            )
+            self._threads.append(thread)
+            thread.start()
+        logger.info(f"Turn pipeline started with lookahead {self.lookahead}")
+
+    def run(self) -> None:
+        """Start the pipeline and block until it is stopped"""
+        self.start()
+        self.join()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stop(self) -> None:
+        """Stop all stages and discard every turn that has not been emitted"""
+        self._stop.set()
+        self.flush()
+        logger.info("Turn pipeline stopped")
+
+    def flush(self) -> None:
+        """
+        Discard every prepared turn that has not been emitted yet.
+
+        Turns currently inside a stage callback are discarded as soon as the
+        callback returns. Used on topic switches so listeners move on at once.
+        """
+        with self._lock:
+            self._epoch += 1
+        for q in (self._selected, self._written, self._voiced):
+            while True:
+                try:
+                    turn = q.get_nowait()
+                except queue.Empty:
+                    break
+                self._discard(turn)
+
+    # Stage plumbing
+
+    def _run_stage(self, stage_name, target):
+        try:
+            target()
+        except Exception as e:
+            logger.error(f"Pipeline stage {stage_name} crashed: {e}")
+            traceback.print_exc()
+            self.stop()
+
+    def _stale(self, turn: Turn) -> bool:
+        return self._stop.is_set() or turn.epoch != self._epoch
+
+    def _acquire(self, semaphore: threading.Semaphore) -> bool:
+        while not self._stop.is_set():
+            if semaphore.acquire(timeout=POLL_INTERVAL):
+                return True
+        return False
+
+    def _put(self, q: queue.Queue, turn: Turn) -> None:
+        while not self._stale(turn):
+            try:
+                q.put(turn, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+        self._discard(turn)
+
+    def _get(self, q: queue.Queue) -> Optional[Turn]:
+        try:
+            turn = q.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            return None
+        if self._stale(turn):
+            self._discard(turn)
+            return None
+        return turn
+
+    def _release_commit(self, turn: Turn) -> None:
+        with self._lock:
+            held, turn._holds_commit = turn._holds_commit, False
+        if held:
+            self._commit_gate.release()
+
+    def _release_slot(self, turn: Turn) -> None:
+        with self._lock:
+            held, turn._holds_slot = turn._holds_slot, False
+        if held:
+            self._slots.release()
+
+    def _discard(self, turn: Turn) -> None:
+        self._release_commit(turn)
+        self._release_slot(turn)
+        if self.on_drop and turn.character:
+            try:
+                self.on_drop(turn)
+            except Exception as e:
+                logger.error(f"Error dropping turn {turn.seq}: {e}")
+
+    # Stages
+
+    def _select_stage(self):
+        while not self._stop.is_set():
+            if not self._acquire(self._slots):
+                return
+            if not self._acquire(self._commit_gate):
+                self._slots.release()
+                return
+
+            with self._lock:
+                self._seq += 1
+                turn = Turn(self._seq, self._epoch)
+                turn._holds_slot = True
+                turn._holds_commit = True
+
+            try:
+                turn.character = self.select_speaker(turn)
+            except Exception as e:
+                logger.error(f"Speaker selection failed: {e}")
+                turn.character = None
+
+            if not turn.character or self._stale(turn):
+                self._discard(turn)
+                self._stop.wait(0.5)
+                continue
+
+            logger.info(f"Turn {turn.seq}: selected {turn.character}")
+            self._put(self._selected, turn)
+
+    def _write_stage(self):
+        while not self._stop.is_set():
+            turn = self._get(self._selected)
+            if turn is None:
+                continue
+            if turn.text is None and self.stream_text:
+                self._write_streamed(turn)
+                continue
+
+            try:
+                if turn.text is None:
+                    turn.text = self.generate_text(turn)
+            except Exception as e:
+                logger.error(f"Text generation failed: {e}")
+                self._discard(turn)
+                continue
+
+            with self._lock:
+                stale = self._stale(turn)
+                if not stale:
+                    self.commit(turn)
+                    turn.committed = True
+            if stale:
+                self._discard(turn)
+                continue
+
+            self._release_commit(turn)
+            self._put(self._written, turn)
+
+    def _write_streamed(self, turn: Turn) -> None:
+        turn.sentences = queue.Queue()
+        parts = []
+        handed_off = False
+        sentences = iter(self.stream_text(turn))
+        try:
+            try:
+                for sentence in sentences:
+                    if self._stale(turn):
+                        break
+                    parts.append(sentence)
+                    turn.sentences.put(sentence)
+                    if not handed_off:
+                        # Voicing starts while the rest is still being written
+                        handed_off = True
+                        self._put(self._written, turn)
+            except Exception as e:
+                logger.error(f"Text generation failed: {e}")
+            finally:
+                close = getattr(sentences, "close", None)
+                if close:
+                    close()
+
+            if not parts:
+                self._discard(turn)
+                return
+            # A reply cut short by an error is committed as far as it was voiced
+            turn.text = " ".join(parts)
+            with self._lock:
+                stale = self._stale(turn)
+                if not stale:
+                    self.commit(turn)
+                    turn.committed = True
+            if stale:
+                self._discard(turn)
+                return
+            self._release_commit(turn)
+        finally:
+            # Only after the commit, so the emitter sees the recorded message
+            turn.sentences.put(_END_OF_TURN)
+
+    def _voice_stage(self):
+        while not self._stop.is_set():
+            turn = self._get(self._written)
+            if turn is None:
+                continue
+
+            try:
+                result = self.synthesize(turn)
+                if isinstance(result, dict):
+                    turn.audio = result
+                else:
+                    # Stream the turn: hand it to the emitter straight away
+                    # and feed it chunks as they are synthesized.
+                    chunks = iter(result)
+                    turn.chunks = queue.Queue()
+                    self._put(self._voiced, turn)
+                    self._stream_chunks(turn, chunks)
+                    continue
+            except Exception as e:
+                logger.error(f"Audio generation failed: {e}")
+                traceback.print_exc()
+                self._discard(turn)
+                continue
+
+            self._put(self._voiced, turn)
+
+    def _stream_chunks(self, turn: Turn, chunks) -> None:
+        try:
+            for chunk in chunks:
+                if self._stale(turn):
+                    break
+                turn.chunks.put(chunk)
+            turn.chunks.put(_END_OF_TURN)
+        except Exception as e:
+            logger.error(f"Streaming audio generation failed: {e}")
+            traceback.print_exc()
+            turn.chunks.put(_ABORTED)
+
+    def _emit_stage(self):
+        while not self._stop.is_set():
+            turn = self._get(self._voiced)
+            if turn is None:
+                continue
+
+            try:
+                if turn.chunks is not None:
+                    emitted = self._emit_stream(turn)
+                else:
+                    self.emit(turn)
+                    self._advance_playback(turn.audio)
+                    emitted = True
+            except Exception as e:
+                logger.error(f"Audio emission failed: {e}")
+                traceback.print_exc()
+                emitted = False
+
+            if not emitted:
+                self._discard(turn)
+                continue
+
+            # Hold this turn's slot while it plays so the producers stay at
+            # most `lookahead` turns ahead of what listeners are hearing.
+            self._playback_end += self.turn_gap
+            self._stop.wait(max(0.0, self._playback_end - time.time()))
+            self._release_slot(turn)
+
+    def _emit_stream(self, turn: Turn) -> bool:
+        """Emit a streamed turn's chunks as they arrive, returns False if none were sent"""
+        emitted = 0
+        while True:
+            try:
+                chunk = turn.chunks.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                chunk = None
+
+            if chunk is _END_OF_TURN:
+                return emitted > 0
+            if chunk is _ABORTED or self._stale(turn):
+                # Chunks still queued for a flushed turn are never sent;
+                # close the turn for clients that already got part of it
+                if emitted:
+                    self.emit_chunk(turn, None)
+                return emitted > 0
+            if chunk is None:
+                continue
+
+            self.emit_chunk(turn, chunk)
+            self._advance_playback(chunk)
+            emitted += 1
+
+    def _advance_playback(self, payload: Optional[dict]) -> None:
+        duration = None
+        if self.playback_seconds and payload:
+            duration = self.playback_seconds(payload)
+        self._playback_end = max(self._playback_end, time.time()) + (duration or 0)
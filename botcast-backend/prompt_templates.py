@@ -0,0 +1,135 @@
+"""
+System prompts compiled once per character pair.
+
+Each prompt is split into a static prefix (persona, cast and rules), rendered
+once when the pair is loaded, and a short volatile suffix with the current
+topic. The prefix is byte-for-byte identical on every turn, so providers that
+cache prompt prefixes can reuse it across the whole show.
+"""
+import logging
+import textwrap
+from typing import Callable, Dict, Optional
+
+from context_window import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+REPLY_PREFIX = """\
+You are {name}. {name}'s description: {description}
+
+You are in a podcast with the following other guests: {guests}.
+Your message should tie in with the most recent messages sent, but can also contain hilarious unpredictability.
+
+Rules:
+1) Only respond as {name}.
+2) Frame your phrasing and messages as close to a podcast as possible. You've been a guest on the Joe Rogan Experience and other world famous podcasts.
+3) If the last message is from you, ensure your next response moves the conversation forward in an engaging manner.
+4) Do NOT add non conversational messages like *laughs* or *claps* or *nods*, (laughs nervously), (chuckles) etc. DO NOT INCLUDE THEM AT ALL PLEASE
+5) Keep your responses FUNNY and EDGY. Do not make it too serious and do NOT be woke!
+6) Your response should be concise and limited to 50 words.
+7) Do NOT always mention the other guests name in your response especially in further turns"""
+
+REPLY_TOPIC = """
+
+The current topic of discussion is: {topic}.
+Make SURE to talk about the current topic and naturally incorporate it into your response."""
+
+COMBINED_PREFIX = """\
+You are directing and writing a podcast between: [{names}].
+{descriptions}
+
+Decide which character from the list speaks next to keep the conversation moving forward in an engaging manner, then write their next message.
+
+Rules:
+1) If the last message refers to a specific character, the next message should DEFINITELY be from that character.
+2) The speaker must be exactly one of: [{names}].
+3) Frame the phrasing as close to a podcast as possible and tie in with the most recent messages, with hilarious unpredictability.
+4) Do NOT add non conversational messages like *laughs* or *claps* or *nods*, (laughs nervously), (chuckles) etc.
+5) Keep it FUNNY and EDGY. Do not make it too serious and do NOT be woke!
+6) The message should be concise and limited to 50 words.
+7) Respond ONLY with a JSON object: {{"speaker": "<name>", "reply": "<message>"}}"""
+
+COMBINED_TOPIC = """
+
+The current topic of discussion is: {topic}.
+Make SURE to talk about the current topic and naturally incorporate it."""
+
+
+class PromptTemplate:
+    """
+    A rendered static prefix plus the template of its volatile suffix.
+
+    Args:
+        prefix: Text that never changes for this character pair.
+        topic_suffix: Format string with a ``{topic}`` field appended after
+            the prefix when a topic is set.
+        count_tokens: Token counter used for the reported sizes.
+    """
+
+    def __init__(self, prefix: str, topic_suffix: str,
+                 count_tokens: Callable[[str], int] = estimate_tokens):
+        self.prefix = prefix
+        self.topic_suffix = topic_suffix
+        self.count_tokens = count_tokens
+        self.prefix_tokens = count_tokens(prefix)
+
+    def render(self, topic: Optional[str] = None) -> str:
+        if not topic:
+            return self.prefix
+        return self.prefix + self.topic_suffix.format(topic=topic)
+
+    def token_count(self, topic: Optional[str] = None) -> int:
+        """Tokens of the rendered prompt for `topic`"""
+        if not topic:
+            return self.prefix_tokens
+        return self.prefix_tokens + self.count_tokens(self.topic_suffix.format(topic=topic))
+
+
+class CompiledPrompts:
+    """Reply prompt per character and the combined director prompt of one pair"""
+
+    def __init__(self, reply: Dict[str, PromptTemplate], combined: PromptTemplate):
+        self.reply = reply
+        self.combined = combined
+
+    def token_counts(self) -> dict:
+        return {
+            "reply": {name: prompt.prefix_tokens for name, prompt in self.reply.items()},
+            "combined": self.combined.prefix_tokens,
+        }
+
+
+def _clean(text: str) -> str:
+    # Descriptions come from hand-edited files; normalize their edges so the
+    # prefix doesn't change with trailing whitespace
+    return textwrap.dedent(text).strip()
+
+
+def compile_prompts(characters: Dict[str, object],
+                    count_tokens: Callable[[str], int] = estimate_tokens) -> CompiledPrompts:
+    """Render the static prompt prefixes for a loaded character pair"""
+    names = list(characters)
+    reply = {}
+    for name, character in characters.items():
+        prefix = REPLY_PREFIX.format(
+            name=name,
+            description=_clean(character.description),
+            guests=", ".join(other for other in names if other != name),
+        )
+        reply[name] = PromptTemplate(prefix, REPLY_TOPIC, count_tokens)
+
+    combined = PromptTemplate(
+        COMBINED_PREFIX.format(
+            names=", ".join(names),
+            descriptions="\n\n".join(
+                f"{name}'s description: {_clean(character.description)}"
+                for name, character in characters.items()
+            ),
+        ),
+        COMBINED_TOPIC,
+        count_tokens,
+    )
+
+    compiled = CompiledPrompts(reply, combined)
+    logger.info(f"Compiled prompts, prefix tokens: {compiled.token_counts()}")
+    return compiled
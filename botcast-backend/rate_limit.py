@@ -0,0 +1,260 @@
+"""
+Client-side rate limiting for upstream APIs.
+
+Every upstream (LLM API base, Neets, ElevenLabs) gets one RateLimiter shared
+by all shows. A call waits for a concurrency slot, a request token and, for
+TTS, enough character budget before it's sent. Waiters are served in
+priority order, so the turn listeners are about to hear goes ahead of topic
+prefetching and summaries.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first
+LIVE = 0
+BACKGROUND = 1
+
+# How often async callers re-check a queue they can't be notified about
+ASYNC_POLL_INTERVAL = 0.05
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a call couldn't get through the limiter in time"""
+
+
+class _Bucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available, after a refill"""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    Token buckets plus a concurrency cap for one upstream.
+
+    Args:
+        name: Upstream name, used in logs.
+        requests_per_second: Sustained request rate (None for unlimited).
+        burst: Requests allowed back to back, defaults to one second's worth.
+        max_concurrent: Requests in flight at once (None for unlimited).
+        chars_per_minute: Characters of TTS input per minute (None for
+            unlimited). Up to a minute's worth can be used in one burst.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            requests_per_second: Optional[float] = None,
+            burst: Optional[float] = None,
+            max_concurrent: Optional[int] = None,
+            chars_per_minute: Optional[float] = None,
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self._requests = (
+            _Bucket(requests_per_second, burst or max(requests_per_second, 1))
+            if requests_per_second else None
+        )
+        self._chars = (
+            _Bucket(chars_per_minute / 60.0, chars_per_minute)
+            if chars_per_minute else None
+        )
+        self._active = 0
+        self._paused_until = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self.waited = 0.0
+        self.throttled = 0
+
+    def _wait_time(self, now: float, chars: int) -> Optional[float]:
+        """0 if the call can go now, seconds to wait, or None to wait for a slot"""
+        if self.max_concurrent and self._active >= self.max_concurrent:
+            return None
+        wait = max(self._paused_until - now, 0.0)
+        if self._requests:
+            self._requests.refill(now)
+            wait = max(wait, self._requests.wait_time(1))
+        if self._chars and chars:
+            self._chars.refill(now)
+            wait = max(wait, self._chars.wait_time(chars))
+        return wait
+
+    def _try_take(self, ticket: tuple, chars: int, now: float) -> Optional[float]:
+        """
+        With the lock held: take a slot and return 0 if `ticket` can go now,
+        otherwise seconds to wait, or None to wait for the queue to move.
+        """
+        if self._waiters[0] != ticket:
+            return None
+        wait = self._wait_time(now, chars)
+        if wait == 0:
+            self._active += 1
+            if self._requests:
+                self._requests.take(1)
+            if self._chars and chars:
+                self._chars.take(chars)
+        return wait
+
+    def _leave_queue(self, ticket: tuple) -> None:
+        self._waiters.remove(ticket)
+        heapq.heapify(self._waiters)
+        self._cond.notify_all()
+
+    def _release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def acquire(self, priority: int = LIVE, chars: int = 0, timeout: Optional[float] = None):
+        """Hold a slot for one call, waiting behind higher priority callers"""
+        ticket = (priority, next(self._sequence))
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._try_take(ticket, chars, now)
+                    if wait == 0:
+                        break
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            raise RateLimitTimeout(f"Rate limit wait for {self.name} timed out")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+                self.waited += time.monotonic() - start
+            finally:
+                self._leave_queue(ticket)
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def acquire_async(self, priority: int = LIVE, chars: int = 0,
+                            timeout: Optional[float] = None):
+        """
+        `acquire` for coroutines on the upstream event loop.
+
+        Shares the queue with threaded callers, but sleeps with asyncio
+        instead of blocking the loop, polling while it waits for others.
+        """
+        ticket = (priority, next(self._sequence))
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+        try:
+            while True:
+                now = time.monotonic()
+                with self._cond:
+                    wait = self._try_take(ticket, chars, now)
+                    if wait == 0:
+                        self.waited += now - start
+                        break
+                wait = ASYNC_POLL_INTERVAL if wait is None else wait
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise RateLimitTimeout(f"Rate limit wait for {self.name} timed out")
+                    wait = min(wait, remaining)
+                await asyncio.sleep(wait)
+        finally:
+            with self._cond:
+                self._leave_queue(ticket)
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def throttle(self, seconds: float) -> None:
+        """Hold every call for `seconds`, e.g. after the upstream returned 429"""
+        with self._cond:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+        logger.warning(f"Upstream {self.name} is rate limiting us, pausing {seconds:.1f}s")
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "active": self._active,
+                "waiting": len(self._waiters),
+                "waited_seconds": round(self.waited, 3),
+                "throttled": self.throttled,
+            }
+
+
+class RateLimits:
+    """
+    Shared RateLimiter per upstream.
+
+    Args:
+        limits: Keyword arguments for RateLimiter per upstream name.
+            Upstreams without an entry are unlimited.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, dict]] = None):
+        self.limits = limits or {}
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> RateLimiter:
+        with self._lock:
+            limiter = self._limiters.get(name)
+            if limiter is None:
+                limiter = self._limiters[name] = RateLimiter(name, **self.limits.get(name, {}))
+            return limiter
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {limiter.name: limiter.snapshot() for limiter in limiters}
+
+
+def retry_after(error: Exception, default: float = 5.0) -> Optional[float]:
+    """
+    Seconds to back off if `error` is an HTTP 429, None for other errors.
+
+    Works with OpenAI SDK, ElevenLabs and requests errors, honouring a
+    numeric Retry-After header when there is one.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429:
+        return None
+    headers = getattr(response, "headers", None) or getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After") or default)
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,324 @@
+"""
+Per-room podcast sessions.
+
+Every Socket.IO room hosts its own show with its own character pair, topic
+flow and conversation history, so one process can run many podcasts side by
+side and each listener only hears the show in the room they joined.
+"""
+import asyncio
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from character_pairs.prompts import get_topic_flow
+from character_registry import CharacterPair, PairRegistry
+from utils import DEFAULT_CHARACTER_PAIR
+
+logger = logging.getLogger(__name__)
+
+# Room used by clients that don't ask for a specific show
+DEFAULT_ROOM = "main"
+
+# Put on a response queue to shut its consumer down
+RESPONSE_QUEUE_CLOSED = object()
+
+
+class ConversationMessage:
+    def __init__(self, character_name: str, content: str, timestamp: float = None):
+        self.character_name = character_name
+        self.content = content
+        self.timestamp = timestamp or time.time()
+
+
+def history_lines(messages: List[ConversationMessage]) -> List[str]:
+    """Format messages as `name: message` lines, with the show intro if empty"""
+    context = [f"{msg.character_name}: {msg.content}" for msg in messages]
+    if not context:
+        context = ["Welcome to the Joe Rogan Experience, good to have you here."]
+    return context
+
+
+class Session:
+    """State of a single show: its cast, topic flow, history and listeners"""
+
+    def __init__(self, room: str, pair: CharacterPair,
+                 on_stopped: Optional[Callable[["Session"], None]] = None):
+        self.room = room
+        self.pair = pair.name
+        self.characters = pair.characters
+        self.prompts = pair.prompts
+        self.topic_flow: List[str] = list(get_topic_flow())
+        self.topic_flow_index = 0
+        self.current_topic: Optional[str] = self.topic_flow[0]
+        self.topic_turn_counter = 0
+        self.topic_turns = 5
+        self.conversation_history: List[ConversationMessage] = []
+        # Kept across topic switches, which clear the history
+        self.last_speaker: Optional[str] = None
+        self.conversation_active = False
+        self.listeners = set()
+        # Set by the app while the show's turn pipeline is running
+        self.pipeline = None
+        self.speaker_selector = None
+        self.topic_prefetcher = None
+        self.speculator = None
+        self.context = None
+        self.episode = None
+        # Bounded queue feeding the app's process_queue consumer, if enabled
+        self.response_queue: Optional[queue.Queue] = None
+        self.lock = threading.RLock()
+        # Notified when listeners join or the show stops
+        self.listeners_changed = threading.Condition(self.lock)
+        # (loop, event) of coroutines in wait_for_listeners_async
+        self._async_waiters = []
+        self._grace_timer: Optional[threading.Timer] = None
+        # Called once the show has stopped, e.g. to free its slot
+        self.on_stopped = on_stopped
+
+    def use_pair(self, pair: CharacterPair) -> bool:
+        """
+        Swap in another (or a reloaded) character pair while the show runs.
+
+        Returns True if the cast changed, in which case turns already
+        prepared for the old cast should be dropped.
+        """
+        with self.lock:
+            cast_changed = list(pair.characters) != list(self.characters)
+            self.pair = pair.name
+            self.characters = pair.characters
+            self.prompts = pair.prompts
+        logger.info(f"[{self.room}] Using character pair {pair.name} ({pair.etag[:8]})")
+        return cast_changed
+
+    def add_listener(self, client_id: str) -> None:
+        with self.lock:
+            self.listeners.add(client_id)
+            self._cancel_grace_timer()
+            self._notify_listeners_changed()
+
+    def remove_listener(self, client_id: str) -> bool:
+        """Remove a listener, returns True if nobody is left"""
+        with self.lock:
+            self.listeners.discard(client_id)
+            return not self.listeners
+
+    def wait_for_listeners(self, timeout: Optional[float] = None) -> bool:
+        """Block until someone is listening or the show stops"""
+        with self.lock:
+            self.listeners_changed.wait_for(
+                lambda: self.listeners or not self.conversation_active, timeout
+            )
+            return bool(self.listeners)
+
+    async def wait_for_listeners_async(self) -> bool:
+        """`wait_for_listeners` for a coroutine, woken from any thread"""
+        changed = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), changed)
+        try:
+            while True:
+                with self.lock:
+                    if self.listeners or not self.conversation_active:
+                        return bool(self.listeners)
+                    changed.clear()
+                    self._async_waiters.append(waiter)
+                await changed.wait()
+        finally:
+            with self.lock:
+                self._async_waiters = [w for w in self._async_waiters if w is not waiter]
+
+    def _notify_listeners_changed(self) -> None:
+        """Wake threads and coroutines waiting for listeners, holding the lock"""
+        self.listeners_changed.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, changed in waiters:
+            try:
+                loop.call_soon_threadsafe(changed.set)
+            except RuntimeError:
+                # The waiter's loop has already closed
+                pass
+
+    def stop_when_abandoned(self, grace: float) -> None:
+        """Stop the show unless a listener joins within `grace` seconds"""
+        with self.lock:
+            self._cancel_grace_timer()
+            timer = threading.Timer(grace, self._stop_if_abandoned)
+            timer.daemon = True
+            self._grace_timer = timer
+            timer.start()
+
+    def _stop_if_abandoned(self) -> None:
+        with self.lock:
+            if self.listeners or self._grace_timer is None:
+                return
+            self._grace_timer = None
+        logger.info(f"[{self.room}] No reconnection, stopping conversation")
+        self.stop()
+
+    def _cancel_grace_timer(self) -> None:
+        if self._grace_timer:
+            self._grace_timer.cancel()
+            self._grace_timer = None
+
+    def history_snapshot(self) -> List[ConversationMessage]:
+        with self.lock:
+            return list(self.conversation_history)
+
+    def record(self, character_name: str, content: str) -> ConversationMessage:
+        """Append a reply to the history and rotate the topic when it's run its course"""
+        message = ConversationMessage(
+            character_name=character_name,
+            content=content,
+            timestamp=time.time(),
+        )
+        with self.lock:
+            self.conversation_history.append(message)
+            self.last_speaker = character_name
+
+            self.topic_turn_counter += 1
+            logger.info(f"[{self.room}] Topic turn counter: {self.topic_turn_counter}")
+
+            if self.topic_turn_counter >= self.topic_turns:
+                self.topic_turn_counter = 0
+                self.topic_turns = random.randint(5, 10)
+                self.topic_flow_index = (self.topic_flow_index + 1) % len(self.topic_flow)
+                self.current_topic = self.topic_flow[self.topic_flow_index]
+                logger.info(f"[{self.room}] Switching to new topic: {self.current_topic}")
+                # Cull conversation history when switching topics
+                self.conversation_history = []
+                if self.context:
+                    self.context.reset()
+                if self.topic_prefetcher:
+                    self.topic_prefetcher.wake()
+        return message
+
+    def forget(self, message: ConversationMessage) -> None:
+        """Remove a reply that was recorded but never reached listeners"""
+        with self.lock:
+            if message in self.conversation_history:
+                self.conversation_history.remove(message)
+                if self.conversation_history:
+                    self.last_speaker = self.conversation_history[-1].character_name
+
+    def forget_folded(self, messages: List[ConversationMessage]) -> None:
+        """Drop replies that are now covered by the context summary"""
+        folded = set(map(id, messages))
+        with self.lock:
+            self.conversation_history = [
+                msg for msg in self.conversation_history if id(msg) not in folded
+            ]
+
+    def set_topic(self, topic: str) -> None:
+        """Switch to `topic` right away, adding it to the flow if needed"""
+        with self.lock:
+            # Add new topic to the flow if it's not already there
+            if topic not in self.topic_flow:
+                self.topic_flow.insert(self.topic_flow_index + 1, topic)
+                if self.topic_prefetcher:
+                    self.topic_prefetcher.note_topic(topic)
+            self.topic_flow_index = self.topic_flow.index(topic)
+            self.current_topic = topic
+            self.topic_turn_counter = 0
+            self.conversation_history = []
+            if self.context:
+                self.context.reset()
+        if self.speculator:
+            self.speculator.cancel()
+
+    def reset(self) -> None:
+        """Clear the history and restart the topic count"""
+        with self.lock:
+            self.conversation_history = []
+            self.last_speaker = None
+            self.topic_turn_counter = 0
+            if self.context:
+                self.context.reset()
+
+    def stop(self) -> None:
+        """Stop generation and cancel any turns still in the pipeline"""
+        with self.lock:
+            self.conversation_active = False
+            self._cancel_grace_timer()
+            self._notify_listeners_changed()
+        if self.topic_prefetcher:
+            self.topic_prefetcher.stop()
+        if self.speculator:
+            self.speculator.cancel()
+        if self.pipeline:
+            self.pipeline.stop()
+        if self.episode:
+            self.episode.close()
+        if self.response_queue:
+            try:
+                self.response_queue.put_nowait(RESPONSE_QUEUE_CLOSED)
+            except queue.Full:
+                # The consumer notices the show stopped on its next get timeout
+                pass
+        if self.on_stopped:
+            self.on_stopped(self)
+
+
+class SessionManager:
+    """
+    Keeps one Session per room and caps how many shows run at once.
+
+    Each running show is driven by its own turn pipeline; the manager only
+    owns the bookkeeping, so dozens of rooms can share one process. A
+    session is dropped as soon as its show stops, whether it was stopped by
+    a client or abandoned by its last listener.
+    """
+
+    def __init__(self, max_sessions: int = 50, pairs: Optional[PairRegistry] = None):
+        self.max_sessions = max_sessions
+        self.pairs = pairs or PairRegistry()
+        self._sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+
+    def get(self, room: str) -> Optional[Session]:
+        return self._sessions.get(room)
+
+    def get_or_create(self, room: str, pair: Optional[str] = None) -> Session:
+        """
+        Return the session for `room`, creating it with `pair` if needed.
+
+        Asking for a different pair than the room currently hosts replaces
+        the session, so the caller should stop the old one first. Raises
+        ValueError for a pair that isn't loaded.
+        """
+        with self._lock:
+            session = self._sessions.get(room)
+            if session and (pair is None or pair == session.pair):
+                return session
+
+            if session is None and len(self._sessions) >= self.max_sessions:
+                raise RuntimeError(
+                    f"Too many concurrent shows (max {self.max_sessions})"
+                )
+
+            pair_name = pair or DEFAULT_CHARACTER_PAIR
+            character_pair = self.pairs.get(pair_name)
+            if character_pair is None:
+                raise ValueError(f"Unknown character pair: {pair_name}")
+            new_session = Session(room, character_pair, on_stopped=self._release)
+            if session:
+                new_session.listeners = session.listeners
+            self._sessions[room] = new_session
+            return new_session
+
+    def remove(self, room: str) -> None:
+        """Stop the show in `room`, which also drops its session"""
+        session = self.get(room)
+        if session:
+            session.stop()
+
+    def _release(self, session: Session) -> None:
+        with self._lock:
+            # The room may already host a newer session
+            if self._sessions.get(session.room) is session:
+                del self._sessions[session.room]
+
+    def all(self) -> List[Session]:
+        with self._lock:
+            return list(self._sessions.values())
@@ -0,0 +1,216 @@
+"""
+Per-show memory and thread profile of the two server modes.
+
+    python show_profile.py [--shows 20] [--seconds 20] [--modes threading asgi]
+
+Each mode runs in a fresh interpreter. The LLM and TTS upstreams are
+replaced by stand-ins with fixed latencies, so no keys or network are
+needed, and every show gets one in-process listener. One show is run first
+to warm up imports and pools, then ``--shows`` more are started and, after
+``--seconds``, resident memory, threads and event loop tasks are sampled
+again. The difference divided by the number of shows is the cost of a show.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_MODES = ("threading", "asgi")
+
+REPLY = (
+    "That is a fair point, but I think you are missing the bigger picture here. "
+    "Nobody actually knows how this plays out over the next ten years. "
+    "What I do know is that the people building it are moving very fast."
+)
+
+
+def memory_sample() -> Dict[str, float]:
+    """Resident and virtual size of this process in MiB"""
+    sample = {}
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmSize"):
+                    sample[key] = int(value.split()[0]) / 1024
+    except OSError:
+        # No procfs: peak RSS is the best there is
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        sample["VmRSS"] = peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return sample
+
+
+def test_clip(app, seconds: float = 1.5) -> bytes:
+    """An MP3 tone for the stand-in TTS provider"""
+    import numpy as np
+
+    rate = app.audio_processor.sample_rate
+    t = np.arange(int(rate * seconds)) / rate
+    return app.audio_processor.encode(0.3 * np.sin(2 * np.pi * 220 * t).astype(np.float32))
+
+
+class _StubClient:
+    async def aclose(self) -> None:
+        pass
+
+
+def install_stand_ins(app, llm_latency: float, tts_latency: float, turns: Counter) -> None:
+    """Replace the upstreams and on-disk logs of `app` for a profiling run"""
+    clip = test_clip(app)
+
+    def completion(text: str):
+        message = SimpleNamespace(content=text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    async def acreate(key, messages, deadline=None, hedge=None, priority=None, **params):
+        await asyncio.sleep(llm_latency)
+        return completion(REPLY)
+
+    async def astream(key, messages, deadline=None, priority=None, **params):
+        await asyncio.sleep(llm_latency)
+        for word in REPLY.split(" "):
+            await asyncio.sleep(0.01)
+            yield word + " "
+
+    async def send_speech_request(text, params, limiter):
+        await asyncio.sleep(tts_latency)
+        return clip
+
+    def log_conversation(message, room=None):
+        turns[room] += 1
+
+    app.llm_router.acreate = acreate
+    app.llm_router.astream = astream
+    app.send_speech_request = send_speech_request
+    app.tts_clients.update({"neets": _StubClient(), "elevenlabs": _StubClient()})
+    app.tts_cache = None
+    app.episode_archive = None
+    app.log_conversation = log_conversation
+    app.log_llm_prompt = lambda messages: None
+
+
+def add_listener(app, room: str) -> str:
+    """Connect a listener with no socket behind it and start its show"""
+    if app.async_sio:
+        client_id = app.upstream_loop.run(app.async_sio.manager.connect(f"profile-{room}", "/"))
+    else:
+        client_id = app.socketio.server.manager.connect(f"profile-{room}", "/")
+    app.connect_client(client_id, {"room": room})
+    error = app.start_show(client_id, {"room": room})
+    if error:
+        raise RuntimeError(error)
+    return client_id
+
+
+def sample(app) -> Dict[str, float]:
+    gc.collect()
+    return {
+        **memory_sample(),
+        "threads": threading.active_count(),
+        "tasks": app.upstream_loop.tasks(),
+    }
+
+
+def run_worker(mode: str, shows: int, seconds: float, llm_latency: float,
+               tts_latency: float) -> dict:
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+    logging.disable(logging.WARNING)
+    import app
+
+    if app.audio_processor is None:
+        raise RuntimeError("The profile needs numpy, miniaudio and lameenc")
+    turns = Counter()
+    install_stand_ins(app, llm_latency, tts_latency, turns)
+    app.SERVER_MODE = mode
+    app.sessions.max_sessions = shows + 1
+    if mode == "asgi":
+        # Sets up the AsyncServer; nothing needs to listen on a port here
+        app.create_asgi_app()
+
+    add_listener(app, "warmup")
+    time.sleep(seconds / 2)
+    before = sample(app)
+    for index in range(shows):
+        add_listener(app, f"show-{index}")
+    time.sleep(seconds)
+    after = sample(app)
+
+    for session in app.sessions.all():
+        session.stop()
+    per_show = {key: (after[key] - before[key]) / shows for key in after}
+    return {
+        "mode": mode,
+        "shows": shows,
+        "seconds": seconds,
+        "turns": sum(count for room, count in turns.items() if room != "warmup"),
+        "before": before,
+        "after": after,
+        "per_show": per_show,
+    }
+
+
+def measure(mode: str, args) -> dict:
+    result = subprocess.run(
+        [
+            sys.executable, os.path.abspath(__file__), "--worker", mode,
+            "--shows", str(args.shows), "--seconds", str(args.seconds),
+            "--llm-latency", str(args.llm_latency), "--tts-latency", str(args.tts_latency),
+        ],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=args.seconds * 3 + 120,
+    )
+    if result.returncode:
+        raise RuntimeError(f"{mode} profile failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def report(results: List[dict]) -> None:
+    print(f"{'mode':<10} {'shows':>5} {'turns':>6} {'RSS/show':>10} {'VM/show':>10} "
+          f"{'threads/show':>13} {'tasks/show':>11} {'RSS total':>10}")
+    for result in results:
+        per_show = result["per_show"]
+        print(
+            f"{result['mode']:<10} {result['shows']:>5} {result['turns']:>6} "
+            f"{per_show['VmRSS']:>6.2f} MiB {per_show.get('VmSize', 0):>6.2f} MiB "
+            f"{per_show['threads']:>13.1f} {per_show['tasks']:>11.1f} "
+            f"{result['after']['VmRSS']:>6.1f} MiB"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shows", type=int, default=20, help="Shows started per mode")
+    parser.add_argument("--seconds", type=float, default=20.0,
+                        help="How long the shows run before sampling")
+    parser.add_argument("--modes", nargs="+", choices=SERVER_MODES, default=list(SERVER_MODES))
+    parser.add_argument("--llm-latency", type=float, default=0.5,
+                        help="Seconds the stand-in LLM takes per completion")
+    parser.add_argument("--tts-latency", type=float, default=0.3,
+                        help="Seconds the stand-in TTS provider takes per clip")
+    parser.add_argument("--worker", choices=SERVER_MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_worker(args.worker, args.shows, args.seconds,
+                            args.llm_latency, args.tts_latency)
+        print(json.dumps(result), flush=True)
+        # Skip the app's exit hooks, the shows are being torn down anyway
+        os._exit(0)
+
+    report([measure(mode, args) for mode in args.modes])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+Speaker selection for podcast turns.
+
+The default ``LocalTurnPolicy`` picks the next speaker from the recent history
+alone: explicit replies, name mentions, questions, how long each character has
+been quiet and how far each is from an even share of the turns. It decides in
+microseconds, so a turn no longer waits on an LLM round trip just to choose
+between two or three names. The LLM director is still available as a mode,
+with the local policy covering for its unusable answers.
+"""
+import json
+import math
+import random
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils import check_latest_reply
+
+SPEAKER_SELECTION_MODES = ("local", "director", "combined")
+
+_JSON_DECODER = json.JSONDecoder()
+
+# Name parts too generic to count as a mention on their own
+_STOP_TOKENS = {"agent", "the", "mr", "mrs", "ms", "dr", "guy"}
+
+
+class LocalTurnPolicy:
+    """
+    Scores every character and samples the next speaker from the scores.
+
+    Each candidate is picked with probability proportional to
+    ``exp(score / temperature)``, so strong signals such as being asked a
+    question all but decide the turn, while small differences in recency
+    and turn share leave room for someone to jump in out of order.
+
+    Args:
+        mention_weight: Bonus for being named in the last message.
+        question_weight: Extra bonus for being named in a question.
+        recency_weight: Bonus per turn since the character last spoke.
+        balance_weight: Bonus for being under an even share of recent turns.
+        window: Number of recent turns used for turn share balancing.
+        temperature: Softmax temperature over the scores. Higher values
+            make the show less predictable, 0 always picks the top score.
+        aliases: Extra names per character, e.g. {"Agent Rogue": ["Joe"]}.
+    """
+
+    def __init__(
+            self,
+            mention_weight: float = 4.0,
+            question_weight: float = 4.0,
+            recency_weight: float = 0.6,
+            balance_weight: float = 3.0,
+            window: int = 12,
+            temperature: float = 1.0,
+            aliases: Optional[Dict[str, Sequence[str]]] = None,
+            seed: Optional[int] = None,
+    ):
+        self.mention_weight = mention_weight
+        self.question_weight = question_weight
+        self.recency_weight = recency_weight
+        self.balance_weight = balance_weight
+        self.window = window
+        self.temperature = temperature
+        self.aliases = aliases or {}
+        self._random = random.Random(seed)
+        self._patterns: Dict[str, re.Pattern] = {}
+
+    def _pattern(self, character_name: str) -> re.Pattern:
+        pattern = self._patterns.get(character_name)
+        if pattern is None:
+            names = {character_name}
+            names.update(
+                token
+                for token in character_name.split()
+                if len(token) > 2 and token.lower() not in _STOP_TOKENS
+            )
+            names.update(self.aliases.get(character_name, ()))
+            alternatives = "|".join(
+                re.escape(name) for name in sorted(names, key=len, reverse=True)
+            )
+            pattern = re.compile(rf"\b(?:{alternatives})\b", re.IGNORECASE)
+            self._patterns[character_name] = pattern
+        return pattern
+
+    def select(self, history: Sequence, character_list: List[str],
+               last_speaker: Optional[str] = None) -> Optional[str]:
+        """
+        Pick the next speaker.
+
+        Args:
+            history: ConversationMessage objects, oldest first.
+            character_list: Names of the characters in the show.
+            last_speaker: Who spoke last, for when `history` has just been
+                cleared (e.g. on a topic switch) and doesn't show it.
+        """
+        scores = self.scores(history, character_list, last_speaker)
+        if not scores:
+            return None
+        names = list(scores)
+        if len(names) == 1 or self.temperature <= 0:
+            return max(names, key=scores.get)
+        top = max(scores.values())
+        weights = [math.exp((scores[name] - top) / self.temperature) for name in names]
+        return self._random.choices(names, weights=weights)[0]
+
+    def rank(self, history: Sequence, character_list: List[str],
+             last_speaker: Optional[str] = None) -> List[str]:
+        """Every plausible next speaker, most likely first"""
+        scores = self.scores(history, character_list, last_speaker)
+        # Stable sort: ties go to the character listed first
+        return sorted(scores, key=scores.get, reverse=True)
+
+    def scores(self, history: Sequence, character_list: List[str],
+               last_speaker: Optional[str] = None) -> Dict[str, float]:
+        """Score of every plausible next speaker; a forced choice is the only entry"""
+        if not character_list:
+            return {}
+        if not history:
+            # The host (first character of the pair) opens the show or topic,
+            # unless they had the last word before the history was cleared
+            candidates = [name for name in character_list if name != last_speaker]
+            if not candidates or candidates[0] == character_list[0]:
+                return {character_list[0]: 0.0}
+            return {name: 0.0 for name in candidates}
+
+        last = history[-1]
+        replying_character = check_latest_reply(
+            [f"{last.character_name}: {last.content}"], character_list
+        )
+        if replying_character:
+            return {replying_character: 0.0}
+
+        candidates = [name for name in character_list if name != last.character_name]
+        if not candidates:
+            return {character_list[0]: 0.0}
+        if len(candidates) == 1:
+            return {candidates[0]: 0.0}
+
+        is_question = "?" in last.content
+        recent = history[-self.window:]
+        counts = {name: 0 for name in character_list}
+        last_spoke = {}
+        for index, message in enumerate(recent):
+            if message.character_name in counts:
+                counts[message.character_name] += 1
+                last_spoke[message.character_name] = index
+        fair_share = len(recent) / len(character_list)
+
+        scores = {}
+        for name in candidates:
+            score = 0.0
+            if self._pattern(name).search(last.content):
+                score += self.mention_weight
+                if is_question:
+                    score += self.question_weight
+            turns_quiet = len(recent) - last_spoke.get(name, -1) - 1
+            score += self.recency_weight * turns_quiet
+            score += self.balance_weight * (fair_share - counts[name]) / max(fair_share, 1)
+            scores[name] = score
+        return scores
+
+
+def parse_speaker_reply(raw: str, character_list: List[str]) -> Optional[Tuple[str, str]]:
+    """
+    Parse a combined director completion of the form
+    ``{"speaker": "<name>", "reply": "<text>"}``.
+
+    Returns (speaker, reply), or None if the output isn't usable: no JSON
+    object, a speaker outside `character_list` or an empty reply.
+    """
+    data = _first_json_object(raw or "")
+    if data is None:
+        return None
+
+    speaker = str(data.get("speaker") or "").strip()
+    reply = str(data.get("reply") or "").strip()
+    if speaker not in character_list:
+        by_lower = {name.lower(): name for name in character_list}
+        speaker = by_lower.get(speaker.lower())
+    if not speaker or len(reply) < 2:
+        return None
+    return speaker, reply
+
+
+def _first_json_object(text: str) -> Optional[dict]:
+    """First JSON object in `text`, ignoring anything before or after it"""
+    start = text.find("{")
+    while start != -1:
+        try:
+            data, _ = _JSON_DECODER.raw_decode(text, start)
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, dict):
+            return data
+        start = text.find("{", start + 1)
+    return None
+
+
+class SpeakerSelector:
+    """
+    Chooses the next speaker in one of three modes.
+
+    "local" uses the LocalTurnPolicy only. "director" asks the LLM director
+    first and falls back to the local policy when its answer is unusable.
+    "combined" asks one completion for both the speaker and their reply,
+    falling back to the local policy (and a separate reply) when that fails.
+
+    Args:
+        director: ``(history, character_list) -> name or None``.
+        combined: ``(history, character_list) -> (name, reply) or None``.
+            Both are coroutine functions for `aselect_with_reply`.
+    """
+
+    def __init__(
+            self,
+            mode: str = "local",
+            policy: Optional[LocalTurnPolicy] = None,
+            director: Optional[Callable[[Sequence, List[str]], Optional[str]]] = None,
+            combined: Optional[
+                Callable[[Sequence, List[str]], Optional[Tuple[str, str]]]
+            ] = None,
+    ):
+        if mode not in SPEAKER_SELECTION_MODES:
+            raise ValueError(f"Unknown speaker selection mode: {mode}")
+        if mode == "director" and director is None:
+            raise ValueError("Director mode needs a director callable")
+        if mode == "combined" and combined is None:
+            raise ValueError("Combined mode needs a combined callable")
+        self.mode = mode
+        self.policy = policy or LocalTurnPolicy()
+        self.director = director
+        self.combined = combined
+
+    def select(self, history: Sequence, character_list: List[str],
+               last_speaker: Optional[str] = None) -> Optional[str]:
+        return self.select_with_reply(history, character_list, last_speaker)[0]
+
+    def select_with_reply(
+            self, history: Sequence, character_list: List[str],
+            last_speaker: Optional[str] = None,
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Return (speaker, reply), where reply is only set in combined mode.
+        `last_speaker` is passed on to the local policy.
+        """
+        if self.mode == "combined":
+            result = self.combined(history, character_list)
+            if result and result[0] in character_list:
+                return result
+        elif self.mode == "director":
+            character_name = self.director(history, character_list)
+            if character_name in character_list:
+                return character_name, None
+        return self.policy.select(history, character_list, last_speaker), None
+
+    async def aselect_with_reply(
+            self, history: Sequence, character_list: List[str],
+            last_speaker: Optional[str] = None,
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """`select_with_reply` with coroutine `director` and `combined` callables"""
+        if self.mode == "combined":
+            result = await self.combined(history, character_list)
+            if result and result[0] in character_list:
+                return result
+        elif self.mode == "director":
+            character_name = await self.director(history, character_list)
+            if character_name in character_list:
+                return character_name, None
+        return self.policy.select(history, character_list, last_speaker), None
@@ -0,0 +1,181 @@
+"""
+Speculative replies for the next turn.
+
+Right after a turn is committed, the next speaker isn't known yet: with the
+LLM director it takes a round trip to find out, and with no lookahead the
+next turn isn't even selected until the current one has played. Instead of
+waiting, a reply is started for each plausible next speaker (usually two or
+three) on the upstream event loop. When the speaker is chosen its candidate
+is used and the others are cancelled.
+
+Discarded candidates cost tokens, so each show has a budget for them; once
+it's spent the show goes back to writing one reply per turn.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from async_runtime import EventLoopThread
+from context_window import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class _Candidate:
+    def __init__(self, name: str, future: Future, prompt_tokens: int):
+        self.name = name
+        self.future = future
+        self.prompt_tokens = prompt_tokens
+
+
+class SpeculativeTurns:
+    """
+    Candidate replies for one show.
+
+    Args:
+        loop: Event loop the candidates are written on.
+        write: ``async (character_name, messages) -> (text, tokens)``, where
+            tokens is the usage reported by the provider or None.
+        max_candidates: Speakers prepared per turn, most likely first.
+        max_wasted_tokens: Tokens spent on discarded candidates after which
+            the show stops speculating.
+        count_tokens: Estimates the cost of candidates that were cancelled
+            or didn't report usage.
+    """
+
+    def __init__(
+            self,
+            loop: EventLoopThread,
+            write: Callable[[str, List[dict]], Awaitable[Tuple[str, Optional[int]]]],
+            max_candidates: int = 3,
+            max_wasted_tokens: int = 50000,
+            count_tokens: Callable[[str], int] = estimate_tokens,
+    ):
+        self.loop = loop
+        self.write = write
+        self.max_candidates = max_candidates
+        self.max_wasted_tokens = max_wasted_tokens
+        self.count_tokens = count_tokens
+        self.wasted_tokens = 0
+        self.counters = {"rounds": 0, "candidates": 0, "hits": 0, "misses": 0}
+        self._after = None
+        self._candidates: Dict[str, _Candidate] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def exhausted(self) -> bool:
+        return self.wasted_tokens >= self.max_wasted_tokens
+
+    def speculate(self, after, prompts: Dict[str, List[dict]]) -> None:
+        """
+        Start candidates for the speakers in `prompts`, most likely first,
+        replacing any earlier round.
+
+        `after` identifies the history the prompts were built from (its last
+        message); a candidate is only used for a turn written after the same
+        message.
+        """
+        self.cancel()
+        if self.exhausted or not prompts:
+            return
+        candidates = {}
+        for name, messages in list(prompts.items())[:self.max_candidates]:
+            prompt_tokens = sum(self.count_tokens(m["content"]) for m in messages)
+            future = self.loop.submit(self.write(name, messages))
+            candidates[name] = _Candidate(name, future, prompt_tokens)
+        with self._lock:
+            self._after = after
+            self._candidates = candidates
+            self.counters["rounds"] += 1
+            self.counters["candidates"] += len(candidates)
+
+    def take(self, after, name: str) -> Optional[str]:
+        """
+        Reply prepared for `name` after `after`, waiting for it to finish.
+
+        Every other candidate is cancelled. Returns None if there was no
+        matching candidate or it failed, and the turn is written as usual.
+        """
+        chosen = self._claim(after, name)
+        if chosen is None:
+            return None
+        try:
+            text, _ = chosen.future.result()
+        except Exception as e:
+            return self._failed(name, e)
+        self._count("hits")
+        return text
+
+    async def atake(self, after, name: str) -> Optional[str]:
+        """`take` for coroutines running on the candidates' own loop"""
+        chosen = self._claim(after, name)
+        if chosen is None:
+            return None
+        try:
+            text, _ = await asyncio.wrap_future(chosen.future)
+        except Exception as e:
+            return self._failed(name, e)
+        self._count("hits")
+        return text
+
+    def _claim(self, after, name: str) -> Optional[_Candidate]:
+        with self._lock:
+            candidates, self._candidates = self._candidates, {}
+            matched = self._after is after
+            self._after = None
+        chosen = candidates.pop(name, None) if matched else None
+        self._discard(candidates.values())
+        if chosen is None and candidates:
+            self._count("misses")
+        return chosen
+
+    def _failed(self, name: str, error: Exception) -> None:
+        logger.warning(f"Speculative reply for {name} failed: {error}")
+        self._count("misses")
+        return None
+
+    def cancel(self) -> None:
+        """Drop the current round, e.g. when the topic changes or the show stops"""
+        with self._lock:
+            candidates, self._candidates = self._candidates, {}
+            self._after = None
+        self._discard(candidates.values())
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "pending": len(self._candidates),
+                "wasted_tokens": self.wasted_tokens,
+                "exhausted": self.exhausted,
+            }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _discard(self, candidates) -> None:
+        for candidate in candidates:
+            candidate.future.cancel()
+            candidate.future.add_done_callback(
+                lambda future, candidate=candidate: self._record_waste(candidate, future)
+            )
+
+    def _record_waste(self, candidate: _Candidate, future: Future) -> None:
+        # Cancelled or failed requests are charged their prompt, assuming
+        # the provider saw it
+        tokens = candidate.prompt_tokens
+        if not future.cancelled() and future.exception() is None:
+            text, usage = future.result()
+            tokens = usage or candidate.prompt_tokens + self.count_tokens(text)
+        with self._lock:
+            was_exhausted = self.exhausted
+            self.wasted_tokens += tokens
+            now_exhausted = self.exhausted
+        if now_exhausted and not was_exhausted:
+            logger.warning(
+                f"Speculation budget spent ({self.wasted_tokens} tokens), "
+                f"writing one reply per turn from now on"
+            )
@@ -0,0 +1,161 @@
+"""
+Cold start profile for the backend.
+
+    python startup_profile.py [--top 20] [--target 2.0] [--port 5055] [--mode asgi]
+
+Runs two measurements, each in a fresh interpreter:
+
+- Import costs: ``import app`` under ``-X importtime``, reported per module
+  imported by app.py (cumulative) and as the slowest modules overall (self
+  time).
+- Time to first accepted connection: starts the server and times how long
+  it takes until a Socket.IO client completes its connect handshake, in the
+  given server mode (see SERVER_MODE in app.py). Exits with status 1 if that
+  misses the target.
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import time
+from typing import List, NamedTuple, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# Seconds from process start until the first client is connected
+STARTUP_TARGET_SECONDS = 2.0
+
+
+class ImportCost(NamedTuple):
+    module: str
+    depth: int
+    self_us: int
+    cumulative_us: int
+
+
+def parse_importtime(output: str) -> List[ImportCost]:
+    """Parse the stderr of ``python -X importtime``"""
+    costs = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            module = name.rstrip()
+            depth = (len(module) - len(module.lstrip())) // 2
+            costs.append(ImportCost(module.strip(), depth, int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return costs
+
+
+def measure_imports() -> List[ImportCost]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120,
+    )
+    if result.returncode:
+        raise RuntimeError(f"import app failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def _socketio_request(port: int, method: str, path: str, body: Optional[str] = None) -> str:
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        connection.request(method, path, body=body, headers={"Content-Type": "text/plain"})
+        response = connection.getresponse()
+        data = response.read().decode("utf-8", "replace")
+        if response.status != 200:
+            raise ConnectionError(f"HTTP {response.status}: {data[:200]}")
+        return data
+    finally:
+        connection.close()
+
+
+def connect_client(port: int) -> None:
+    """Engine.IO polling handshake plus the Socket.IO connect packet"""
+    handshake = _socketio_request(port, "GET", "/socket.io/?EIO=4&transport=polling")
+    if not handshake.startswith("0{"):
+        raise ConnectionError(f"Unexpected handshake: {handshake[:200]}")
+    sid = handshake.split('"sid":"', 1)[1].split('"', 1)[0]
+    path = f"/socket.io/?EIO=4&transport=polling&sid={sid}"
+    _socketio_request(port, "POST", path, "40")
+    if "40" not in _socketio_request(port, "GET", path):
+        raise ConnectionError("Socket.IO connect wasn't acknowledged")
+
+
+def measure_first_connection(port: int, mode: str = "threading",
+                             timeout: float = 60.0) -> float:
+    """Seconds from spawning the server until a client is connected"""
+    if mode == "asgi":
+        server = f"import app; app.SERVER_MODE = 'asgi'; app.serve_asgi(port={port})"
+    else:
+        server = (
+            "import app; "
+            f"app.socketio.run(app.app, port={port}, use_reloader=False, "
+            "allow_unsafe_werkzeug=True)"
+        )
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", server],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {process.returncode}")
+            try:
+                connect_client(port)
+                return time.perf_counter() - start
+            except (ConnectionError, OSError):
+                time.sleep(0.01)
+        raise TimeoutError(f"No connection accepted within {timeout}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def report_imports(costs: List[ImportCost], top: int) -> None:
+    app_cost = next((c for c in costs if c.module == "app" and c.depth == 0), None)
+    if app_cost:
+        print(f"import app: {app_cost.cumulative_us / 1000:.1f} ms "
+              f"({app_cost.self_us / 1000:.1f} ms in app.py itself)")
+
+    print(f"\nImported by app.py, by cumulative time (top {top}):")
+    direct = sorted((c for c in costs if c.depth == 1), key=lambda c: -c.cumulative_us)
+    for cost in direct[:top]:
+        print(f"  {cost.cumulative_us / 1000:8.1f} ms  {cost.module}")
+
+    print(f"\nSlowest modules by self time (top {top}):")
+    for cost in sorted(costs, key=lambda c: -c.self_us)[:top]:
+        print(f"  {cost.self_us / 1000:8.1f} ms  {cost.module}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=20, help="Modules listed per table")
+    parser.add_argument("--target", type=float, default=STARTUP_TARGET_SECONDS,
+                        help="Time to first connection to aim for, in seconds")
+    parser.add_argument("--port", type=int, default=5055, help="Port for the test server")
+    parser.add_argument("--mode", choices=("threading", "asgi"), default="threading",
+                        help="Server mode to time the first connection in")
+    parser.add_argument("--skip-connection", action="store_true",
+                        help="Only report import costs")
+    args = parser.parse_args()
+
+    report_imports(measure_imports(), args.top)
+    if args.skip_connection:
+        return 0
+
+    seconds = measure_first_connection(args.port, args.mode)
+    met = seconds <= args.target
+    print(f"\nTime to first accepted connection: {seconds:.2f} s "
+          f"(target {args.target:.2f} s, {'met' if met else 'MISSED'})")
+    return 0 if met else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
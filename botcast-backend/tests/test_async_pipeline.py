@@ -0,0 +1,191 @@
+import asyncio
+
+from async_pipeline import AsyncTurnPipeline
+
+
+class Show:
+    """Stage callbacks that record what the pipeline did"""
+
+    def __init__(self, turns=3, stream=False):
+        self.turns = turns
+        self.stream = stream
+        self.committed = []
+        self.emitted = []
+        self.dropped = []
+        self.done = asyncio.Event()
+
+    async def select_speaker(self, turn):
+        return "Ada" if turn.seq % 2 else "Bob"
+
+    async def generate_text(self, turn):
+        await asyncio.sleep(0.01)
+        return f"reply {turn.seq}"
+
+    def commit(self, turn):
+        self.committed.append(turn.seq)
+
+    async def synthesize(self, turn):
+        if not self.stream:
+            return {"audio": turn.text}
+
+        async def chunks():
+            for index in range(2):
+                await asyncio.sleep(0.005)
+                yield {"audio": f"{turn.text} chunk {index}"}
+        return chunks()
+
+    async def emit(self, turn):
+        self.record(turn.audio["audio"])
+
+    async def emit_chunk(self, turn, chunk):
+        self.record(chunk["audio"] if chunk else None)
+
+    def record(self, audio):
+        self.emitted.append(audio)
+        if len(self.emitted) >= self.turns * (2 if self.stream else 1):
+            self.done.set()
+
+    def on_drop(self, turn):
+        self.dropped.append(turn.seq)
+
+    def pipeline(self, **kwargs):
+        return AsyncTurnPipeline(
+            self.select_speaker, self.generate_text, self.commit, self.synthesize, self.emit,
+            emit_chunk=self.emit_chunk, on_drop=self.on_drop, turn_gap=0, **kwargs,
+        )
+
+
+async def run_until_done(show, pipeline, timeout=2.0):
+    runner = asyncio.ensure_future(pipeline.run())
+    await asyncio.wait_for(show.done.wait(), timeout)
+    pipeline.stop()
+    await asyncio.wait_for(runner, timeout)
+
+
+def test_turns_are_emitted_in_order():
+    async def main():
+        show = Show()
+        pipeline = show.pipeline(lookahead=1)
+        await run_until_done(show, pipeline)
+        assert show.emitted[:3] == ["reply 1", "reply 2", "reply 3"]
+        assert show.committed[:3] == [1, 2, 3]
+        assert not pipeline.running
+
+    asyncio.run(main())
+
+
+def test_streamed_audio_is_emitted_chunk_by_chunk():
+    async def main():
+        show = Show(turns=2, stream=True)
+        await run_until_done(show, show.pipeline())
+        assert show.emitted[:4] == [
+            "reply 1 chunk 0", "reply 1 chunk 1", "reply 2 chunk 0", "reply 2 chunk 1",
+        ]
+
+    asyncio.run(main())
+
+
+def test_streamed_text_is_voiced_before_it_is_finished():
+    async def main():
+        show = Show(turns=1)
+        voiced_while_writing = []
+
+        async def stream_text(turn):
+            for sentence in ("First.", "Second."):
+                await asyncio.sleep(0.02)
+                yield sentence
+
+        async def synthesize(turn):
+            first = await turn.sentences.get()
+            voiced_while_writing.append(not turn.committed)
+            rest = [sentence async for sentence in turn.streamed_sentences()]
+            return {"audio": " ".join([first, *rest])}
+
+        pipeline = show.pipeline(stream_text=stream_text)
+        pipeline.synthesize = synthesize
+        await run_until_done(show, pipeline)
+        assert show.emitted[0] == "First. Second."
+        assert voiced_while_writing[0]
+
+    asyncio.run(main())
+
+
+def test_stop_cancels_a_stage_waiting_on_an_upstream():
+    async def main():
+        show = Show()
+        cancelled = asyncio.Event()
+
+        async def generate_text(turn):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        pipeline = show.pipeline()
+        pipeline.generate_text = generate_text
+        runner = asyncio.ensure_future(pipeline.run())
+        await asyncio.sleep(0.05)
+        pipeline.stop()
+        await asyncio.wait_for(runner, 1.0)
+        assert cancelled.is_set()
+        assert show.emitted == []
+
+    asyncio.run(main())
+
+
+def test_flush_drops_prepared_turns():
+    async def main():
+        show = Show()
+        release = asyncio.Event()
+
+        async def emit(turn):
+            await release.wait()
+            show.record(turn.audio["audio"])
+
+        pipeline = show.pipeline(lookahead=2)
+        pipeline.emit = emit
+        runner = asyncio.ensure_future(pipeline.run())
+        # Turn 1 is held in emit while the next turns are prepared behind it
+        await asyncio.sleep(0.1)
+        pipeline.flush()
+        release.set()
+        await asyncio.wait_for(show.done.wait(), 2.0)
+        pipeline.stop()
+        await asyncio.wait_for(runner, 1.0)
+
+        assert show.dropped
+        assert show.emitted[0] == "reply 1"
+        assert not set(show.dropped) & {int(audio.split()[1]) for audio in show.emitted}
+
+    asyncio.run(main())
+
+
+def test_flushed_stream_is_closed_for_its_listeners():
+    async def main():
+        show = Show(stream=True)
+        first_sent = asyncio.Event()
+        release = asyncio.Event()
+
+        async def emit_chunk(turn, chunk):
+            show.record(chunk["audio"] if chunk else None)
+            if chunk and not first_sent.is_set():
+                first_sent.set()
+                await release.wait()
+
+        pipeline = show.pipeline(lookahead=1)
+        pipeline.emit_chunk = emit_chunk
+        runner = asyncio.ensure_future(pipeline.run())
+        await asyncio.wait_for(first_sent.wait(), 1.0)
+        # Turn 1's second chunk is queued behind the one being sent
+        await asyncio.sleep(0.05)
+        pipeline.flush()
+        release.set()
+        await asyncio.wait_for(show.done.wait(), 2.0)
+        pipeline.stop()
+        await asyncio.wait_for(runner, 1.0)
+
+        assert show.emitted[:2] == ["reply 1 chunk 0", None]
+        assert "reply 1 chunk 1" not in show.emitted
+
+    asyncio.run(main())
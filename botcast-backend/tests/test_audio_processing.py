@@ -0,0 +1,95 @@
+import pytest
+
+import audio_processing
+from audio_processing import AudioProcessor, fade_edges, integrated_loudness, trim_silence
+
+np = pytest.importorskip("numpy")
+
+RATE = 24000
+PEAK = 10 ** (-1.0 / 20)
+
+
+def tone(seconds, amplitude, frequency=997.0):
+    t = np.arange(int(RATE * seconds)) / RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(RATE * seconds), dtype=np.float32)
+
+
+def test_full_scale_sine_measures_minus_3_lufs():
+    # The BS.1770 reference: a 997 Hz sine at 0 dBFS reads -3.01 LUFS
+    assert integrated_loudness(tone(2.0, 1.0), RATE) == pytest.approx(-3.01, abs=0.1)
+    assert integrated_loudness(tone(2.0, 0.1), RATE) == pytest.approx(-23.01, abs=0.1)
+
+
+def test_silent_or_short_clips_have_no_loudness():
+    assert integrated_loudness(silence(2.0), RATE) is None
+    assert integrated_loudness(tone(0.2, 0.5), RATE) is None
+
+
+@pytest.mark.parametrize("amplitude", [0.01, 0.1, 0.5])
+def test_clips_are_normalized_to_the_target(amplitude):
+    processor = AudioProcessor(target_lufs=-16.0, sample_rate=RATE)
+    samples, loudness = processor.normalize(tone(2.0, amplitude))
+    assert loudness == pytest.approx(-3.01 + 20 * np.log10(amplitude), abs=0.1)
+    assert integrated_loudness(samples, RATE) == pytest.approx(-16.0, abs=0.2)
+
+
+def test_gain_is_limited_by_the_peak():
+    # Quiet speech with one loud click: full gain would clip the click
+    samples = tone(2.0, 0.01)
+    samples[RATE] = 0.9
+    processor = AudioProcessor(target_lufs=-16.0, peak_dbfs=-1.0, sample_rate=RATE)
+    normalized, _ = processor.normalize(samples)
+    assert np.max(np.abs(normalized)) <= PEAK + 1e-6
+    assert integrated_loudness(normalized, RATE) < -16.0
+
+
+def test_silence_is_trimmed_to_the_kept_margin():
+    samples = np.concatenate([silence(1.0), tone(1.0, 0.5), silence(1.0)])
+    trimmed = trim_silence(samples, RATE, keep_seconds=0.05)
+    assert len(trimmed) == pytest.approx(1.1 * RATE, abs=0.01 * RATE)
+
+
+def test_all_silent_clip_is_kept_whole():
+    samples, loudness = AudioProcessor(sample_rate=RATE).normalize(silence(1.0))
+    assert len(samples) == RATE
+    assert loudness is None
+
+
+def test_fades_reach_zero_at_both_edges():
+    faded = fade_edges(np.ones(RATE, dtype=np.float32), RATE, 0.1)
+    assert faded[0] == 0 and faded[-1] == 0
+    assert faded[RATE // 2] == 1
+    assert faded[int(0.05 * RATE)] == pytest.approx(0.5, abs=0.01)
+
+
+def test_crossfaded_clips_neither_clip_nor_dip():
+    processor = AudioProcessor(sample_rate=RATE, fade_seconds=0.1)
+    first, _ = processor.normalize(tone(1.0, 0.05, frequency=220))
+    second, _ = processor.normalize(tone(1.0, 0.9, frequency=330))
+    overlap = int(0.1 * RATE)
+
+    # Played the way clients do: the second clip starts `overlap` early
+    mixed = np.zeros(len(first) + len(second) - overlap, dtype=np.float32)
+    mixed[:len(first)] += first
+    mixed[len(first) - overlap:] += second
+    assert np.max(np.abs(mixed)) <= PEAK + 1e-6
+
+    # The fade out and fade in add up to one across the overlap
+    ones, _ = AudioProcessor(sample_rate=RATE, fade_seconds=0.1).normalize(
+        np.ones(RATE, dtype=np.float32)
+    )
+    envelope = ones / ones[RATE // 2]
+    assert envelope[-overlap:] + envelope[:overlap] == pytest.approx(np.ones(overlap))
+
+
+def test_processed_clip_round_trips_through_mp3():
+    if not audio_processing.available():
+        pytest.skip("needs lameenc and miniaudio")
+    processor = AudioProcessor(sample_rate=RATE)
+    clip = processor.process(processor.encode(np.concatenate([silence(0.5), tone(1.0, 0.1)])))
+    assert clip.duration == pytest.approx(1.05, abs=0.1)
+    assert integrated_loudness(processor.decode(clip.data), RATE) == pytest.approx(-16.0, abs=1.0)
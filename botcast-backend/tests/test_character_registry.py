@@ -0,0 +1,103 @@
+import json
+import os
+
+import pytest
+
+from character_registry import PairRegistry, PairValidationError, load_pair, parse_pair
+
+
+def character(name, **overrides):
+    info = {
+        "name": name,
+        "avatar_url": f"https://example.com/{name}.png",
+        "voice_id": f"{name}-voice",
+        "description": f"{name} is a guest on the show.",
+        "mouth_positions": {"20": f"https://example.com/{name}-20.png",
+                            "10": f"https://example.com/{name}-10.png"},
+    }
+    info.update(overrides)
+    return info
+
+
+def pair_data(**overrides):
+    data = {"Ada": character("Ada"), "Bob": character("Bob")}
+    data.update(overrides)
+    return data
+
+
+def write_pair(directory, file_name, data):
+    path = os.path.join(directory, file_name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data if isinstance(data, str) else json.dumps(data))
+    return path
+
+
+def test_valid_pair_parses():
+    characters = parse_pair(pair_data())
+    assert list(characters) == ["Ada", "Bob"]
+    assert characters["Ada"].voice_id == "Ada-voice"
+
+
+@pytest.mark.parametrize("data, problem", [
+    ([], "object keyed by character name"),
+    ({"Ada": character("Ada")}, "at least two characters"),
+    (pair_data(Bob="Bob"), "Bob: entry must be an object"),
+    (pair_data(Bob=character("Robert")), "Bob: 'name' must match its key"),
+    (pair_data(Bob=character("Bob", voice_id="")), "Bob: 'voice_id'"),
+    (pair_data(Bob=character("Bob", mouth_positions={"open": "x.png"})), "'mouth_positions'"),
+    (pair_data(Bob=character("Bob", aliases="Bobby")), "'aliases'"),
+    (pair_data(Bob=character("Bob", description=None)), "no 'description'"),
+])
+def test_invalid_pairs_are_rejected(data, problem):
+    with pytest.raises(PairValidationError, match=problem):
+        parse_pair(data)
+
+
+def test_every_problem_is_reported():
+    data = pair_data(Ada=character("Ada", avatar_url=None), Bob=character("Bob", voice_id=None))
+    with pytest.raises(PairValidationError) as error:
+        parse_pair(data)
+    assert "Ada: 'avatar_url'" in str(error.value)
+    assert "Bob: 'voice_id'" in str(error.value)
+
+
+def test_load_pair_builds_the_manifest(tmp_path):
+    write_pair(tmp_path, "pair.json", pair_data())
+    pair = load_pair(str(tmp_path), "pair.json")
+    assert pair.host == "Ada"
+    assert pair.guests == ["Bob"]
+    positions = pair.manifest["characters"][0]["mouth_positions"]
+    assert [position["key"] for position in positions] == ["10", "20"]
+    assert json.loads(pair.manifest_json) == pair.manifest
+
+
+def test_load_pair_rejects_invalid_json(tmp_path):
+    write_pair(tmp_path, "broken.json", "{not json")
+    with pytest.raises(PairValidationError, match="Invalid JSON"):
+        load_pair(str(tmp_path), "broken.json")
+
+
+def test_registry_keeps_the_last_good_version(tmp_path):
+    path = write_pair(tmp_path, "pair.json", pair_data())
+    changed = []
+    registry = PairRegistry(str(tmp_path), on_change=changed.append)
+    assert registry.names() == ["pair.json"]
+    etag = registry.get("pair.json").etag
+
+    write_pair(tmp_path, "pair.json", pair_data(Bob=character("Robert")))
+    os.utime(path, (1, 1))
+    result = registry.refresh()
+    assert "pair.json" in result["errors"]
+    assert registry.get("pair.json").etag == etag
+    assert changed == []
+
+    write_pair(tmp_path, "pair.json", pair_data(Bob=character("Bob", voice_id="new-voice")))
+    os.utime(path, (2, 2))
+    result = registry.refresh()
+    assert result == {"reloaded": ["pair.json"], "removed": [], "errors": {}}
+    assert registry.get("pair.json").characters["Bob"].voice_id == "new-voice"
+    assert [pair.name for pair in changed] == ["pair.json"]
+
+    os.remove(path)
+    assert registry.refresh()["removed"] == ["pair.json"]
+    assert registry.get("pair.json") is None
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from circuit_breaker import (
+    CLOSED, HALF_OPEN, OPEN, BreakerRegistry, CircuitBreaker, CircuitOpenError,
+)
+
+
+def open_breaker(**kwargs) -> CircuitBreaker:
+    breaker = CircuitBreaker("upstream", failure_threshold=2, **kwargs)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("upstream", failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.available()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_half_open_hands_out_limited_probes():
+    breaker = open_breaker(reset_timeout=0.05, half_open_probes=1)
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.available()
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A cancelled probe is given back
+    breaker.record_cancelled()
+    assert breaker.allow()
+
+
+def test_successful_probe_closes():
+    breaker = open_breaker(reset_timeout=0.05)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+
+
+def test_failed_probe_reopens():
+    breaker = open_breaker(reset_timeout=0.05)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["retry_in"] > 0
+
+
+def test_registry_shares_one_breaker_per_upstream():
+    breakers = BreakerRegistry(failure_threshold=1)
+    assert breakers.get("neets") is breakers.get("neets")
+    breakers.get("neets").record_failure()
+    snapshot = breakers.snapshot()
+    assert snapshot["neets"]["state"] == OPEN
+    assert snapshot["neets"]["failures"] == 1
@@ -0,0 +1,152 @@
+from context_window import ContextWindow, estimate_tokens
+from session import ConversationMessage
+
+
+def messages(count, words=6):
+    # Each message costs `words` tokens plus 4 of overhead with count_words
+    return [ConversationMessage("Joe", " ".join([f"m{n}"] * words)) for n in range(count)]
+
+
+def count_words(text):
+    return len(text.split())
+
+
+class Summarizer:
+    def __init__(self, reply="summary"):
+        self.reply = reply
+        self.calls = []
+
+    def __call__(self, previous, overflow):
+        self.calls.append((previous, list(overflow)))
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        return self.reply
+
+
+class DeferredExecutor:
+    """Holds submitted jobs until `run_all`, like a busy background pool"""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        self.jobs.append((fn, args))
+
+    def run_all(self):
+        jobs, self.jobs = self.jobs, []
+        for fn, args in jobs:
+            fn(*args)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_history_within_budget_is_sent_whole():
+    summarize = Summarizer()
+    window = ContextWindow(summarize, budget_tokens=100, count_tokens=count_words)
+    history = messages(5)
+    assert window.build(history) == ("", history)
+    assert summarize.calls == []
+
+
+def test_overflow_is_folded_into_the_summary():
+    summarize = Summarizer("Joe said m0 to m3")
+    folded = []
+    window = ContextWindow(summarize, budget_tokens=45, min_recent=1,
+                           on_folded=folded.append, count_tokens=count_words)
+    history = messages(8)
+
+    summary, recent = window.build(history)
+    # The summary is folded inline, so it shows up from the next build on
+    assert summary == ""
+    assert recent == history[4:]
+    assert summarize.calls == [("", history[:4])]
+    assert folded == [history[:4]]
+
+    summary, recent = window.build(history)
+    assert summary == "Joe said m0 to m3"
+    # The summary uses 5 of the 45 tokens, leaving room for 4 messages
+    assert recent == history[4:]
+    assert len(summarize.calls) == 1
+
+
+def test_min_recent_is_kept_over_budget():
+    window = ContextWindow(Summarizer(), budget_tokens=5, min_recent=3, count_tokens=count_words)
+    history = messages(5)
+    assert window.build(history)[1] == history[2:]
+
+
+def test_owner_dropping_folded_messages_keeps_the_same_prompt():
+    summarize = Summarizer()
+    history = messages(8)
+
+    def forget_folded(overflow):
+        for message in overflow:
+            history.remove(message)
+
+    window = ContextWindow(summarize, budget_tokens=51, min_recent=1,
+                           on_folded=forget_folded, count_tokens=count_words)
+    _, recent = window.build(list(history))
+    assert history == recent
+    assert len(recent) == 5
+
+    # The one-token summary leaves exactly enough room for the rest
+    assert window.build(history) == ("summary", recent)
+    assert len(summarize.calls) == 1
+
+
+def test_summary_is_trimmed_to_its_budget():
+    window = ContextWindow(Summarizer("word " * 100), budget_tokens=20, summary_tokens=10,
+                           min_recent=1)
+    window.build(messages(6))
+    assert estimate_tokens(window.summary) <= 10
+
+
+def test_one_fold_runs_at_a_time():
+    summarize = Summarizer()
+    executor = DeferredExecutor()
+    window = ContextWindow(summarize, budget_tokens=20, min_recent=1, executor=executor,
+                           count_tokens=count_words)
+    history = messages(6)
+    window.build(history)
+    window.build(history)
+    assert len(executor.jobs) == 1
+
+    executor.run_all()
+    assert window.summary == "summary"
+
+
+def test_reset_discards_a_fold_in_flight():
+    summarize = Summarizer()
+    folded = []
+    executor = DeferredExecutor()
+    window = ContextWindow(summarize, budget_tokens=20, min_recent=1, executor=executor,
+                           on_folded=folded.append, count_tokens=count_words)
+    window.build(messages(6))
+    # The show moves to a new topic before the summary comes back
+    window.reset()
+    executor.run_all()
+    assert window.summary == ""
+    assert folded == []
+
+    # And the next overflow is folded from scratch
+    window.build(messages(6))
+    executor.run_all()
+    assert summarize.calls[-1][0] == ""
+    assert window.summary == "summary"
+
+
+def test_failed_fold_is_retried_on_the_next_build():
+    summarize = Summarizer(RuntimeError("LLM down"))
+    window = ContextWindow(summarize, budget_tokens=20, min_recent=1, count_tokens=count_words)
+    history = messages(6)
+    window.build(history)
+    assert window.summary == ""
+
+    summarize.reply = "summary"
+    window.build(history)
+    assert len(summarize.calls) == 2
+    assert window.summary == "summary"
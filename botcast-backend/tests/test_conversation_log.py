@@ -0,0 +1,55 @@
+import json
+
+from conversation_log import ConversationLog, read_log, tail_log
+
+
+def write_entries(path, count, **options):
+    log = ConversationLog(str(path), fsync="never", flush_interval=0.05, **options)
+    for index in range(count):
+        log.append({"turn": index})
+    log.close()
+
+
+def turns(entries):
+    return [entry["turn"] for entry in entries]
+
+
+def test_entries_are_written_in_order(tmp_path):
+    path = tmp_path / "log.jsonl"
+    write_entries(path, 10)
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["turn"] for line in lines] == list(range(10))
+
+
+def test_rotates_by_size_and_keeps_backups(tmp_path):
+    path = tmp_path / "log.jsonl"
+    # One entry per batch, so every write checks the size
+    write_entries(path, 20, batch_size=1, max_bytes=40, backups=2)
+    assert (tmp_path / "log.jsonl.1").exists()
+    assert (tmp_path / "log.jsonl.2").exists()
+    assert not (tmp_path / "log.jsonl.3").exists()
+    # What's left is contiguous and ends with the newest entry
+    kept = turns(read_log(str(path), include_rotated=True))
+    assert kept == list(range(20 - len(kept), 20))
+
+
+def test_tail_reads_the_last_entries_backwards(tmp_path):
+    path = tmp_path / "log.jsonl"
+    write_entries(path, 100)
+    assert turns(tail_log(str(path), 5, block_size=16)) == [95, 96, 97, 98, 99]
+    assert turns(tail_log(str(path), 500)) == list(range(100))
+
+
+def test_tail_falls_back_to_the_rotated_file(tmp_path):
+    path = tmp_path / "log.jsonl"
+    (tmp_path / "log.jsonl.1").write_text(
+        "".join(json.dumps({"turn": index}) + "\n" for index in range(5)), encoding="utf-8"
+    )
+    path.write_text(json.dumps({"turn": 5}) + "\n", encoding="utf-8")
+    assert turns(tail_log(str(path), 3)) == [3, 4, 5]
+
+
+def test_tail_skips_malformed_lines(tmp_path):
+    path = tmp_path / "log.jsonl"
+    path.write_text('{"turn": 1}\nnot json\n{"turn": 2}\n', encoding="utf-8")
+    assert turns(tail_log(str(path), 5)) == [1, 2]
@@ -0,0 +1,65 @@
+import pytest
+
+from episode_archive import EpisodeArchive, hls_playlist, parse_range, read_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=10-", (10, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=990-5000", (990, 999)),
+    (" bytes=0-0 ", (0, 0)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [
+    None, "", "bytes=-", "bytes=0-9,20-29", "items=0-9", "bytes=50-10", "bytes=2000-10",
+])
+def test_unusable_headers_serve_the_whole_file(header):
+    assert parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=1000-", 1000),
+    ("bytes=1000-1010", 1000),
+    ("bytes=-0", 1000),
+    ("bytes=0-", 0),
+    ("bytes=-10", 0),
+])
+def test_unsatisfiable_ranges_raise(header, size):
+    with pytest.raises(ValueError):
+        parse_range(header, size)
+
+
+def test_read_range_is_inclusive_and_chunked(tmp_path):
+    path = tmp_path / "audio.mp3"
+    path.write_bytes(bytes(range(100)))
+    assert list(read_range(str(path), 10, 29, chunk_size=8)) == [
+        bytes(range(10, 18)), bytes(range(18, 26)), bytes(range(26, 30)),
+    ]
+    assert b"".join(read_range(str(path), 95, 500)) == bytes(range(95, 100))
+    assert list(read_range(str(path), 100, 200)) == []
+
+
+def test_segments_are_byte_ranges_of_the_audio(tmp_path):
+    archive = EpisodeArchive(str(tmp_path))
+    episode = archive.start("room 1", "pair")
+    episode.append(b"first", {"speaker": "a"}, 1.2)
+    episode.append(b"second", {"speaker": "b"}, 2.5)
+    episode.close()
+
+    segments = archive.segments("room 1", episode.episode_id)
+    path = archive.audio_path("room 1", episode.episode_id)
+    clips = [b"".join(read_range(path, s["offset"], s["offset"] + s["length"] - 1))
+             for s in segments]
+    assert clips == [b"first", b"second"]
+    assert archive.info("room 1", episode.episode_id)["ended_at"] is not None
+    assert [info["episode"] for info in archive.episodes()] == [episode.episode_id]
+
+    playlist = hls_playlist(segments, "audio.mp3", ended=True)
+    assert "#EXT-X-TARGETDURATION:3" in playlist
+    assert "#EXT-X-BYTERANGE:6@5" in playlist
+    assert playlist.rstrip().endswith("#EXT-X-ENDLIST")
@@ -0,0 +1,79 @@
+import pytest
+
+import audio_processing
+from lip_sync import (
+    amplitude_envelope, lip_sync_available, lip_sync_frames, lip_sync_from_samples,
+    position_keys, quantize_envelope,
+)
+
+np = pytest.importorskip("numpy")
+
+RATE = 24000
+MOUTH_POSITIONS = {"40": "open.png", "10": "closed.png", "30": "wide.png", "20": "half.png"}
+
+
+def tone(seconds, amplitude, rate=RATE):
+    t = np.arange(int(rate * seconds)) / rate
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def test_position_keys_go_from_closed_to_open():
+    assert position_keys(MOUTH_POSITIONS) == ["10", "20", "30", "40"]
+    assert position_keys({"open": "a.png", "5": "b.png"}) == ["5", "open"]
+
+
+def test_envelope_is_rms_per_frame():
+    samples = np.concatenate([np.full(800, 0.5, dtype=np.float32), np.zeros(800, np.float32)])
+    envelope = amplitude_envelope(samples, RATE, fps=30)
+    assert envelope.tolist() == pytest.approx([0.5, 0.0])
+
+    # A sine's RMS is its amplitude over sqrt(2)
+    assert amplitude_envelope(tone(1.0, 0.8), RATE) == pytest.approx(0.8 / 2 ** 0.5, rel=0.01)
+
+
+@pytest.mark.parametrize("seconds", [0.5, 1.0, 1.01, 2.345])
+def test_one_frame_per_tick_of_the_clip(seconds):
+    frames = amplitude_envelope(tone(seconds, 0.5), RATE, fps=30)
+    assert len(frames) == int(np.ceil(seconds * RATE / 800))
+    assert abs(len(frames) / 30 - seconds) < 1 / 30
+
+
+def test_quantized_levels_index_the_positions():
+    envelope = np.array([0.0, 0.05, 0.2, 0.5, 0.8, 1.0, 1.0, 1.0, 1.0, 1.0])
+    frames = quantize_envelope(envelope, 4)
+    assert frames.min() == 0 and frames.max() == 3
+    # Silence keeps the mouth closed, louder frames never open it less
+    assert frames[0] == frames[1] == 0
+    assert list(frames) == sorted(frames)
+
+
+def test_silent_and_empty_envelopes_stay_closed():
+    assert quantize_envelope(np.zeros(5), 4).tolist() == [0] * 5
+    assert quantize_envelope(np.zeros(0), 4).tolist() == []
+
+
+def test_frames_follow_speech_and_pauses():
+    samples = np.concatenate([tone(0.5, 0.6), np.zeros(RATE // 2, np.float32), tone(0.5, 0.6)])
+    result = lip_sync_from_samples(samples, RATE, MOUTH_POSITIONS)
+    assert result["fps"] == 30
+    assert result["positions"] == ["10", "20", "30", "40"]
+    frames = result["frames"]
+    assert len(frames) == 45
+    # What the UI shows: positions[frames[i]] for the frame at i / fps seconds
+    shown = [result["positions"][frame] for frame in frames]
+    assert shown[5] == "40" and shown[20] == "10" and shown[40] == "40"
+
+
+def test_no_mouth_positions_means_no_envelope():
+    assert lip_sync_from_samples(tone(0.5, 0.5), RATE, {}) is None
+
+
+def test_mp3_clip_gets_an_envelope():
+    if not lip_sync_available() or not audio_processing.available():
+        pytest.skip("needs miniaudio and lameenc")
+    data = audio_processing.AudioProcessor(sample_rate=RATE).encode(tone(1.0, 0.5))
+    result = lip_sync_frames(data, MOUTH_POSITIONS)
+    # MP3 encoding adds a little padding at the edges
+    assert 30 <= len(result["frames"]) <= 33
+    assert max(result["frames"]) == 3
+    assert lip_sync_frames(b"not an mp3", MOUTH_POSITIONS) is None
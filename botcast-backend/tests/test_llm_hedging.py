@@ -0,0 +1,184 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from circuit_breaker import BreakerRegistry, CircuitOpenError
+from llm_hedging import HedgedRouter, LatencyHistogram
+
+
+class FakeBackend:
+    """Stands in for `client.chat.completions` of one backend"""
+
+    def __init__(self, name, delay=0.0, error=None, deltas=None):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.deltas = deltas or [name]
+        self.calls = 0
+        self.cancelled = 0
+
+    async def create(self, model, messages, timeout, stream=False, **params):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        if stream:
+            return FakeStream(self.deltas)
+        message = SimpleNamespace(content=self.name)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeStream:
+    def __init__(self, deltas):
+        self.deltas = deltas
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for delta in self.deltas:
+            if isinstance(delta, Exception):
+                raise delta
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+
+class FakeRegistry:
+    def __init__(self, *backends):
+        self.backends = {backend.name: backend for backend in backends}
+
+    def get(self, key):
+        return SimpleNamespace(model=key, temperature=0.7, api_base=f"https://{key}")
+
+    def async_client(self, key):
+        client = SimpleNamespace(chat=SimpleNamespace(completions=self.backends[key]))
+        client.with_options = lambda **options: client
+        return client
+
+
+def make_router(*backends, **kwargs):
+    kwargs.setdefault("default_hedge_delay", 0.05)
+    return HedgedRouter(
+        FakeRegistry(*backends), None,
+        routes={backends[0].name: [backend.name for backend in backends[1:]]},
+        **kwargs,
+    )
+
+
+def answer(response):
+    return response.choices[0].message.content
+
+
+def test_fast_primary_is_not_hedged():
+    primary, alternate = FakeBackend("primary"), FakeBackend("alternate")
+    router = make_router(primary, alternate)
+
+    assert answer(asyncio.run(router.acreate("primary", []))) == "primary"
+    assert alternate.calls == 0
+    assert router.counters["hedged"] == 0
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    primary, alternate = FakeBackend("primary", delay=1.0), FakeBackend("alternate")
+    router = make_router(primary, alternate)
+
+    assert answer(asyncio.run(router.acreate("primary", []))) == "alternate"
+    assert primary.cancelled == 1
+    assert router.counters["hedged"] == 1
+    assert router.counters["hedge_wins"] == 1
+
+
+def test_failing_primary_fails_over_without_waiting():
+    primary = FakeBackend("primary", error=RuntimeError("down"))
+    alternate = FakeBackend("alternate")
+    router = make_router(primary, alternate, default_hedge_delay=10.0)
+
+    assert answer(asyncio.run(asyncio.wait_for(router.acreate("primary", []), 1.0))) == "alternate"
+    assert router.counters["failovers"] == 1
+    assert router.counters["hedged"] == 0
+
+
+def test_hedge_false_only_fails_over():
+    primary, alternate = FakeBackend("primary", delay=0.2), FakeBackend("alternate")
+    router = make_router(primary, alternate)
+
+    assert answer(asyncio.run(router.acreate("primary", [], hedge=False))) == "primary"
+    assert alternate.calls == 0
+
+
+def test_last_error_is_raised_when_every_backend_fails():
+    primary = FakeBackend("primary", error=RuntimeError("primary down"))
+    alternate = FakeBackend("alternate", error=RuntimeError("alternate down"))
+    router = make_router(primary, alternate, max_attempts=2)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(router.acreate("primary", []))
+    assert primary.calls == 2
+    assert alternate.calls == 2
+
+
+def test_open_circuits_are_skipped():
+    primary, alternate = FakeBackend("primary"), FakeBackend("alternate")
+    breakers = BreakerRegistry(failure_threshold=1)
+    breakers.get("https://primary").record_failure()
+    router = make_router(primary, alternate, breakers=breakers)
+
+    assert answer(asyncio.run(router.acreate("primary", []))) == "alternate"
+    assert primary.calls == 0
+    assert router.counters["skipped"] == 1
+
+    breakers.get("https://alternate").record_failure()
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(router.acreate("primary", []))
+
+
+async def collect(stream):
+    return [delta async for delta in stream]
+
+
+def test_stream_fails_over_before_the_first_delta():
+    primary = FakeBackend("primary", error=RuntimeError("down"))
+    alternate = FakeBackend("alternate", deltas=["Hello", " there"])
+    router = make_router(primary, alternate)
+
+    assert asyncio.run(collect(router.astream("primary", []))) == ["Hello", " there"]
+    assert router.counters["failovers"] == 1
+
+
+def test_stream_failing_part_way_raises():
+    primary = FakeBackend("primary", deltas=["Hello", RuntimeError("cut off")])
+    alternate = FakeBackend("alternate")
+    router = make_router(primary, alternate)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(collect(router.astream("primary", [])))
+    assert alternate.calls == 0
+
+
+def test_hedge_delay_follows_the_primary_latency():
+    router = make_router(FakeBackend("primary"), min_samples=5, min_hedge_delay=0.1,
+                         max_hedge_delay=5.0)
+    assert router.hedge_delay("primary") == 0.05
+    for _ in range(5):
+        router.histogram("primary").record(1.0)
+    assert 1.0 <= router.hedge_delay("primary") <= 1.2
+
+    for _ in range(100):
+        router.histogram("primary").record(60.0)
+    assert router.hedge_delay("primary") == 5.0
+
+
+def test_histogram_quantile_is_a_bucket_bound():
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.5) is None
+    for seconds in (0.1, 0.2, 0.3, 4.0):
+        histogram.record(seconds)
+    assert 0.2 <= histogram.quantile(0.5) < 0.25
+    assert histogram.quantile(1.0) >= 4.0
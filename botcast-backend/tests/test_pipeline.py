@@ -0,0 +1,159 @@
+import threading
+import time
+
+from pipeline import TurnPipeline
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition never became true"
+        time.sleep(0.005)
+
+
+class Show:
+    """Stage callbacks that record what the pipeline did"""
+
+    def __init__(self, stream=False):
+        self.stream = stream
+        self.events = []
+        self.selected = []
+        self.emitted = []
+        self.dropped = []
+        # Cleared to hold the emit stage inside its callback
+        self.playing = threading.Event()
+        self.playing.set()
+        self._lock = threading.Lock()
+
+    def log(self, *event):
+        with self._lock:
+            self.events.append(event)
+
+    def select_speaker(self, turn):
+        self.selected.append(turn.seq)
+        self.log("select", turn.seq)
+        return "Ada" if turn.seq % 2 else "Bob"
+
+    def generate_text(self, turn):
+        time.sleep(0.01)
+        return f"reply {turn.seq}"
+
+    def commit(self, turn):
+        self.log("commit", turn.seq)
+
+    def synthesize(self, turn):
+        if not self.stream:
+            return {"audio": turn.text}
+        return ({"audio": f"{turn.text} chunk {index}"} for index in range(3))
+
+    def emit(self, turn):
+        self.playing.wait()
+        self.emitted.append(turn.audio["audio"])
+
+    def emit_chunk(self, turn, chunk):
+        self.emitted.append(chunk["audio"] if chunk else None)
+        self.playing.wait()
+
+    def on_drop(self, turn):
+        self.dropped.append(turn.seq)
+
+    def pipeline(self, **kwargs):
+        return TurnPipeline(
+            self.select_speaker, self.generate_text, self.commit, self.synthesize, self.emit,
+            emit_chunk=self.emit_chunk, on_drop=self.on_drop, turn_gap=0, **kwargs,
+        )
+
+
+def stop(pipeline):
+    pipeline.stop()
+    pipeline.join(2)
+    assert not any(thread.is_alive() for thread in pipeline._threads)
+    assert not pipeline.running
+
+
+def test_turns_are_emitted_in_order():
+    show = Show()
+    pipeline = show.pipeline(lookahead=1)
+    pipeline.start()
+    wait_until(lambda: len(show.emitted) >= 3)
+    stop(pipeline)
+    assert show.emitted[:3] == ["reply 1", "reply 2", "reply 3"]
+
+
+def test_lookahead_is_bounded_while_a_turn_plays():
+    show = Show()
+    show.playing.clear()
+    pipeline = show.pipeline(lookahead=2)
+    pipeline.start()
+    wait_until(lambda: len(show.selected) == 3)
+    # Turn 1 is playing and two more are prepared; the next waits for a slot
+    time.sleep(0.2)
+    assert show.selected == [1, 2, 3]
+
+    show.playing.set()
+    wait_until(lambda: len(show.selected) >= 5)
+    stop(pipeline)
+
+
+def test_next_speaker_is_selected_after_the_last_turn_is_committed():
+    show = Show()
+    pipeline = show.pipeline(lookahead=2)
+    pipeline.start()
+    wait_until(lambda: len(show.emitted) >= 4)
+    stop(pipeline)
+
+    events = list(show.events)
+    for seq in range(2, 5):
+        assert events.index(("commit", seq - 1)) < events.index(("select", seq))
+
+
+def test_flush_drops_prepared_turns():
+    show = Show()
+    show.playing.clear()
+    pipeline = show.pipeline(lookahead=2)
+    pipeline.start()
+    wait_until(lambda: len(show.selected) == 3)
+    wait_until(lambda: ("commit", 3) in show.events)
+    time.sleep(0.05)
+    pipeline.flush()
+    show.playing.set()
+    wait_until(lambda: len(show.emitted) >= 2)
+    stop(pipeline)
+
+    assert show.emitted[0] == "reply 1"
+    assert {2, 3} <= set(show.dropped)
+    assert "reply 2" not in show.emitted and "reply 3" not in show.emitted
+
+
+def test_stop_drops_every_turn_not_emitted():
+    show = Show()
+    show.playing.clear()
+    pipeline = show.pipeline(lookahead=2)
+    pipeline.start()
+    wait_until(lambda: ("commit", 3) in show.events)
+    time.sleep(0.05)
+    pipeline.stop()
+    show.playing.set()
+    pipeline.join(2)
+
+    # Every selected turn was either emitted or dropped, exactly once
+    emitted = [int(audio.split()[1]) for audio in show.emitted]
+    assert sorted(emitted + show.dropped) == show.selected
+    assert emitted == [1]
+
+
+def test_flushed_stream_sends_no_more_chunks():
+    show = Show(stream=True)
+    show.playing.clear()
+    pipeline = show.pipeline(lookahead=1)
+    pipeline.start()
+    wait_until(lambda: show.emitted)
+    # The rest of turn 1's chunks are queued behind the one being sent
+    time.sleep(0.05)
+    pipeline.flush()
+    show.playing.set()
+    wait_until(lambda: len(show.emitted) >= 3)
+    stop(pipeline)
+
+    assert show.emitted[:2] == ["reply 1 chunk 0", None]
+    assert "reply 1 chunk 1" not in show.emitted
@@ -0,0 +1,70 @@
+import re
+from types import SimpleNamespace
+
+from prompt_templates import compile_prompts
+
+# Rules of the reply prompt as app.py built it on every turn before prompts
+# were compiled; rule 7 was the topic rule
+BASELINE_RULES = """
+    1) Only respond as {name}.
+    2) Frame your phrasing and messages as close to a podcast as possible. You've been a guest on the Joe Rogan Experience and other world famous podcasts.
+    3) If the last message is from you, ensure your next response moves the conversation forward in an engaging manner.
+    4) Do NOT add non conversational messages like *laughs* or *claps* or *nods*, (laughs nervously), (chuckles) etc. DO NOT INCLUDE THEM AT ALL PLEASE
+    7) Make SURE to talk about the current topic and naturally incorporate it into your response.
+    8) Keep your responses FUNNY and EDGY. Do not make it too serious and do NOT be woke!
+    9) Your response should be concise and limited to 50 words.
+    10) Do NOT always mention the other guests name in your response especially in further turns
+"""
+TOPIC_RULE = "Make SURE to talk about the current topic and naturally incorporate it into your response."
+
+_RULE = re.compile(r"^\s*\d+\)\s*(.+?)\s*$", re.MULTILINE)
+
+
+def rules(text):
+    return _RULE.findall(text)
+
+
+def characters():
+    return {
+        "Joe Rogan": SimpleNamespace(description="\n    Comedian and podcast host.  \n"),
+        "Elon Musk": SimpleNamespace(description="Runs rocket and car companies."),
+    }
+
+
+def test_reply_prompt_keeps_the_baseline_rules():
+    prompts = compile_prompts(characters())
+    rendered = prompts.reply["Joe Rogan"].render("Mars colonies")
+
+    baseline = rules(BASELINE_RULES.format(name="Joe Rogan"))
+    # The topic rule moved to the suffix, the rest stayed in the prefix in order
+    assert rules(rendered) == [rule for rule in baseline if rule != TOPIC_RULE]
+    assert TOPIC_RULE in rendered
+    assert "The current topic of discussion is: Mars colonies." in rendered
+
+
+def test_prefix_does_not_depend_on_the_topic():
+    prompt = compile_prompts(characters()).reply["Elon Musk"]
+    assert prompt.render("Mars colonies").startswith(prompt.prefix)
+    assert prompt.render("Cage fights").startswith(prompt.prefix)
+    assert prompt.render(None) == prompt.prefix
+    assert "Mars" not in prompt.prefix
+
+
+def test_prefix_names_the_character_and_the_other_guests():
+    prefix = compile_prompts(characters()).reply["Joe Rogan"].prefix
+    assert prefix.startswith("You are Joe Rogan. Joe Rogan's description: Comedian and podcast host.\n")
+    assert "other guests: Elon Musk." in prefix
+
+
+def test_combined_prompt_lists_the_whole_cast():
+    combined = compile_prompts(characters()).combined
+    assert "[Joe Rogan, Elon Musk]" in combined.prefix
+    assert "Elon Musk's description: Runs rocket and car companies." in combined.prefix
+    assert '{"speaker": "<name>", "reply": "<message>"}' in combined.prefix
+    assert combined.render("Mars colonies").endswith("naturally incorporate it.")
+
+
+def test_token_counts_cover_prefix_and_suffix():
+    prompt = compile_prompts(characters(), count_tokens=len).reply["Joe Rogan"]
+    assert prompt.token_count() == len(prompt.prefix)
+    assert prompt.token_count("Mars") == len(prompt.render("Mars"))
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from rate_limit import BACKGROUND, LIVE, RateLimiter, RateLimitTimeout, retry_after
+
+
+def wait_for_waiters(limiter: RateLimiter, count: int) -> None:
+    deadline = time.monotonic() + 2
+    while limiter.snapshot()["waiting"] < count:
+        assert time.monotonic() < deadline, "waiters never queued"
+        time.sleep(0.005)
+
+
+def test_live_callers_go_before_background_ones():
+    limiter = RateLimiter("upstream", max_concurrent=1)
+    order = []
+
+    def call(name, priority):
+        with limiter.acquire(priority):
+            order.append(name)
+
+    threads = []
+    with limiter.acquire(LIVE):
+        # Queued in this order while the only slot is taken
+        for name, priority in (("background-1", BACKGROUND), ("live-1", LIVE),
+                               ("background-2", BACKGROUND), ("live-2", LIVE)):
+            thread = threading.Thread(target=call, args=(name, priority))
+            thread.start()
+            threads.append(thread)
+            wait_for_waiters(limiter, len(threads))
+    for thread in threads:
+        thread.join(2)
+
+    assert order == ["live-1", "live-2", "background-1", "background-2"]
+    assert limiter.snapshot()["active"] == 0
+
+
+def test_async_callers_share_the_priority_queue():
+    limiter = RateLimiter("upstream", max_concurrent=1)
+    order = []
+
+    async def call(name, priority):
+        async with limiter.acquire_async(priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        async with limiter.acquire_async(LIVE):
+            tasks = [asyncio.ensure_future(call("background", BACKGROUND))]
+            await asyncio.sleep(0.01)
+            tasks.append(asyncio.ensure_future(call("live", LIVE)))
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["live", "background"]
+
+
+def test_request_rate_is_enforced():
+    limiter = RateLimiter("upstream", requests_per_second=20, burst=1)
+    start = time.monotonic()
+    for _ in range(3):
+        with limiter.acquire():
+            pass
+    assert time.monotonic() - start >= 0.09
+
+
+def test_timeout_leaves_the_queue():
+    limiter = RateLimiter("upstream", max_concurrent=1)
+
+    async def acquire_async():
+        async with limiter.acquire_async(timeout=0.05):
+            pass
+
+    with limiter.acquire():
+        with pytest.raises(RateLimitTimeout):
+            with limiter.acquire(timeout=0.05):
+                pass
+        with pytest.raises(RateLimitTimeout):
+            asyncio.run(acquire_async())
+    assert limiter.snapshot()["waiting"] == 0
+    with limiter.acquire(timeout=0.05):
+        pass
+
+
+def test_throttle_pauses_callers():
+    limiter = RateLimiter("upstream")
+    limiter.throttle(0.05)
+    start = time.monotonic()
+    with limiter.acquire():
+        pass
+    assert time.monotonic() - start >= 0.04
+    assert limiter.snapshot()["throttled"] == 1
+
+
+def test_retry_after_reads_429s_only():
+    response = SimpleNamespace(status_code=429, headers={"retry-after": "2"})
+    assert retry_after(SimpleNamespace(response=response)) == 2.0
+    assert retry_after(SimpleNamespace(status_code=429, response=None)) == 5.0
+    assert retry_after(SimpleNamespace(status_code=500, response=None)) is None
+    assert retry_after(ValueError("boom")) is None
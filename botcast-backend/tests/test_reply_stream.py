@@ -0,0 +1,59 @@
+from utils import ReplyStream
+
+
+def feed_all(stream, deltas):
+    sentences = []
+    for delta in deltas:
+        sentences += stream.feed(delta)
+    return sentences + stream.finish()
+
+
+def test_sentences_are_emitted_as_they_complete():
+    stream = ReplyStream("Joe")
+    assert stream.feed("Hello the") == []
+    assert stream.feed("re. How are") == ["Hello there."]
+    assert stream.feed(" you? Fine") == ["How are you?"]
+    assert stream.finish() == ["Fine"]
+    assert stream.done
+
+
+def test_prefix_and_quotes_are_stripped_across_deltas():
+    stream = ReplyStream("Joe")
+    assert feed_all(stream, ['"Jo', "e: Well", ', yes." No.']) == ["Well, yes.", "No."]
+
+
+def test_short_sentences_wait_for_the_next():
+    stream = ReplyStream("Joe", min_chars=10)
+    assert feed_all(stream, ["Yes. ", "That is right. ", "Ok."]) == ["Yes. That is right.", "Ok."]
+
+
+def test_reply_ends_after_max_sentences():
+    stream = ReplyStream("Joe", max_sentences=2)
+    assert feed_all(stream, ["One. Two. Three. ", "Four."]) == ["One.", "Two."]
+    assert stream.done
+    assert stream.feed("Five. ") == []
+
+
+def test_reply_ends_with_the_sentence_reaching_max_words():
+    stream = ReplyStream("Joe", max_words=4)
+    assert stream.feed("One two three. Four five six. Seven. ") == [
+        "One two three.", "Four five six.",
+    ]
+    assert stream.done
+    assert stream.words == 6
+
+
+def test_run_on_sentence_is_cut_at_twice_max_words():
+    stream = ReplyStream("Joe", max_words=3)
+    assert stream.feed("one two three four five six seven eight") == [
+        "one two three four five six",
+    ]
+    assert stream.done
+    assert stream.finish() == []
+
+
+def test_no_text_is_lost_without_limits():
+    text = "Joe: One. Two three? Four five six! Seven."
+    for size in (1, 3, 7, len(text)):
+        deltas = [text[i:i + size] for i in range(0, len(text), size)]
+        assert " ".join(feed_all(ReplyStream("Joe"), deltas)) == text[len("Joe: "):]
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from session import Session
+
+
+def make_session():
+    pair = SimpleNamespace(name="pair", characters={}, prompts=None)
+    session = Session("room", pair)
+    session.conversation_active = True
+    return session
+
+
+def later(fn, *args, delay=0.05):
+    timer = threading.Timer(delay, fn, args)
+    timer.start()
+    return timer
+
+
+def test_thread_wakes_when_a_listener_joins():
+    session = make_session()
+    later(session.add_listener, "sid")
+    assert session.wait_for_listeners(timeout=1.0)
+
+
+def test_coroutine_wakes_when_a_listener_joins_from_another_thread():
+    session = make_session()
+
+    async def main():
+        later(session.add_listener, "sid")
+        return await asyncio.wait_for(session.wait_for_listeners_async(), 1.0)
+
+    assert asyncio.run(main())
+    assert session._async_waiters == []
+
+
+def test_coroutine_wakes_when_the_show_stops():
+    session = make_session()
+
+    async def main():
+        later(session.stop)
+        return await asyncio.wait_for(session.wait_for_listeners_async(), 1.0)
+
+    assert asyncio.run(main()) is False
+
+
+def test_coroutine_returns_at_once_if_someone_is_listening():
+    session = make_session()
+    session.add_listener("sid")
+    assert asyncio.run(session.wait_for_listeners_async())
+
+
+def test_cancelled_waiter_is_forgotten():
+    session = make_session()
+
+    async def main():
+        waiting = asyncio.ensure_future(session.wait_for_listeners_async())
+        await asyncio.sleep(0.01)
+        assert len(session._async_waiters) == 1
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+
+    asyncio.run(main())
+    assert session._async_waiters == []
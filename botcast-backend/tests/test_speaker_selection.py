@@ -0,0 +1,90 @@
+from collections import Counter
+
+from session import ConversationMessage
+from speaker_selection import LocalTurnPolicy, parse_speaker_reply
+
+CAST = ["Joe Rogan", "Elon Musk", "Agent Rogue"]
+
+
+def history(*turns):
+    return [ConversationMessage(name, content) for name, content in turns]
+
+
+def test_host_opens_the_show():
+    assert LocalTurnPolicy(seed=1).select([], CAST) == "Joe Rogan"
+
+
+def test_host_doesnt_open_again_after_a_history_reset():
+    policy = LocalTurnPolicy(seed=1)
+    picks = {policy.select([], CAST, last_speaker="Joe Rogan") for _ in range(50)}
+    assert picks and "Joe Rogan" not in picks
+
+
+def test_explicit_reply_decides_the_turn():
+    turns = history(("Joe Rogan", "Replying to Agent Rogue: what do you think?"))
+    assert LocalTurnPolicy(seed=1).scores(turns, CAST) == {"Agent Rogue": 0.0}
+
+
+def test_last_speaker_never_goes_twice():
+    policy = LocalTurnPolicy(seed=3)
+    turns = history(("Joe Rogan", "Pretty wild."), ("Elon Musk", "Indeed."))
+    assert all(policy.select(turns, CAST) != "Elon Musk" for _ in range(100))
+
+
+def test_a_named_question_ranks_first():
+    turns = history(
+        ("Joe Rogan", "Welcome back."),
+        ("Agent Rogue", "Hey."),
+        ("Joe Rogan", "Elon, what do you make of that?"),
+    )
+    policy = LocalTurnPolicy(temperature=0)
+    assert policy.rank(turns, CAST)[0] == "Elon Musk"
+    assert policy.select(turns, CAST) == "Elon Musk"
+
+
+def test_aliases_count_as_mentions():
+    turns = history(("Joe Rogan", "Welcome back."), ("Elon Musk", "What does the bot think?"))
+    policy = LocalTurnPolicy(temperature=0, aliases={"Agent Rogue": ["the bot"]})
+    assert policy.select(turns, CAST) == "Agent Rogue"
+
+
+def test_turns_are_shared_without_a_fixed_rotation():
+    policy = LocalTurnPolicy(seed=7)
+    turns = history(("Joe Rogan", "Welcome to the show."))
+    for _ in range(300):
+        speaker = policy.select(turns, CAST)
+        turns.append(ConversationMessage(speaker, "Sure."))
+
+    counts = Counter(message.character_name for message in turns)
+    assert all(80 <= counts[name] <= 120 for name in CAST)
+    # A strict round robin would repeat the same three-turn cycle throughout
+    cycles = sum(
+        1 for index in range(3, len(turns))
+        if turns[index].character_name == turns[index - 3].character_name
+    )
+    assert cycles < 0.9 * (len(turns) - 3)
+
+
+def test_parses_a_combined_reply():
+    raw = '{"speaker": "Elon Musk", "reply": "Mars, obviously."}'
+    assert parse_speaker_reply(raw, CAST) == ("Elon Musk", "Mars, obviously.")
+
+
+def test_parses_the_first_object_around_other_text():
+    raw = (
+        'Sure! {"speaker": "elon musk", "reply": "We need {more} rockets."} '
+        'and later {"speaker": "Joe Rogan", "reply": "No."}'
+    )
+    assert parse_speaker_reply(raw, CAST) == ("Elon Musk", "We need {more} rockets.")
+
+
+def test_skips_braces_that_arent_json():
+    raw = '{not json} {"speaker": "Agent Rogue", "reply": "Beep."}'
+    assert parse_speaker_reply(raw, CAST) == ("Agent Rogue", "Beep.")
+
+
+def test_rejects_unusable_output():
+    assert parse_speaker_reply("", CAST) is None
+    assert parse_speaker_reply("no json here", CAST) is None
+    assert parse_speaker_reply('{"speaker": "Nobody", "reply": "Hi there."}', CAST) is None
+    assert parse_speaker_reply('{"speaker": "Joe Rogan", "reply": " "}', CAST) is None
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from async_runtime import EventLoopThread
+from session import Session
+from speculation import SpeculativeTurns
+
+
+def prompt(words=10):
+    return [{"role": "system", "content": " ".join(["word"] * words)}]
+
+
+def count_words(text):
+    return len(text.split())
+
+
+class Writer:
+    """Candidate writer; replies for the `held` speakers never finish"""
+
+    def __init__(self, held=(), usage=None):
+        self.held = set(held)
+        self.usage = usage
+        self.started = []
+
+    async def __call__(self, name, messages):
+        self.started.append(name)
+        if name in self.held:
+            await asyncio.Event().wait()
+        if name == "Broken":
+            raise ValueError("Empty speculative reply")
+        return f"{name} says hi", self.usage
+
+
+def wait_until(condition, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+async def cancel_pending():
+    tasks = asyncio.all_tasks() - {asyncio.current_task()}
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@pytest.fixture
+def loop():
+    loop = EventLoopThread(name="test-speculation")
+    yield loop
+    loop.run(cancel_pending(), timeout=1.0)
+    loop.stop()
+
+
+def test_chosen_candidate_is_adopted_and_the_rest_cancelled(loop):
+    writer = Writer(held={"Bob", "Cy"})
+    speculator = SpeculativeTurns(loop, writer, count_tokens=count_words)
+    after = object()
+    speculator.speculate(after, {"Ada": prompt(), "Bob": prompt(), "Cy": prompt()})
+    assert speculator.take(after, "Ada") == "Ada says hi"
+    # The two losers are charged their prompts
+    wait_until(lambda: speculator.wasted_tokens == 20)
+    assert speculator.snapshot()["hits"] == 1
+    assert speculator.snapshot()["pending"] == 0
+
+
+def test_candidates_are_adopted_from_the_loop(loop):
+    writer = Writer()
+    speculator = SpeculativeTurns(loop, writer, count_tokens=count_words)
+    after = object()
+    speculator.speculate(after, {"Ada": prompt(), "Bob": prompt()})
+    assert loop.run(speculator.atake(after, "Bob"), timeout=1.0) == "Bob says hi"
+
+
+def test_candidates_for_other_history_are_not_used(loop):
+    writer = Writer()
+    speculator = SpeculativeTurns(loop, writer, count_tokens=count_words)
+    speculator.speculate(object(), {"Ada": prompt()})
+    assert speculator.take(object(), "Ada") is None
+    assert speculator.take(object(), "Ada") is None
+    assert speculator.snapshot()["misses"] == 1
+
+
+def test_failed_candidate_is_a_miss(loop):
+    writer = Writer()
+    speculator = SpeculativeTurns(loop, writer, count_tokens=count_words)
+    after = object()
+    speculator.speculate(after, {"Broken": prompt()})
+    assert speculator.take(after, "Broken") is None
+    assert speculator.snapshot()["misses"] == 1
+
+
+def test_topic_change_cancels_the_round(loop):
+    writer = Writer(held={"Ada", "Bob"})
+    speculator = SpeculativeTurns(loop, writer, count_tokens=count_words)
+    session = Session("room", SimpleNamespace(name="pair", characters={}, prompts=None))
+    session.speculator = speculator
+    after = object()
+    speculator.speculate(after, {"Ada": prompt(), "Bob": prompt()})
+    wait_until(lambda: len(writer.started) == 2)
+
+    session.set_topic("Cats versus dogs")
+    assert speculator.snapshot()["pending"] == 0
+    wait_until(lambda: speculator.wasted_tokens == 20)
+    assert speculator.take(after, "Ada") is None
+
+
+def test_speculation_stops_once_the_budget_is_spent(loop):
+    writer = Writer(usage=300)
+    speculator = SpeculativeTurns(loop, writer, max_candidates=2, max_wasted_tokens=500,
+                                  count_tokens=count_words)
+    for _ in range(2):
+        after = object()
+        speculator.speculate(after, {"Ada": prompt(), "Bob": prompt(), "Cy": prompt()})
+        # Bob finishes before he's discarded, so his reported usage counts
+        wait_until(lambda: all(c.future.done() for c in speculator._candidates.values()))
+        assert speculator.take(after, "Ada") == "Ada says hi"
+
+    wait_until(lambda: speculator.exhausted)
+    assert speculator.wasted_tokens == 600
+    assert writer.started.count("Cy") == 0
+
+    speculator.speculate(object(), {"Ada": prompt()})
+    snapshot = speculator.snapshot()
+    assert snapshot["rounds"] == 2 and snapshot["pending"] == 0
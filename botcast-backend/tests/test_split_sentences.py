@@ -0,0 +1,39 @@
+from utils import split_sentences
+
+
+def test_splits_on_sentence_ends():
+    assert split_sentences("Hello there. How are you? I am fine!") == [
+        "Hello there.",
+        "How are you?",
+        "I am fine!",
+    ]
+
+
+def test_splits_after_closing_quotes():
+    assert split_sentences('He said "no." Then he left.') == ['He said "no."', "Then he left."]
+
+
+def test_short_sentences_are_merged_with_the_next():
+    assert split_sentences("Yes. Ok. That is a much longer sentence.", min_chars=10) == [
+        "Yes. Ok. That is a much longer sentence."
+    ]
+
+
+def test_short_tail_is_merged_into_the_last_sentence():
+    assert split_sentences("This one is long enough. Yes.", min_chars=10) == [
+        "This one is long enough. Yes."
+    ]
+
+
+def test_text_without_punctuation_is_one_sentence():
+    assert split_sentences("  no punctuation at all  ") == ["no punctuation at all"]
+
+
+def test_blank_text_has_no_sentences():
+    assert split_sentences("   ") == []
+
+
+def test_no_text_is_lost():
+    text = "One. Two three? Four five six! Seven."
+    for min_chars in (0, 5, 12, 100):
+        assert " ".join(split_sentences(text, min_chars=min_chars)) == text
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from topic_prefetch import TopicIndex, TopicPrefetcher
+
+WORDS = [
+    "volcanoes", "chess", "sourdough", "submarines", "jazz", "glaciers", "falconry",
+    "origami", "comets", "beekeeping", "tango", "lighthouses", "mushrooms", "sumo",
+]
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition never became true"
+        time.sleep(0.005)
+
+
+def make_session(topics=("Aliens and ancient pyramids",)):
+    return SimpleNamespace(
+        room="room", lock=threading.RLock(), topic_flow=list(topics), topic_flow_index=0,
+    )
+
+
+class Batches:
+    """generate_batch stand-in handing out topics that share no words"""
+
+    def __init__(self):
+        self.calls = 0
+        self._words = iter(WORDS)
+
+    def __call__(self, session, count):
+        self.calls += 1
+        return [next(self._words).capitalize() for _ in range(count)]
+
+
+def test_near_duplicates_are_detected():
+    index = TopicIndex(threshold=0.5)
+    index.add("The future of artificial intelligence in medicine")
+    assert index.is_duplicate("the future of Artificial Intelligence in medicine!")
+    assert index.is_duplicate("The future of artificial intelligence in modern medicine")
+    assert not index.is_duplicate("Why sourdough bread went viral during lockdown")
+
+
+def test_similarity_of_identical_and_disjoint_topics():
+    index = TopicIndex()
+    signature = index.signature("deep sea creatures")
+    assert index.similarity(signature, index.signature("Deep sea creatures")) == 1.0
+    assert index.similarity(signature, index.signature("medieval castle sieges")) < 0.2
+
+
+def test_duplicates_of_the_flow_and_of_each_other_are_rejected():
+    session = make_session()
+    prefetcher = TopicPrefetcher(session, Batches())
+    prefetcher._add([
+        "Aliens and the ancient pyramids",
+        "The rise of electric cars",
+        "The rise of electric cars!",
+        "  ",
+        "Why people love true crime podcasts",
+    ])
+    assert session.topic_flow[1:] == [
+        "The rise of electric cars", "Why people love true crime podcasts",
+    ]
+    assert (prefetcher.accepted, prefetcher.rejected) == (2, 3)
+
+
+def test_noted_topics_are_not_generated_again():
+    session = make_session()
+    prefetcher = TopicPrefetcher(session, Batches())
+    prefetcher.note_topic("Is cold plunging good for you")
+    prefetcher._add(["Is cold plunging actually good for you"])
+    assert prefetcher.accepted == 0
+
+
+def test_buffer_is_refilled_below_the_low_water_mark():
+    session = make_session()
+    batches = Batches()
+    prefetcher = TopicPrefetcher(session, batches, buffer_size=2, batch_size=2, interval=10)
+    prefetcher.start()
+    try:
+        wait_until(lambda: prefetcher.topics_ahead() == 2)
+        # Enough topics ahead: the worker idles until woken
+        time.sleep(0.05)
+        assert batches.calls == 1
+
+        with session.lock:
+            session.topic_flow_index += 1
+        prefetcher.wake()
+        wait_until(lambda: batches.calls == 2)
+        wait_until(lambda: prefetcher.topics_ahead() == 3)
+    finally:
+        prefetcher.stop()
+    prefetcher._thread.join(1)
+    assert not prefetcher._thread.is_alive()
+
+
+def test_stopped_prefetcher_adds_nothing():
+    session = make_session()
+    prefetcher = TopicPrefetcher(session, Batches())
+    prefetcher.stop()
+    prefetcher._add(["A brand new topic about falconry"])
+    assert session.topic_flow == ["Aliens and ancient pyramids"]
+
+
+def test_async_worker_fills_the_buffer_and_stops_on_wake():
+    session = make_session()
+    batches = Batches()
+
+    async def generate_batch(session, count):
+        return batches(session, count)
+
+    prefetcher = TopicPrefetcher(session, generate_batch, buffer_size=2, batch_size=2,
+                                 interval=10)
+
+    async def filled():
+        while prefetcher.topics_ahead() < 2:
+            await asyncio.sleep(0.005)
+
+    async def main():
+        worker = asyncio.ensure_future(prefetcher.run())
+        await asyncio.wait_for(filled(), 1.0)
+        # stop() may come from another thread
+        threading.Thread(target=prefetcher.stop).start()
+        await asyncio.wait_for(worker, 1.0)
+
+    asyncio.run(main())
+    assert batches.calls == 1
+    assert prefetcher.topics_ahead() == 2
@@ -0,0 +1,64 @@
+import os
+
+from tts_cache import TTSCache, tts_cache_key
+
+
+def key(name: str) -> str:
+    return tts_cache_key(name, "voice", "model", "mp3")
+
+
+def test_key_depends_on_every_parameter():
+    base = tts_cache_key("hello", "voice", "model", "mp3", {"stability": 0.5})
+    assert base == tts_cache_key("hello", "voice", "model", "mp3", {"stability": 0.5})
+    assert base != tts_cache_key("hello!", "voice", "model", "mp3", {"stability": 0.5})
+    assert base != tts_cache_key("hello", "other", "model", "mp3", {"stability": 0.5})
+    assert base != tts_cache_key("hello", "voice", "model", "wav", {"stability": 0.5})
+    assert base != tts_cache_key("hello", "voice", "model", "mp3", {"stability": 0.6})
+
+
+def test_round_trip_and_counters(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=100)
+    assert cache.get(key("a")) is None
+    cache.put(key("a"), b"audio")
+    assert cache.get(key("a")) == b"audio"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (1, 1, 1, 5)
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=20)
+    cache.put(key("a"), b"a" * 8)
+    cache.put(key("b"), b"b" * 8)
+    # A hit makes "a" the most recently used entry
+    assert cache.get(key("a")) is not None
+    cache.put(key("c"), b"c" * 8)
+
+    assert cache.get(key("b")) is None
+    assert cache.get(key("a")) == b"a" * 8
+    assert cache.get(key("c")) == b"c" * 8
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 16
+
+
+def test_clips_larger_than_the_budget_are_not_stored(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=4)
+    cache.put(key("a"), b"too long")
+    assert cache.get(key("a")) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_index_is_rebuilt_from_disk_and_evicted_to_budget(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=100)
+    for index, name in enumerate("abc"):
+        cache.put(key(name), name.encode() * 10)
+        path = cache._path(key(name))
+        os.utime(path, (1000 + index, 1000 + index))
+    stray = tmp_path / "stray.tmp"
+    stray.write_bytes(b"partial")
+
+    reopened = TTSCache(str(tmp_path), max_bytes=20)
+    assert not stray.exists()
+    # Oldest by modification time goes first
+    assert reopened.get(key("a")) is None
+    assert reopened.get(key("b")) == b"b" * 10
+    assert reopened.get(key("c")) == b"c" * 10
@@ -0,0 +1,199 @@
+"""
+Background topic prefetching.
+
+A single worker per show (a thread, or a task when the show runs on an event
+loop) keeps a buffer of upcoming topics ahead of the show's position in its
+topic flow. New topics are requested from the LLM in
+batches and near-duplicates of anything already in the flow are rejected with
+a MinHash similarity index.
+"""
+import asyncio
+import logging
+import re
+import threading
+import zlib
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9']+")
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+class TopicIndex:
+    """
+    MinHash index over word shingles for spotting near-duplicate topics.
+
+    Args:
+        num_hashes: Signature length; more hashes give a tighter estimate.
+        shingle_size: Words per shingle (single words are added as well so
+            short topics still overlap).
+        threshold: Estimated Jaccard similarity at or above which a topic
+            counts as a duplicate.
+    """
+
+    def __init__(self, num_hashes: int = 64, shingle_size: int = 2,
+                 threshold: float = 0.5, seed: int = 1):
+        self.num_hashes = num_hashes
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        # Universal hash family: h(x) = (a * x + b) mod p
+        state = seed
+        self._params = []
+        for _ in range(num_hashes):
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            a = state % (_MERSENNE_PRIME - 1) + 1
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            b = state % _MERSENNE_PRIME
+            self._params.append((a, b))
+        self._signatures: List[tuple] = []
+
+    def _shingles(self, text: str) -> set:
+        words = _WORD.findall(text.lower())
+        shingles = set(words)
+        for start in range(len(words) - self.shingle_size + 1):
+            shingles.add(" ".join(words[start:start + self.shingle_size]))
+        return shingles
+
+    def signature(self, text: str) -> tuple:
+        hashed = [zlib.crc32(shingle.encode("utf-8")) for shingle in self._shingles(text)]
+        if not hashed:
+            return tuple([_MERSENNE_PRIME] * self.num_hashes)
+        return tuple(
+            min((a * value + b) % _MERSENNE_PRIME for value in hashed)
+            for a, b in self._params
+        )
+
+    @staticmethod
+    def similarity(first: tuple, second: tuple) -> float:
+        """Estimated Jaccard similarity of two signatures"""
+        return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+    def add(self, text: str) -> None:
+        self._signatures.append(self.signature(text))
+
+    def is_duplicate(self, text: str) -> bool:
+        signature = self.signature(text)
+        return any(
+            self.similarity(signature, existing) >= self.threshold
+            for existing in self._signatures
+        )
+
+
+class TopicPrefetcher:
+    """
+    Keeps `buffer_size` topics queued ahead of a session's current topic.
+
+    Args:
+        session: The show whose `topic_flow` is extended.
+        generate_batch: ``(session, count) -> list of topics`` LLM call, a
+            coroutine function when the prefetcher is driven by `run`.
+        buffer_size: Topics to keep ahead of `session.topic_flow_index`.
+        batch_size: Topics requested per LLM call.
+        interval: Seconds between buffer checks when nothing wakes the worker.
+        threshold: Similarity at or above which a new topic is rejected.
+    """
+
+    def __init__(
+            self,
+            session,
+            generate_batch: Callable[[object, int], List[str]],
+            buffer_size: int = 5,
+            batch_size: int = 5,
+            interval: float = 5.0,
+            threshold: float = 0.5,
+    ):
+        self.session = session
+        self.generate_batch = generate_batch
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.interval = interval
+        self.index = TopicIndex(threshold=threshold)
+        self.accepted = 0
+        self.rejected = 0
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._loop = None
+        self._async_wake = None
+        with session.lock:
+            for topic in session.topic_flow:
+                self.index.add(topic)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"topic-prefetch-{self.session.room}", daemon=True
+        )
+        self._thread.start()
+
+    async def run(self) -> None:
+        """Same as the worker thread, as a task on the running loop"""
+        self._loop = asyncio.get_running_loop()
+        self._async_wake = asyncio.Event()
+        while not self._stop.is_set():
+            if self.topics_ahead() < self.buffer_size:
+                try:
+                    self._add(await self.generate_batch(self.session, self.batch_size))
+                except Exception as e:
+                    logger.error(f"[{self.session.room}] Topic prefetch failed: {e}")
+            try:
+                await asyncio.wait_for(self._async_wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._async_wake.clear()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.wake()
+
+    def note_topic(self, topic: str) -> None:
+        """Index a topic added to the flow from elsewhere, e.g. by a listener"""
+        self.index.add(topic)
+
+    def wake(self) -> None:
+        """Check the buffer now, e.g. after the show moved to the next topic"""
+        self._wake.set()
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._async_wake.set)
+
+    def topics_ahead(self) -> int:
+        with self.session.lock:
+            return len(self.session.topic_flow) - self.session.topic_flow_index - 1
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if self.topics_ahead() < self.buffer_size:
+                try:
+                    self._fill()
+                except Exception as e:
+                    logger.error(f"[{self.session.room}] Topic prefetch failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _fill(self) -> None:
+        self._add(self.generate_batch(self.session, self.batch_size))
+
+    def _add(self, topics: List[str]) -> None:
+        if self._stop.is_set():
+            return
+
+        added = []
+        for topic in topics:
+            topic = topic.strip()
+            if not topic or self.index.is_duplicate(topic):
+                self.rejected += 1
+                continue
+            self.index.add(topic)
+            added.append(topic)
+        self.accepted += len(added)
+
+        if added:
+            with self.session.lock:
+                self.session.topic_flow.extend(added)
+            logger.info(
+                f"[{self.session.room}] Prefetched {len(added)} topics "
+                f"({len(topics) - len(added)} rejected as duplicates)"
+            )
@@ -0,0 +1,151 @@
+"""
+Content-addressed on-disk cache for synthesized speech.
+
+Entries are keyed by a hash of everything that affects the audio (voice,
+model, output format, voice settings and text), evicted least recently used
+first once the cache grows past its size budget, and written atomically so a
+crash never leaves a truncated clip behind.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def tts_cache_key(text: str, voice_id: str, model: str, output_format: str,
+                  voice_settings: Optional[dict] = None) -> str:
+    """Hash the synthesis parameters into a stable cache key"""
+    material = json.dumps(
+        {
+            "text": text,
+            "voice_id": voice_id,
+            "model": model,
+            "output_format": output_format,
+            "voice_settings": voice_settings or {},
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Size bounded LRU cache of audio clips stored under ``directory``.
+
+    Recency survives restarts through file modification times, which are
+    bumped on every hit.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.audio")
+
+    def _load_index(self) -> None:
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                if file_name.endswith(".tmp"):
+                    # Left over from an interrupted write
+                    os.remove(path)
+                    continue
+                if not file_name.endswith(".audio"):
+                    continue
+                stat = os.stat(path)
+                found.append((stat.st_mtime, file_name[: -len(".audio")], stat.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._size += size
+        logger.info(
+            f"TTS cache loaded {len(self._entries)} entries ({self._size} bytes)"
+        )
+        with self._lock:
+            self._evict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached audio for `key`, or None on a miss"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Store audio under `key`, evicting old entries if over budget"""
+        if not data or len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._size += len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
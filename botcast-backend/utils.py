@@ -1,6 +1,5 @@
-import json
-from character_pairs.prompts import return_prompt
-import requests
+import os
+import re
 from datetime import datetime
 
 """
@@ -22,7 +21,7 @@ Request to Play AI Network.
 rogue_memory_url = "https://rogue-api.playai.network"
 
 
-def post_to_terminal(message):
+def post_to_terminal(message, guest=None):
     """
     Posts a conversation message to the Play AI terminal.
 
@@ -31,6 +30,7 @@ def post_to_terminal(message):
             "message": "Hey, have you ever tried DMT?",
             "character": "Agent Rogue"
         }
+        guest (str): The show's guest(s), e.g. "Kamala Harris".
     """
     payload = {
         "content": {
@@ -41,10 +41,11 @@ def post_to_terminal(message):
         "metadata": {
             "source": "botcast",
             "is_agent_rogue": str(message["character"] == "Agent Rogue"),
-            "guest": "Kamala Harris",
+            "guest": guest,
         },
     }
 
+    # import requests
     # response = requests.post(f"{rogue_memory_url}/memories", json=payload)
     # print("API RESPONSE DEBUG: ", response.json())
 
@@ -64,32 +65,18 @@ def get_character_names(characters):
 
 # Define your Character class
 class Character:
-    def __init__(self, name, avatar_url, description, voice_id, mouth_positions):
+    def __init__(self, name, avatar_url, description, voice_id, mouth_positions, aliases=None):
         self.name = name
         self.avatar_url = avatar_url
         self.description = description
         self.voice_id = voice_id
         self.mouth_positions = mouth_positions
+        # Other names the character is addressed by, e.g. "Joe" for Agent Rogue
+        self.aliases = aliases or []
 
 
-# Load characters from a JSON file
-def load_characters():
-    try:
-        with open("character_pairs/jre_frank_threadguy.json", "r") as f:
-            characters_data = json.load(f)
-            characters = {}
-            for char_name, char_info in characters_data.items():
-                characters[char_name] = Character(
-                    name=char_info["name"],
-                    avatar_url=char_info["avatar_url"],
-                    description=return_prompt(char_name),
-                    voice_id=char_info["voice_id"],
-                    mouth_positions=char_info["mouth_positions"],
-                )
-            return characters
-    except FileNotFoundError:
-        # If the file doesn't exist, start with an empty dictionary
-        return {}
+CHARACTER_PAIRS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "character_pairs")
+DEFAULT_CHARACTER_PAIR = "jre_frank_threadguy.json"
 
 
 def check_latest_reply(context, character_list):
@@ -114,3 +101,163 @@ def check_latest_reply(context, character_list):
             return character_name
 
     return None
+
+
+# MPEG audio bitrates in kbps, indexed by [version][layer][bitrate index]
+_MP3_BITRATES = {
+    "1": {
+        1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+        2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+        3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    },
+    "2": {
+        1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+        2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+        3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    },
+}
+
+
+def estimate_mp3_duration(data):
+    """
+    Estimates the playback length of an MP3 clip from its first frame header.
+
+    Assumes a constant bitrate, which holds for the Neets and ElevenLabs
+    outputs we use.
+
+    Args:
+        data (bytes): The MP3 file contents.
+
+    Returns:
+        float or None: Duration in seconds, or None if no frame header is found.
+    """
+    offset = 0
+    # Skip an ID3v2 tag if present
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = data[6:10]
+        offset = 10 + ((size[0] << 21) | (size[1] << 14) | (size[2] << 7) | size[3])
+
+    limit = min(len(data) - 4, offset + 4096)
+    while offset < limit:
+        if data[offset] == 0xFF and (data[offset + 1] & 0xE0) == 0xE0:
+            version_bits = (data[offset + 1] >> 3) & 0x03
+            layer_bits = (data[offset + 1] >> 1) & 0x03
+            bitrate_index = (data[offset + 2] >> 4) & 0x0F
+            if version_bits != 1 and layer_bits != 0 and 0 < bitrate_index < 15:
+                version = "1" if version_bits == 3 else "2"
+                layer = 4 - layer_bits
+                kbps = _MP3_BITRATES[version][layer][bitrate_index]
+                return (len(data) - offset) * 8 / (kbps * 1000)
+        offset += 1
+    return None
+
+
+_SENTENCE_END = re.compile(r"(?:(?<=[.!?])|(?<=[.!?][\"')\]]))\s+")
+
+
+def split_sentences(text, min_chars=0):
+    """
+    Splits a reply into sentences for incremental synthesis.
+
+    Args:
+        text (str): The reply text.
+        min_chars (int): Sentences shorter than this are merged with the
+            following one to avoid tiny TTS requests.
+
+    Returns:
+        list: The sentences, in order. Never empty for non-blank text.
+    """
+    sentences = []
+    pending = ""
+    for part in _SENTENCE_END.split(text.strip()):
+        if not part:
+            continue
+        pending = f"{pending} {part}" if pending else part
+        if len(pending) >= min_chars:
+            sentences.append(pending)
+            pending = ""
+
+    if pending:
+        if sentences and len(pending) < min_chars:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+class ReplyStream:
+    """
+    Turns streamed completion deltas into clean, complete sentences.
+
+    Quotes and the speaker's "Name: " prefix are stripped as the text
+    arrives, the same way as for a whole reply. Once the reply reaches
+    `max_words` or `max_sentences` it is done and the rest of the stream
+    should be dropped.
+
+    Args:
+        character_name (str): The speaker whose name prefix is stripped.
+        min_chars (int): Sentences shorter than this are merged with the
+            following one.
+        max_words (int): Words after which the reply ends with the current
+            sentence. An unfinished sentence running past twice this is cut.
+        max_sentences (int): Sentences after which the reply ends.
+    """
+
+    def __init__(self, character_name, min_chars=0, max_words=None, max_sentences=None):
+        self.prefix = f"{character_name}: "
+        self.min_chars = min_chars
+        self.max_words = max_words
+        self.max_sentences = max_sentences
+        self.words = 0
+        self.sentences = 0
+        self.done = False
+        self._pending = ""
+        self._short = ""
+
+    def feed(self, delta):
+        """Returns the sentences completed by `delta`"""
+        if self.done:
+            return []
+        # The prefix can arrive split over several deltas; it's removed from
+        # the unsplit text, which always holds the start of a partial one
+        self._pending = (self._pending + delta.replace('"', "")).replace(self.prefix, "")
+        parts = _SENTENCE_END.split(self._pending)
+        self._pending = parts.pop()
+        sentences = self._complete(parts)
+        if not self.done and self.max_words:
+            words = self._pending.split()
+            if self.words + len(self._short.split()) + len(words) > 2 * self.max_words:
+                # No sentence end in sight: cut at the hard limit
+                keep = max(2 * self.max_words - self.words - len(self._short.split()), 0)
+                self._pending = ""
+                sentences += self._complete([" ".join(words[:keep])], final=True)
+                self.done = True
+        return sentences
+
+    def finish(self):
+        """Returns the remaining text once the stream has ended"""
+        if self.done:
+            return []
+        tail, self._pending = self._pending, ""
+        sentences = self._complete([tail], final=True)
+        self.done = True
+        return sentences
+
+    def _complete(self, parts, final=False):
+        sentences = []
+        for part in parts:
+            part = part.strip()
+            if part:
+                self._short = f"{self._short} {part}" if self._short else part
+            if not self._short or (len(self._short) < self.min_chars and not final):
+                continue
+            sentences.append(self._short)
+            self.words += len(self._short.split())
+            self.sentences += 1
+            self._short = ""
+            if (self.max_words and self.words >= self.max_words) or (
+                    self.max_sentences and self.sentences >= self.max_sentences
+            ):
+                self.done = True
+                break
+        return sentences
@@ -25,6 +25,13 @@ type AudioSegment = {
     duration: number;
 };
 
+// Mouth position per video frame, computed by the backend
+type LipSync = {
+    fps: number;
+    positions: string[];
+    frames: number[];
+};
+
 type Character = {
     name: string;
     avatar_url: string;
@@ -50,6 +57,9 @@ export function PodcastInterface() {
         buffer: AudioBuffer;
         text: string;
         character: Character;
+        lipSync: LipSync | null;
+        // Seconds the next clip overlaps the end of this one
+        crossfade: number;
     }>>([]);
     const isProcessingQueue = useRef(false);
 
@@ -79,6 +89,17 @@ export function PodcastInterface() {
         setTimeout(analyzeAudio, 60);
     };
 
+    // Follow the backend's lip-sync envelope for the clip that started at startTime
+    const followLipSync = (lipSync: LipSync, source: AudioBufferSourceNode, startTime: number) => {
+        if (!audioContextRef.current || currentSourceNode.current !== source) return;
+
+        const frame = Math.floor((audioContextRef.current.currentTime - startTime) * lipSync.fps);
+        if (frame >= lipSync.frames.length) return;
+        setCurrentMouthState(lipSync.positions[lipSync.frames[frame]]);
+
+        setTimeout(() => followLipSync(lipSync, source, startTime), 1000 / lipSync.fps);
+    };
+
     useEffect(() => {
         const pollCharacters = () => {
             fetch(`${API_URL}/characters`)
@@ -103,7 +124,7 @@ export function PodcastInterface() {
     }, []);
 
     useEffect(() => {
-        socket.on("audio_segment", async (data) => {
+        socket.on("audio_frame", async (header, audio: ArrayBuffer) => {
             try {
                 if (!audioContextRef.current || audioContextRef.current.state === "closed") {
                     audioContextRef.current = new (window.AudioContext || window.webkitAudioContext)();
@@ -111,19 +132,15 @@ export function PodcastInterface() {
                     analyserRef.current.fftSize = 256;
                 }
 
-                // Convert and decode audio
-                const binaryString = window.atob(data.audio);
-                const bytes = new Uint8Array(binaryString.length);
-                for (let i = 0; i < binaryString.length; i++) {
-                    bytes[i] = binaryString.charCodeAt(i);
-                }
-
-                const audioBuffer = await audioContextRef.current.decodeAudioData(bytes.buffer.slice(0));
+                // Decode the binary audio attachment
+                const audioBuffer = await audioContextRef.current.decodeAudioData(audio.slice(0));
 
                 audioBufferQueue.current.push({
                     buffer: audioBuffer,
-                    text: data.metadata.text,
-                    character: data.metadata.character,
+                    text: header.metadata.text,
+                    character: header.metadata.character,
+                    lipSync: header.metadata.lip_sync ?? null,
+                    crossfade: header.metadata.crossfade ?? 0,
                 });
 
                 if (isPlaying && !isProcessingQueue.current) {
@@ -135,7 +152,7 @@ export function PodcastInterface() {
         });
 
         return () => {
-            socket.off("audio_segment");
+            socket.off("audio_frame");
         };
     }, [isPlaying]);
 
@@ -159,24 +176,35 @@ export function PodcastInterface() {
             source.connect(analyserRef.current!);
             analyserRef.current!.connect(audioContextRef.current.destination);
 
-            if (currentSourceNode.current) {
-                currentSourceNode.current.stop();
-                currentSourceNode.current.disconnect();
-            }
-
+            // The previous clip is left to play out its fade under this one
             currentSourceNode.current = source;
 
-            // Start audio analysis
-            analyzeAudio();
-
             await new Promise<void>((resolve) => {
-                source.onended = () => {
+                let handedOver = false;
+                const handOver = () => {
+                    if (handedOver) return;
+                    handedOver = true;
                     audioBufferQueue.current.shift();
-                    // Reset mouth state when audio ends
-                    setCurrentMouthState(MOUTH_STATES.CLOSED);
                     resolve();
                 };
+                source.onended = () => {
+                    // Reset mouth state when audio ends, unless the next clip took over
+                    if (currentSourceNode.current === source) {
+                        setCurrentMouthState(MOUTH_STATES.CLOSED);
+                    }
+                    source.disconnect();
+                    handOver();
+                };
                 source.start(0);
+                // Start the next clip while this one fades out
+                setTimeout(handOver, Math.max(segment.buffer.duration - segment.crossfade, 0) * 1000);
+
+                // Animate from the server envelope, or analyse the audio when there isn't one
+                if (segment.lipSync) {
+                    followLipSync(segment.lipSync, source, audioContextRef.current!.currentTime);
+                } else {
+                    analyzeAudio();
+                }
             });
 
             processQueue();